@@ -0,0 +1,244 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/cache.py
+#
+# 派生結果的持久化快取。
+# 裝備比較、時間軸模擬等結果只取決於數據庫內容與調用參數，因此可以保存下來重複使用:
+#   - 鍵 = SHA-256(命名空間 + 參數的規範化 JSON + 所依賴表的數據版本號)。
+#     數據版本號由預處理流水線在重寫表時更新 (見 preprocessing/manifest.py 的 data_version 表)，
+#     表被重寫後舊鍵不再命中，檢測到版本變化時過期條目也會被清除；
+#   - 快取保存在數據庫旁的獨立文件 (azur_lane_data.cache.db)，查詢端對主數據庫保持只讀，
+#     而且主數據庫被整體替換時快取不受影響；
+#   - 按最近使用時間 (LRU) 淘汰，條目數與總字節數都有上限。
+# 結果以 JSON 保存，因此只能快取可 JSON 序列化的值 (dict / list / 數字 / 字符串)。
+# 查詢服務 (server.py --result-cache) 以此快取 /compare 與 /timeline 的結果。
+#
+# 用法:
+#     cache = ResultCache()
+#     ranked = cache.get_or_compute('compare.rank', {'type': 3, 'profile': profile},
+#                                   lambda: rank(snapshot, profile, equipment_type=3), tables=('equipment',))
+
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing.log import get_logger
+from azurlane_analyzer.preprocessing.manifest import ANY_TABLE, read_data_versions
+from azurlane_analyzer.query import DEFAULT_DB_FILE
+
+logger = get_logger(__name__)
+
+CACHE_FILE_SUFFIX = '.cache.db'
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+CACHE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS result_cache (
+        key TEXT PRIMARY KEY,            -- SHA-256(命名空間, 參數, 數據版本)
+        namespace TEXT NOT NULL,         -- 結果類型，例如 'compare.rank'
+        tables TEXT NOT NULL,            -- 依賴的表 (逗號分隔，已排序)
+        data_version TEXT NOT NULL,      -- 寫入時依賴表的數據版本 (用於清除過期條目)
+        value TEXT NOT NULL,             -- 結果 JSON
+        size INTEGER NOT NULL,           -- value 的字節數
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,         -- LRU 淘汰依據
+        hits INTEGER NOT NULL DEFAULT 0
+    )
+'''
+CACHE_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache (last_used)'
+
+_MISSING = object()
+
+
+def default_cache_file(db_file):
+    """主數據庫旁的快取文件路徑 (azur_lane_data.db -> azur_lane_data.cache.db)。"""
+    db_file = Path(db_file)
+    return db_file.with_name(db_file.stem + CACHE_FILE_SUFFIX)
+
+
+class ResultCache:
+    """
+    以數據版本為鍵的一部分的持久化 LRU 快取。可在多個線程間共用 (內部以鎖串行化訪問)。
+    Attributes:
+        hits / misses (int): 本進程內的命中與未命中次數。
+    """
+
+    def __init__(self, db_file=DEFAULT_DB_FILE, cache_file=None,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_file = Path(db_file)
+        self.cache_file = Path(cache_file) if cache_file is not None else default_cache_file(self.db_file)
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._db_stat = None
+
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.cache_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(CACHE_TABLE_SQL)
+        self._conn.execute(CACHE_INDEX_SQL)
+
+    # --- 數據版本 ---
+    def _refresh_versions(self):
+        """
+        主數據庫文件 (或其 WAL 文件) 的 mtime/大小變化時重新讀取數據版本，並清除已過期的條目。
+        數據未變化時每次調用只需要兩次 stat。
+        """
+        stat = []
+        for path in (self.db_file, self.db_file.with_name(self.db_file.name + '-wal')):
+            try:
+                st = path.stat()
+                stat.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stat.append(None)
+        stat = tuple(stat)
+        if stat == self._db_stat:
+            return
+        versions = {}
+        if stat[0] is not None:
+            conn = sqlite3.connect(f"{self.db_file.resolve().as_uri()}?mode=ro", uri=True)
+            try:
+                versions = read_data_versions(conn)
+            finally:
+                conn.close()
+        first_load = self._db_stat is None
+        changed = versions != self._versions
+        self._versions, self._db_stat = versions, stat
+        if first_load or changed:
+            self._purge_stale()
+
+    def data_version(self, tables):
+        """返回一組表的組合數據版本號 (未聲明 WRITES 的步驟寫入的 '*' 版本總是包含在內)。"""
+        tables = sorted(set(tables)) + [ANY_TABLE]
+        return '|'.join(f"{table}={self._versions.get(table, '')}" for table in tables)
+
+    def _purge_stale(self):
+        rows = self._conn.execute("SELECT DISTINCT tables, data_version FROM result_cache").fetchall()
+        stale = [(tables, version) for tables, version in rows
+                 if self.data_version(tables.split(',') if tables else ()) != version]
+        if stale:
+            self._conn.executemany("DELETE FROM result_cache WHERE tables = ? AND data_version = ?", stale)
+            logger.info("  數據版本已變化，清除 %d 組過期的快取結果。", len(stale))
+
+    # --- 讀寫 ---
+    def make_key(self, namespace, inputs, tables):
+        """Returns: tuple (鍵, 組合數據版本號)。"""
+        version = self.data_version(tables)
+        payload = json.dumps([namespace, inputs, version], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest(), version
+
+    def get(self, namespace, inputs, tables=(), default=None):
+        """查詢快取；未命中時返回 default。"""
+        with self._lock:
+            self._refresh_versions()
+            key, _ = self.make_key(namespace, inputs, tables)
+            row = self._conn.execute("SELECT value FROM result_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self._conn.execute("UPDATE result_cache SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                               (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, namespace, inputs, value, tables=()):
+        """寫入一個結果，必要時按 LRU 淘汰舊條目。"""
+        encoded = json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+        size = len(encoded.encode('utf-8'))
+        if size > self.max_bytes:
+            logger.warning("  警告: %s 的結果 (%d 字節) 超過快取上限，不寫入快取。", namespace, size)
+            return
+        table_list = ','.join(sorted(set(tables)))
+        with self._lock:
+            self._refresh_versions()
+            key, version = self.make_key(namespace, inputs, tables)
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache "
+                "(key, namespace, tables, data_version, value, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, namespace, table_list, version, encoded, size, now, now),
+            )
+            self._evict()
+
+    def get_or_compute(self, namespace, inputs, compute, tables=()):
+        """
+        命中時返回快取的結果，否則調用 compute() 計算、寫入快取並返回。
+        Args:
+            namespace (str): 結果類型 (不同函數的結果互不衝突)。
+            inputs: 決定結果的全部參數 (可 JSON 序列化)。
+            compute (callable): 無參數的計算函數。
+            tables (tuple): 結果所依賴的表名。
+        """
+        value = self.get(namespace, inputs, tables, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = compute()
+        self.put(namespace, inputs, value, tables)
+        # 返回與命中時相同形態的值 (經過 JSON 往返，例如元組變為列表)
+        return json.loads(json.dumps(value))
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT count(*), coalesce(sum(size), 0) FROM result_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # 從最久未使用的條目開始刪除，直到條目數與總大小都回到上限以內
+        removed = 0
+        for key, size in self._conn.execute("SELECT key, size FROM result_cache ORDER BY last_used").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            removed += 1
+        logger.debug("  快取淘汰 %d 個條目。", removed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM result_cache")
+
+    def stats(self):
+        """Returns: dict (條目數、總字節數、本進程命中/未命中次數)。"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT count(*), coalesce(sum(size), 0) FROM result_cache").fetchone()
+        return {'entries': count, 'bytes': total, 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# --- 主執行入口 (示例: 快取主炮比較結果) ---
+if __name__ == '__main__':
+    from azurlane_analyzer.compare import EquipmentSnapshot, rank
+
+    db_file = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DB_FILE
+    profile = {'firepower': 350, 'reload': 150}
+    snapshot = None
+
+    def compute():
+        global snapshot
+        snapshot = snapshot or EquipmentSnapshot.load(db_file)
+        return rank(snapshot, profile, equipment_type=[1, 2, 3, 4, 11], top=20)
+
+    with ResultCache(db_file) as cache:
+        for attempt in (1, 2):
+            start_time = time.perf_counter()
+            ranked = cache.get_or_compute('compare.rank', {'types': [1, 2, 3, 4, 11], 'profile': profile, 'top': 20},
+                                          compute, tables=('equipment',))
+            print(f"第 {attempt} 次: {len(ranked)} 條結果，耗時 {(time.perf_counter() - start_time) * 1000:.2f} 毫秒。")
+        print(f"快取統計: {cache.stats()}")
@@ -0,0 +1,420 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/compare.py
+#
+# 裝備比較引擎。
+# 從數據庫一次性載入 equipment 表的數值欄位，組成按欄位存放的快照 (EquipmentSnapshot)，
+# 之後對任意艦船屬性組合 (炮擊/雷擊/航空/防空/裝填) 計算並排序整類裝備時只做一趟向量運算，
+# 不再逐件查詢、逐件計算:
+#   - 安裝了 NumPy 時，每個欄位是 float64 的 ndarray；
+#   - 否則退回標準庫 array('d') 欄位與純 Python 迴圈 (結果相同，只是較慢)。
+# 缺失值 (NULL) 在快照中一律存為 NaN。
+#
+# 用法:
+#     snapshot = EquipmentSnapshot.load()
+#     top = rank(snapshot, {'firepower': 350, 'reload': 150}, equipment_type=3, top=10)
+
+import math
+import sqlite3
+import sys
+from array import array
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing.log import get_logger
+from azurlane_analyzer.query import DEFAULT_DB_FILE, ReadOnlyConnectionPool
+
+try:
+    import numpy as np
+except ImportError:  # 可選依賴
+    np = None
+
+logger = get_logger(__name__)
+
+NAN = float('nan')
+
+# --- 計算模型 ---
+# 武器冷卻 (秒) = 倉庫 CD * sqrt(200 / (100 + 裝填))；倉庫 CD 即裝填 100 時的冷卻
+# (見 process_weapon_property.RELOAD_TIME_CONSTANT)。
+RELOAD_REFERENCE = 100.0
+
+# 艦船屬性組合可用的鍵
+PROFILE_KEYS = ('firepower', 'torpedo', 'aviation', 'antiair', 'reload')
+
+# 傷害依賴的屬性 (按裝備類型的默認值；equipment.damage_stat_type 有值時以其為準；
+# 不在表中的類型沒有屬性補正)
+SCALING_STATS = ('firepower', 'torpedo', 'aviation', 'antiair')
+TYPE_SCALING_STAT = {
+    1: 'firepower', 2: 'firepower', 3: 'firepower', 4: 'firepower', 11: 'firepower',  # 艦炮
+    5: 'torpedo', 13: 'torpedo', 20: 'torpedo',                                       # 魚雷
+    7: 'aviation', 8: 'aviation', 9: 'aviation', 12: 'aviation',                       # 艦載機
+    6: 'antiair', 21: 'antiair',                                                      # 防空炮
+}
+
+# 參與屬性總和的欄位
+STAT_TOTAL_COLUMNS = (
+    'stat_hp', 'stat_firepower', 'stat_torpedo', 'stat_aviation', 'stat_reload',
+    'stat_antiair', 'stat_hit', 'stat_evasion', 'stat_speed', 'stat_luck', 'stat_antisub',
+)
+
+# 快照載入的數值欄位
+SNAPSHOT_COLUMNS = STAT_TOTAL_COLUMNS + (
+    'base_damage_initial', 'base_damage_max', 'volley_count',
+    'storehouse_cd_initial', 'storehouse_cd_max',
+    'damage_coefficient_initial', 'damage_coefficient_max', 'stat_efficiency',
+)
+
+METRICS = ('dps', 'damage_per_volley', 'cooldown', 'stat_total')
+LEVELS = ('initial', 'max')
+
+
+# --- 快照 ---
+def _to_float(value):
+    if value is None:
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _to_int(value, default=-1):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class EquipmentSnapshot:
+    """
+    equipment 表的欄位式只讀快照。
+    Attributes:
+        ids (list[int]): 裝備 ID，與各欄位按位置對齊。
+        names (list[str]): 裝備名稱。
+        equipment_type / rarity / faction: 整數欄位 (缺失為 -1)。
+        columns (dict): 欄位名 -> float 數組 (NumPy ndarray 或 array('d'))。
+        stat_total: 每件裝備的屬性總和 (載入時預先計算)。
+    """
+
+    def __init__(self, ids, names, equipment_type, rarity, faction, columns, damage_stat_type=None):
+        self.ids = list(ids)
+        self.names = list(names)
+        self.backend = 'numpy' if np is not None else 'array'
+        self.equipment_type = self._int_column(equipment_type)
+        self.rarity = self._int_column(rarity)
+        self.faction = self._int_column(faction)
+        self.columns = {name: self._float_column(values) for name, values in columns.items()}
+
+        # 每件裝備的傷害依賴屬性 (SCALING_STATS 中的下標，-1 表示沒有屬性補正)
+        if damage_stat_type is None:
+            damage_stat_type = [None] * len(self.ids)
+        scaling = []
+        for equip_type, stat_type in zip(self.equipment_type, damage_stat_type):
+            stat = stat_type if stat_type in SCALING_STATS else TYPE_SCALING_STAT.get(int(equip_type))
+            scaling.append(SCALING_STATS.index(stat) if stat else -1)
+        self.scaling_index = self._int_column(scaling)
+        # 裝備自身在其依賴屬性上的加成 (與艦船屬性相加後參與傷害補正)
+        own_bonus = []
+        for row, index in enumerate(scaling):
+            value = self.columns[f'stat_{SCALING_STATS[index]}'][row] if index >= 0 else NAN
+            own_bonus.append(0.0 if math.isnan(value) else float(value))
+        self.own_scaling_bonus = self._float_column(own_bonus)
+        self.stat_total = self._stat_total()
+
+    def _int_column(self, values):
+        if np is not None:
+            return np.asarray(values, dtype=np.int64)
+        return array('q', values)
+
+    def _float_column(self, values):
+        if np is not None:
+            return np.asarray(values, dtype=np.float64)
+        return array('d', values)
+
+    def _stat_total(self):
+        stats = [self.columns[name] for name in STAT_TOTAL_COLUMNS]
+        if np is not None:
+            return np.nansum(np.vstack(stats), axis=0) if stats else np.zeros(len(self))
+        return array('d', (
+            sum(value for value in values if not math.isnan(value))
+            for values in zip(*stats)
+        ))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, db_file=DEFAULT_DB_FILE, pool=None):
+        """
+        從數據庫載入快照 (只包含有名稱的裝備，不含舊版本數據庫中 weapon_name 的佔位行)。
+        Args:
+            db_file (Path): 數據庫文件；傳入 pool 時忽略。
+            pool (ReadOnlyConnectionPool): 可選，重用已有的只讀連接池。
+        Returns:
+            EquipmentSnapshot
+        """
+        columns = ('id', 'name', 'equipment_type', 'rarity', 'faction', 'damage_stat_type') + SNAPSHOT_COLUMNS
+        sql = f"SELECT {', '.join(columns)} FROM equipment WHERE name IS NOT NULL"
+        if pool is not None:
+            rows = pool.execute(sql)
+        else:
+            with ReadOnlyConnectionPool(db_file) as own_pool:
+                rows = own_pool.execute(sql)
+
+        numeric = {name: [] for name in SNAPSHOT_COLUMNS}
+        ids, names, types, rarities, factions, stat_types = [], [], [], [], [], []
+        for row in rows:
+            ids.append(row[0])
+            names.append(row[1])
+            types.append(_to_int(row[2]))
+            rarities.append(_to_int(row[3]))
+            factions.append(_to_int(row[4]))
+            stat_types.append(row[5])
+            for offset, name in enumerate(SNAPSHOT_COLUMNS, 6):
+                numeric[name].append(_to_float(row[offset]))
+        snapshot = cls(ids, names, types, rarities, factions, numeric, stat_types)
+        logger.info("  已載入裝備比較快照: %d 件裝備，後端 %s。", len(snapshot), snapshot.backend)
+        return snapshot
+
+    @classmethod
+    def from_binary(cls, binary):
+        """
+        從 mmap 映射的二進制快照 (azurlane_analyzer/snapshot.py) 構建，不查詢數據庫。
+        使用 NumPy 且所有裝備都有名稱時，數值欄位直接是映射頁面上的只讀視圖 (不複製)。
+        Args:
+            binary (snapshot.Snapshot): 已打開的二進制快照 (使用期間不能關閉)。
+        Returns:
+            EquipmentSnapshot
+        """
+        from azurlane_analyzer.snapshot import INT_NULL, STRING_NULL
+
+        table = binary.table('equipment')
+        name_refs = table.column('name')
+        rows = [row for row, ref in enumerate(name_refs) if ref != STRING_NULL]
+        every_row = len(rows) == len(table)
+
+        def floats(name):
+            if table.dtype(name) != 'd':  # 整數欄位 (如 volley_count) 轉為 float，NULL 為 NaN
+                values = table.column(name)
+                return [NAN if values[row] == INT_NULL else float(values[row]) for row in rows]
+            if np is not None:
+                values = table.array(name)
+                return values if every_row else values[rows]
+            values = table.column(name)
+            return values if every_row else array('d', (values[row] for row in rows))
+
+        def ints(name):
+            values = table.column(name)
+            return [-1 if values[row] == INT_NULL else values[row] for row in rows]
+
+        ids = table.column('id')
+        stat_type_refs = table.column('damage_stat_type')
+        snapshot = cls(
+            [ids[row] for row in rows],
+            [binary.string(name_refs[row]) for row in rows],
+            ints('equipment_type'), ints('rarity'), ints('faction'),
+            {name: floats(name) for name in SNAPSHOT_COLUMNS},
+            [binary.string(stat_type_refs[row]) for row in rows],
+        )
+        logger.info("  已從二進制快照載入裝備比較快照: %d 件裝備，後端 %s。", len(snapshot), snapshot.backend)
+        return snapshot
+
+    def select(self, equipment_type=None, rarity=None, faction=None):
+        """
+        返回符合條件的行下標 (NumPy 下為整數 ndarray，否則為 list)。
+        每個條件可以是單個值或值的集合；None 表示不篩選。
+        """
+        conditions = [(self.equipment_type, equipment_type), (self.rarity, rarity), (self.faction, faction)]
+        conditions = [(column, _as_set(value)) for column, value in conditions if value is not None]
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            for column, values in conditions:
+                mask &= np.isin(column, list(values))
+            return np.flatnonzero(mask)
+        return [row for row in range(len(self))
+                if all(column[row] in values for column, values in conditions)]
+
+
+def _as_set(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return {int(v) for v in value}
+    return {int(value)}
+
+
+# --- 指標計算 ---
+def weapon_cooldown(storehouse_cd, reload):
+    """單件武器在給定裝填 (艦船 + 裝備) 下的冷卻秒數 (標量版本，供時間軸等逐件計算使用)。"""
+    return storehouse_cd * math.sqrt(200.0 / (RELOAD_REFERENCE + reload))
+
+
+def scaled_damage(base_damage, scaling_stat, efficiency=1.0, coefficient=1.0):
+    """單發傷害: 基礎傷害 * 補正係數 * (1 + 依賴屬性 * 屬性效率 / 100)。"""
+    return base_damage * coefficient * (1.0 + scaling_stat * efficiency / 100.0)
+
+
+def _normalize_profile(profile):
+    profile = dict(profile or {})
+    unknown = set(profile) - set(PROFILE_KEYS)
+    if unknown:
+        raise ValueError(f"未知的艦船屬性: {', '.join(sorted(unknown))}，可用: {', '.join(PROFILE_KEYS)}")
+    return {key: float(profile.get(key, 0) or 0) for key in PROFILE_KEYS}
+
+
+def _metrics_numpy(snapshot, rows, profile, level):
+    columns = snapshot.columns
+
+    def take(name):
+        return columns[name][rows]
+
+    def leveled(name):
+        initial = take(f'{name}_initial')
+        if level == 'initial':
+            return initial
+        maximum = take(f'{name}_max')
+        return np.where(np.isnan(maximum), initial, maximum)  # 沒有強化數據時滿強等於初始
+
+    profile_stats = np.array([profile[stat] for stat in SCALING_STATS] + [0.0])
+    scaling_index = snapshot.scaling_index[rows]
+    scaling_stat = profile_stats[scaling_index] + snapshot.own_scaling_bonus[rows]  # 下標 -1 (無依賴屬性) 取到 0
+
+    efficiency = np.nan_to_num(take('stat_efficiency'), nan=1.0)
+    coefficient = np.nan_to_num(leveled('damage_coefficient'), nan=1.0)
+    volley = np.nan_to_num(take('volley_count'), nan=1.0)
+    damage_per_volley = (leveled('base_damage') * volley * coefficient
+                         * (1.0 + scaling_stat * efficiency / 100.0))
+
+    reload = profile['reload'] + np.nan_to_num(take('stat_reload'))
+    cooldown = leveled('storehouse_cd') * np.sqrt(200.0 / (RELOAD_REFERENCE + reload))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dps = damage_per_volley / cooldown
+    dps[~np.isfinite(dps)] = np.nan
+    return {
+        'damage_per_volley': damage_per_volley,
+        'cooldown': cooldown,
+        'dps': dps,
+        'stat_total': snapshot.stat_total[rows],
+    }
+
+
+def _metrics_python(snapshot, rows, profile, level):
+    columns = snapshot.columns
+    suffix = '_initial' if level == 'initial' else '_max'
+    profile_stats = [profile[stat] for stat in SCALING_STATS]
+    reload_base = profile['reload']
+
+    def leveled(name, row):
+        value = columns[name + suffix][row]
+        return columns[name + '_initial'][row] if math.isnan(value) else value
+
+    def or_default(value, default):
+        return default if math.isnan(value) else value
+
+    result = {metric: array('d') for metric in METRICS}
+    for row in rows:
+        index = snapshot.scaling_index[row]
+        scaling_stat = profile_stats[index] + snapshot.own_scaling_bonus[row] if index >= 0 else 0.0
+        efficiency = or_default(columns['stat_efficiency'][row], 1.0)
+        coefficient = or_default(leveled('damage_coefficient', row), 1.0)
+        volley = or_default(columns['volley_count'][row], 1.0)
+        damage_per_volley = volley * scaled_damage(leveled('base_damage', row), scaling_stat, efficiency, coefficient)
+
+        reload = reload_base + or_default(columns['stat_reload'][row], 0.0)
+        cooldown = weapon_cooldown(leveled('storehouse_cd', row), reload)
+        dps = damage_per_volley / cooldown if cooldown and not math.isnan(cooldown) else NAN
+
+        result['damage_per_volley'].append(damage_per_volley)
+        result['cooldown'].append(cooldown)
+        result['dps'].append(dps if math.isfinite(dps) else NAN)
+        result['stat_total'].append(snapshot.stat_total[row])
+    return result
+
+
+def compute_metrics(snapshot, profile=None, rows=None, level='max'):
+    """
+    對快照中的指定行一次性計算所有比較指標。
+    Args:
+        snapshot (EquipmentSnapshot): 裝備快照。
+        profile (dict): 艦船屬性組合，鍵為 PROFILE_KEYS 的子集，缺省為 0。
+        rows: snapshot.select() 返回的行下標；None 表示全部。
+        level (str): 'initial' 使用初始數值，'max' 使用滿強數值。
+    Returns:
+        dict: 指標名 (METRICS) -> 與 rows 對齊的數組；無法計算的值為 NaN
+              (例如沒有倉庫 CD 的裝備沒有 dps，不造成傷害的裝備沒有 damage_per_volley)。
+    """
+    if level not in LEVELS:
+        raise ValueError(f"level 必須是 {' / '.join(LEVELS)} 之一")
+    profile = _normalize_profile(profile)
+    if rows is None:
+        rows = np.arange(len(snapshot)) if np is not None else range(len(snapshot))
+    if np is not None:
+        return _metrics_numpy(snapshot, np.asarray(rows, dtype=np.int64), profile, level)
+    return _metrics_python(snapshot, rows, profile, level)
+
+
+def _descending_order(values, top):
+    """返回按值降序的位置列表 (NaN 排在最後)，top 不為 None 時只返回前 top 個。"""
+    if np is not None:
+        keys = np.where(np.isnan(values), -np.inf, values)
+        if top is not None and top < len(keys):
+            candidates = np.argpartition(-keys, top)[:top]  # 先選出前 top 個，再只對它們排序
+            return candidates[np.argsort(-keys[candidates], kind='stable')]
+        return np.argsort(-keys, kind='stable')
+    order = sorted(range(len(values)),
+                   key=lambda i: (math.isnan(values[i]), -values[i] if not math.isnan(values[i]) else 0.0))
+    return order[:top] if top is not None else order
+
+
+def rank(snapshot, profile=None, equipment_type=None, metric='dps', level='max', top=None,
+         rarity=None, faction=None):
+    """
+    在一次遍歷中計算某類裝備對給定艦船屬性的所有指標並按指標降序排列。
+    Args:
+        snapshot (EquipmentSnapshot): 裝備快照 (可重複使用)。
+        profile (dict): 艦船屬性組合，例如 {'firepower': 350, 'reload': 150}。
+        equipment_type: 裝備類型 (單個值或集合)；None 表示所有類型。
+        metric (str): 排序依據，METRICS 之一。
+        level (str): 'initial' 或 'max'。
+        top (int): 只返回前 top 件；None 返回全部。
+        rarity / faction: 額外篩選條件。
+    Returns:
+        list[dict]: 每件裝備的 id、name、equipment_type、rarity、faction 與各指標。
+    """
+    if metric not in METRICS:
+        raise ValueError(f"未知的比較指標 '{metric}'，可用: {', '.join(METRICS)}")
+    rows = snapshot.select(equipment_type, rarity, faction)
+    metrics = compute_metrics(snapshot, profile, rows, level)
+    order = _descending_order(metrics[metric], top)
+
+    results = []
+    for position in order:
+        row = int(rows[position])
+        entry = {
+            'id': snapshot.ids[row],
+            'name': snapshot.names[row],
+        }
+        for column in ('equipment_type', 'rarity', 'faction'):
+            value = int(getattr(snapshot, column)[row])
+            entry[column] = None if value < 0 else value  # -1 表示缺失，與 query.equipment_record 一致
+        for name in METRICS:
+            value = float(metrics[name][position])
+            entry[name] = None if math.isnan(value) else value
+        results.append(entry)
+    return results
+
+
+# --- 主執行入口 (快速檢查比較結果) ---
+if __name__ == '__main__':
+    import time
+
+    db_file = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DB_FILE
+    try:
+        snapshot = EquipmentSnapshot.load(db_file)
+    except (FileNotFoundError, sqlite3.Error) as e:
+        print(f"載入數據庫時出錯: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    profile = {'firepower': 350, 'reload': 150}
+    start_time = time.perf_counter()
+    ranked = rank(snapshot, profile, equipment_type=[1, 2, 3, 4, 11], top=10)
+    elapsed = (time.perf_counter() - start_time) * 1000
+    print(f"後端: {snapshot.backend}，{len(snapshot)} 件裝備；主炮 DPS 排序耗時 {elapsed:.2f} 毫秒。")
+    for r in ranked:
+        dps = f"{r['dps']:.1f}" if r['dps'] is not None else '-'
+        print(f"  ID: {r['id']}, Name: {r['name']}, DPS: {dps}")
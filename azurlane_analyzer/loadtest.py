@@ -0,0 +1,367 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/loadtest.py
+#
+# 查詢服務 (server.py) 的負載測試。
+#   - 以 --connections 個 keep-alive 連接併發發送請求，混合裝備查詢、篩選列表、比較與時間軸請求
+#     (比例見 DEFAULT_MIX)；比較請求的艦船屬性取自少量固定組合，與 bot / 儀表板的重複請求相似，
+#     可觀察到服務端的請求合併；
+#   - 默認為閉環 (每個連接收到響應後立即發下一個)，測量最大吞吐量；--rate 為開環，按固定速率排程，
+#     延遲從排定的發送時刻算起 (服務跟不上時排隊的時間也計入，避免協調遺漏低估尾延遲)；
+#   - 報告每個端點與總體的吞吐量、p50 / p90 / p99 / 最大延遲、錯誤數，以及服務端統計的變化 (/health)；
+#   - --spawn 在子進程中啟動服務 (隨機端口)，測試結束後關閉。
+#
+# 用法:
+#     python -m azurlane_analyzer.loadtest --spawn --duration 20 --connections 32
+#     python -m azurlane_analyzer.loadtest --url http://127.0.0.1:8765 --rate 500 --output DataOutput/benchmarks/loadtest.json
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from azurlane_analyzer.preprocessing.log import configure_logging, get_logger
+from azurlane_analyzer.query import DEFAULT_DB_FILE
+
+logger = get_logger(__name__)
+
+# --- 配置 ---
+DEFAULT_URL = 'http://127.0.0.1:8765'
+DEFAULT_DURATION = 10.0    # 秒
+DEFAULT_WARMUP = 2.0       # 秒；預熱期間的請求不計入結果
+DEFAULT_CONNECTIONS = 16
+SPAWN_TIMEOUT = 60.0       # 秒；等待子進程服務啟動的時間
+
+# 請求組合: 端點 -> 權重
+DEFAULT_MIX = {'equipment': 50, 'equipment.list': 15, 'compare': 25, 'timeline': 10}
+# 比較請求使用的艦船屬性組合
+PROFILES = (
+    {'firepower': 350, 'reload': 150},
+    {'firepower': 300, 'torpedo': 250, 'reload': 170},
+    {'aviation': 400, 'reload': 140},
+    {'antiair': 300, 'reload': 160},
+)
+COMPARE_TYPES = ('1,2,3,4,11', '1', '2', '3', '5,13', '7,8,9')
+
+_ADDRESS_PATTERN = re.compile(r'http://([\w.:\[\]-]+):(\d+)')
+
+
+def percentile(sorted_values, fraction):
+    """最近秩百分位數 (sorted_values 已升序)；空列表返回 None。"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+# --- HTTP 客戶端 (keep-alive) ---
+class Connection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, target, body=None):
+        """Returns: tuple (狀態碼, 響應體字節)。"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        self.writer.write(head.encode('latin-1') + b"\r\n" + (body or b''))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("服務關閉了連接")
+        status = int(status_line.split()[1])
+        length, keep_alive = 0, True
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection':
+                keep_alive = value.strip().lower() != 'close'
+        payload = await self.reader.readexactly(length)
+        if not keep_alive:
+            self.close()
+        return status, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+# --- 請求生成 ---
+class Workload:
+    """
+    按 mix 隨機生成請求 (可重現: 同一 seed 生成相同的請求序列)。
+    時間軸請求需要有傷害數據的武器 (gun_ids)；數據庫中沒有時 (例如缺少 weapon_property.json 的構建)
+    從組合中去掉 timeline 並記錄警告，實際使用的組合見 self.mix。
+    """
+
+    def __init__(self, equipment_ids, gun_ids, mix=DEFAULT_MIX, seed=0):
+        mix = {name: weight for name, weight in mix.items() if weight > 0}
+        if not equipment_ids:
+            raise ValueError("服務中沒有可用於測試的裝備")
+        if 'timeline' in mix and not gun_ids:
+            logger.warning("警告: 服務中沒有帶傷害數據的武器 (數據庫缺少 weapon_property?)，"
+                           "請求組合中去掉 timeline。")
+            del mix['timeline']
+        if not mix:
+            raise ValueError("請求組合中沒有權重為正的端點")
+        self.equipment_ids = equipment_ids
+        self.gun_ids = gun_ids
+        self.mix = mix
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.random = random.Random(seed)
+
+    @classmethod
+    async def discover(cls, connection, mix=DEFAULT_MIX, seed=0):
+        """從服務取得測試用的裝備 ID 與有傷害數據的武器 ID。"""
+        status, payload = await connection.request('GET', '/equipment?limit=1000')
+        equipment_ids = [row['id'] for row in json.loads(payload)['results']] if status == 200 else []
+        gun_ids = []
+        if mix.get('timeline', 0) > 0:  # 只有時間軸請求需要武器 ID
+            status, payload = await connection.request(
+                'GET', '/compare?' + urlencode({'type': '1,2,3,4', 'top': 200}))
+            if status == 200:
+                gun_ids = [row['id'] for row in json.loads(payload)['results'] if row['dps'] is not None]
+        return cls(equipment_ids, gun_ids, mix, seed)
+
+    def next(self):
+        """Returns: tuple (端點, 方法, 目標, 請求體)。"""
+        rng = self.random
+        endpoint = rng.choices(self.endpoints, self.weights)[0]
+        if endpoint == 'equipment':
+            return endpoint, 'GET', f'/equipment/{rng.choice(self.equipment_ids)}', None
+        if endpoint == 'equipment.list':
+            params = {'type': rng.choice(COMPARE_TYPES), 'rarity': rng.randint(2, 6), 'limit': 50}
+            return endpoint, 'GET', '/equipment?' + urlencode(params), None
+        if endpoint == 'compare':
+            params = {'type': rng.choice(COMPARE_TYPES), 'top': 20, **rng.choice(PROFILES)}
+            return endpoint, 'GET', '/compare?' + urlencode(params), None
+        ships = [{'equip': rng.sample(self.gun_ids, min(2, len(self.gun_ids))), 'profile': rng.choice(PROFILES)}
+                 for _ in range(rng.randint(1, 6))]
+        body = json.dumps({'ships': ships, 'duration': 180}).encode('utf-8')
+        return endpoint, 'POST', '/timeline', body
+
+
+# --- 測試 ---
+async def _fetch_health(host, port):
+    connection = Connection(host, port)
+    try:
+        status, payload = await connection.request('GET', '/health')
+        return json.loads(payload) if status == 200 else {}
+    finally:
+        connection.close()
+
+
+async def run_load(host, port, duration=DEFAULT_DURATION, connections=DEFAULT_CONNECTIONS, rate=None,
+                   warmup=DEFAULT_WARMUP, mix=DEFAULT_MIX, seed=0):
+    """
+    運行負載測試。
+    Args:
+        duration (float): 計入結果的測試時長 (秒，不含預熱)。
+        connections (int): 併發連接數。
+        rate (float): 開環模式的總請求速率 (請求/秒)；None 為閉環模式。
+        warmup (float): 預熱時長 (秒)。
+    Returns:
+        dict: 結果 (見 summarise)。
+    """
+    probe = Connection(host, port)
+    try:
+        workload = await Workload.discover(probe, mix, seed)
+    finally:
+        probe.close()
+    health_before = await _fetch_health(host, port)
+
+    samples = []   # (端點, 狀態碼, 延遲秒數)
+    failures = []
+    start = time.perf_counter() + 0.05
+    measure_from = start + warmup
+    end = measure_from + duration
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        connection = Connection(host, port)
+        try:
+            while True:
+                if rate:
+                    scheduled = start + next_index / rate
+                    next_index += 1
+                    if scheduled >= end:
+                        return
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    scheduled = time.perf_counter()
+                    if scheduled >= end:
+                        return
+                endpoint, method, target, body = workload.next()
+                try:
+                    status, _ = await connection.request(method, target, body)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+                    connection.close()
+                    status = None
+                    failures.append(f"{endpoint}: {e}")
+                if scheduled >= measure_from:
+                    samples.append((endpoint, status, time.perf_counter() - scheduled))
+        finally:
+            connection.close()
+
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    elapsed = time.perf_counter() - measure_from
+    health_after = await _fetch_health(host, port)
+    return summarise(samples, elapsed, health_before, health_after, failures,
+                     {'duration': duration, 'connections': connections, 'rate': rate, 'warmup': warmup,
+                      'mix': workload.mix, 'seed': seed})
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def _is_error(status):
+    """連接失敗或 5xx 計為錯誤 (4xx 是請求本身的問題，測試請求不應產生)。"""
+    return status is None or status >= 500
+
+
+def _latency_summary(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        'p50_ms': _ms(percentile(latencies, 0.50)),
+        'p90_ms': _ms(percentile(latencies, 0.90)),
+        'p99_ms': _ms(percentile(latencies, 0.99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+    }
+
+
+def summarise(samples, elapsed, health_before, health_after, failures, config):
+    """把原始樣本匯總為總體與每個端點的延遲、吞吐量，並附上服務端統計的變化。"""
+    by_endpoint = {}
+    for endpoint, status, latency in samples:
+        by_endpoint.setdefault(endpoint, []).append((status, latency))
+    server = {key: health_after[key] - health_before.get(key, 0)
+              for key in ('requests', 'coalesced', 'rejected', 'errors', 'reloads')
+              if isinstance(health_after.get(key), int)}
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': config,
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': _latency_summary([latency for _, _, latency in samples],
+                                    sum(1 for _, status, _ in samples if _is_error(status)), elapsed),
+        'endpoints': {
+            endpoint: _latency_summary([latency for _, latency in items],
+                                       sum(1 for status, _ in items if _is_error(status)), elapsed)
+            for endpoint, items in sorted(by_endpoint.items())
+        },
+        'server': server,
+        'workers': health_after.get('workers'),
+        'connection_failures': failures[:20],
+    }
+
+
+def format_summary(result):
+    lines = [f"{'端點':<16}{'請求數':>8}{'錯誤':>6}{'請求/秒':>10}{'p50':>9}{'p90':>9}{'p99':>9}{'最大':>9}  (毫秒)"]
+    rows = list(result['endpoints'].items()) + [('總計', result['overall'])]
+    for name, entry in rows:
+        ms = [f"{entry[key]:>9.2f}" if entry[key] is not None else f"{'-':>9}"
+              for key in ('p50_ms', 'p90_ms', 'p99_ms', 'max_ms')]
+        lines.append(f"{name:<16}{entry['requests']:>8}{entry['errors']:>6}{entry['throughput_rps'] or 0:>10.1f}"
+                     + ''.join(ms))
+    server = result['server']
+    if server:
+        lines.append(f"服務端: {server.get('requests', 0)} 個請求，合併 {server.get('coalesced', 0)} 個，"
+                     f"拒絕 (503) {server.get('rejected', 0)} 個，錯誤 {server.get('errors', 0)} 個 "
+                     f"({result['workers']} 個查詢線程)")
+    return '\n'.join(lines)
+
+
+# --- 子進程服務 ---
+def spawn_server(db_file, workers=None):
+    """在子進程中啟動服務 (隨機端口)。Returns: tuple (進程, host, port)。"""
+    command = [sys.executable, '-m', 'azurlane_analyzer.server', '--db', str(db_file), '--port', '0',
+               '--log-level', 'WARNING']
+    if workers:
+        command += ['--workers', str(workers)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, encoding='utf-8')
+    deadline = time.monotonic() + SPAWN_TIMEOUT
+    while time.monotonic() < deadline:
+        line = process.stdout.readline()
+        if not line:
+            break
+        match = _ADDRESS_PATTERN.search(line)
+        if match:
+            return process, match.group(1), int(match.group(2))
+    process.kill()
+    raise RuntimeError("查詢服務未能啟動 (詳見上方的錯誤輸出)")
+
+
+# --- 主執行入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="查詢服務負載測試 (報告吞吐量與 p99 延遲)")
+    parser.add_argument('--url', default=DEFAULT_URL, help=f"服務地址 (默認 {DEFAULT_URL})")
+    parser.add_argument('--spawn', action='store_true', help="在子進程中啟動服務並對其測試 (忽略 --url)")
+    parser.add_argument('--db', type=Path, default=DEFAULT_DB_FILE, help="--spawn 時服務使用的數據庫")
+    parser.add_argument('--workers', type=int, help="--spawn 時服務的查詢線程數")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION,
+                        help=f"測試時長，秒 (默認 {DEFAULT_DURATION:.0f}，不含預熱)")
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP, help=f"預熱時長，秒 (默認 {DEFAULT_WARMUP:.0f})")
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS,
+                        help=f"併發連接數 (默認 {DEFAULT_CONNECTIONS})")
+    parser.add_argument('--rate', type=float, help="開環模式的總請求速率 (請求/秒)；不指定時為閉環 (最大吞吐量)")
+    parser.add_argument('--mix', type=json.loads, default=DEFAULT_MIX,
+                        help=f"請求組合的權重 (JSON，默認 {json.dumps(DEFAULT_MIX)})")
+    parser.add_argument('--seed', type=int, default=0, help="請求序列的隨機種子")
+    parser.add_argument('--output', type=Path, help="把結果寫入 JSON 文件")
+    args = parser.parse_args()
+
+    configure_logging()
+    server_process = None
+    if args.spawn:
+        if not args.db.is_file():
+            print(f"數據庫文件未找到: {args.db}", file=sys.stderr)
+            sys.exit(1)
+        server_process, host, port = spawn_server(args.db, args.workers)
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    mode = f"開環 {args.rate:.0f} 請求/秒" if args.rate else "閉環"
+    print(f"負載測試: http://{host}:{port}，{args.connections} 個連接，{mode}，"
+          f"預熱 {args.warmup:.0f} 秒 + 測量 {args.duration:.0f} 秒")
+    try:
+        result = asyncio.run(run_load(host, port, args.duration, args.connections, args.rate,
+                                      args.warmup, args.mix, args.seed))
+    except (ConnectionError, OSError, ValueError) as e:
+        print(f"負載測試失敗: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait(timeout=10)
+
+    print(format_summary(result))
+    if result['connection_failures']:
+        print(f"連接錯誤 (前 {len(result['connection_failures'])} 條): {result['connection_failures'][0]} …")
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"結果已寫入: {args.output}")
+    sys.exit(1 if result['overall']['errors'] else 0)
@@ -0,0 +1,576 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/benchmark.py
+#
+# 預處理流水線的基準測試。
+#   - 分別測量 main.PIPELINE_STEPS 中每個步驟的 parse / write 階段 (只有 run(ctx) 的步驟測量 run)，
+#     以及完整流水線 (main.run_preprocessing，全量重建)；
+#   - 除了隨倉庫附帶的 AzurLaneData/sharecfgdata，還可以在按倍數合成的放大數據上運行 (--scales 1 10 100):
+#     第 k 份副本的所有 ID 加上 k × 步長，並同步平移 'base' 繼承、weapon_id、強化鏈 prev/next/group 等引用，
+#     因此繼承鏈與跨文件引用在放大後仍然成立 (見 SCALE_REFERENCE_FIELDS)；
+#   - 每次測量都在獨立的子進程中執行，峰值 RSS 互不干擾；單個步驟從「之前所有步驟已寫入」的數據庫快照開始，
+#     與流水線中的實際狀態一致；每項重複 --repeat 次，取牆鐘時間的中位數與峰值 RSS 的最大值；
+#   - 結果 (牆鐘時間、峰值 RSS、行/秒) 寫入機器可讀的 JSON 文件；--baseline 與之前保存的結果逐項比較，
+#     超過閾值的退化以非零退出碼返回 (供 CI 使用)；
+#   - --compare-write-modes 對每個步驟的 write / run 階段再以逐行 execute 模式 (AZURLANE_PER_ROW_WRITES=1)
+#     測量一次，記錄為 '<階段>@per_row'，並輸出 executemany 相對逐行寫入的加速比
+#     (整個階段，以及其中 BulkWriter 寫入部分)。
+#
+# 行數的含義: parse 階段為輸入 JSON 的頂層條目數；write / run / pipeline 為 bulk_write 寫入的行數。
+#
+# 用法:
+#     python -m azurlane_analyzer.preprocessing.benchmark --scales 1 10 --save-baseline
+#     python -m azurlane_analyzer.preprocessing.benchmark --scales 1 10 --baseline DataOutput/benchmarks/baseline.json
+#     python -m azurlane_analyzer.preprocessing.benchmark --scales 1 --no-pipeline --compare-write-modes
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing.bulk_writer import MODE_PER_ROW, WRITE_STATS, bulk_load_pragmas
+from azurlane_analyzer.preprocessing.json_stream import iter_json_records
+from azurlane_analyzer.preprocessing.log import configure_logging, get_logger
+from azurlane_analyzer.preprocessing.main import (
+    JSON_DATA_DIR,
+    OUTPUT_DIR,
+    PIPELINE_STEPS,
+    PROJECT_ROOT,
+    create_all_tables,
+    run_preprocessing,
+)
+from azurlane_analyzer.preprocessing.manifest import InputFingerprints, get_step_inputs
+from azurlane_analyzer.preprocessing.pipeline import (
+    JsonCache,
+    StepContext,
+    StepError,
+    has_parse_phase,
+    load_step,
+    open_connection,
+    run_pipeline,
+    run_step,
+)
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組，峰值 RSS 記為 None
+    resource = None
+
+logger = get_logger(__name__)
+
+# --- 配置 ---
+BENCHMARK_DIR = OUTPUT_DIR / 'benchmarks'
+DEFAULT_RESULT_FILE = BENCHMARK_DIR / 'latest.json'
+DEFAULT_BASELINE_FILE = BENCHMARK_DIR / 'baseline.json'
+DEFAULT_WORK_DIR = BENCHMARK_DIR / 'work'
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_REPEAT = 3
+DEFAULT_TIME_THRESHOLD = 0.20   # 牆鐘時間比基線慢 20% 以上視為退化
+DEFAULT_RSS_THRESHOLD = 0.20    # 峰值 RSS 比基線高 20% 以上視為退化
+RESULT_SCHEMA_VERSION = 1
+PIPELINE_PHASE = 'pipeline'
+PER_ROW_SUFFIX = '@per_row'      # --compare-write-modes 中逐行寫入模式的階段名後綴
+
+# 子進程在標準輸出的最後以此前綴輸出一行 JSON 結果
+_RESULT_MARKER = 'BENCHMARK_RESULT '
+_WORKER_LOG_LEVEL = 'WARNING'
+
+# --- 合成放大數據 ---
+# 放大時隨 ID 一起平移的引用欄位 (文件名 -> 欄位)；未列出的文件只平移頂層鍵與 'id'/'base'。
+# bullet/barrage/skill/物品等 ID 保持不變 (副本共用同一批子彈與材料，與真實數據中新裝備複用舊資源一致)。
+SCALE_COMMON_FIELDS = ('id', 'base')
+SCALE_REFERENCE_FIELDS = {
+    'equip_data_statistics.json': ('weapon_id',),
+    'equip_data_template.json': ('prev', 'next', 'group'),
+}
+_SCALE_STAMP_FILE = '.scale.json'
+
+
+def _shift_reference(value, offset):
+    """平移一個 ID 引用 (整數、數字字符串或它們的列表)；0 / 空值表示「沒有引用」，保持不變。"""
+    if isinstance(value, bool) or not value:
+        return value
+    if isinstance(value, int):
+        return value + offset
+    if isinstance(value, str) and value.isdigit():
+        return str(int(value) + offset)
+    if isinstance(value, list):
+        return [_shift_reference(item, offset) for item in value]
+    return value
+
+
+def scale_id_stride(json_files):
+    """所有文件共用的 ID 步長: 大於最大頂層 ID 的最小 10 的冪 (各副本的 ID 區間互不重疊)。"""
+    max_id = 0
+    for path in json_files:
+        for key, _ in iter_json_records(path):
+            if key.isdigit():
+                max_id = max(max_id, int(key))
+    return 10 ** len(str(max_id))
+
+
+def scale_json_file(source, target, factor, stride):
+    """
+    把一個 sharecfgdata 文件放大為 factor 份 (串流讀寫，只在記憶體中保留一條記錄)。
+    Returns:
+        int: 寫入的頂層條目數。
+    """
+    fields = set(SCALE_COMMON_FIELDS) | set(SCALE_REFERENCE_FIELDS.get(source.name, ()))
+    count = 0
+    with open(target, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for copy in range(factor):
+            offset = copy * stride
+            for key, record in iter_json_records(source):
+                if offset and key.isdigit():
+                    key = str(int(key) + offset)
+                    if isinstance(record, dict):
+                        record = {name: _shift_reference(value, offset) if name in fields else value
+                                  for name, value in record.items()}
+                f.write((',' if count else '') + json.dumps(key) + ':'
+                        + json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                count += 1
+        f.write('}')
+    return count
+
+
+def prepare_scaled_data(source_dir, work_dir, factor):
+    """
+    返回放大 factor 倍的數據目錄及各文件的條目數 (factor 為 1 時直接使用源目錄)。
+    源文件內容未變化時復用上次生成的數據。
+    Returns:
+        tuple: (數據目錄 Path, {文件名: 頂層條目數})。
+    """
+    source_dir = Path(source_dir)
+    json_files = sorted(source_dir.glob('*.json'))
+    fingerprints = InputFingerprints(source_dir)
+    stamp = {'factor': factor, 'sources': {path.name: fingerprints.content_hash(path.name) for path in json_files}}
+
+    if factor == 1:
+        counts = {path.name: sum(1 for _ in iter_json_records(path)) for path in json_files}
+        return source_dir, counts
+
+    target_dir = Path(work_dir) / 'data' / f'x{factor}'
+    stamp_file = target_dir / _SCALE_STAMP_FILE
+    if stamp_file.is_file():
+        previous = json.loads(stamp_file.read_text(encoding='utf-8'))
+        if {key: previous.get(key) for key in stamp} == stamp:
+            logger.info("  復用已生成的 %d× 數據: %s", factor, target_dir)
+            return target_dir, previous['counts']
+
+    if target_dir.exists():
+        shutil.rmtree(target_dir)
+    target_dir.mkdir(parents=True)
+    start_time = time.perf_counter()
+    stride = scale_id_stride(json_files)
+    counts = {path.name: scale_json_file(path, target_dir / path.name, factor, stride) for path in json_files}
+    stamp.update(stride=stride, counts=counts)
+    stamp_file.write_text(json.dumps(stamp, indent=2), encoding='utf-8')
+    logger.info("  已生成 %d× 數據 (ID 步長 %d，%s)，耗時 %.1f 秒。", factor, stride,
+                ', '.join(f'{name}: {count}' for name, count in counts.items()), time.perf_counter() - start_time)
+    return target_dir, counts
+
+
+# --- 子進程中的測量 ---
+def peak_rss_kb():
+    """本進程 (及已結束的子進程，例如流水線的解析進程池) 的峰值 RSS，單位 KiB。"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak // 1024 if sys.platform == 'darwin' else peak  # macOS 以字節為單位
+
+
+def _written_rows():
+    return sum(rows for rows, _ in dict(WRITE_STATS.items()).values())
+
+
+def _write_seconds():
+    """BulkWriter 寫入 (executemany 或逐行 execute) 本身的累計耗時。"""
+    return sum(seconds for _, seconds in dict(WRITE_STATS.items()).values())
+
+
+def _copy_database(source, target):
+    """以 SQLite 備份 API 複製數據庫 (不受 WAL 文件影響)。"""
+    target = Path(target)
+    target.unlink(missing_ok=True)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _worker_prepare(spec):
+    """
+    依次執行所有步驟 (不計時)，在每個步驟之前保存一份數據庫快照:
+    快照 i 即流水線中步驟 i 開始時的數據庫狀態。
+    """
+    db_file = Path(spec['db_file'])
+    db_file.unlink(missing_ok=True)
+    create_all_tables(db_file)
+    for index, step_name in enumerate(spec['steps']):
+        _copy_database(db_file, spec['snapshots'][index])
+        # 失敗的步驟 (例如缺少輸入文件) 已回滾，不影響後續步驟的快照
+        run_pipeline([step_name], spec['json_dir'], db_file)
+    return []
+
+
+def _worker_step(spec):
+    """從快照開始執行單個步驟，分別計時 parse 與 write (或 run) 階段。"""
+    step_name = spec['step']
+    _copy_database(spec['snapshot'], spec['db_file'])
+    module = load_step(step_name)
+    json_cache = JsonCache(spec['json_dir'])
+    conn = open_connection(spec['db_file'])
+    ctx = StepContext(spec['json_dir'], spec['db_file'], conn, json_cache)
+    results = []
+    try:
+        with bulk_load_pragmas(conn):
+            WRITE_STATS.clear()
+            if has_parse_phase(module):
+                start_time = time.perf_counter()
+                payload = module.parse(json_cache)
+                results.append({'phase': f'{step_name}.parse', 'seconds': time.perf_counter() - start_time,
+                                'rows': None, 'peak_rss_kb': peak_rss_kb(), 'ok': True})
+                phase = f'{step_name}.write'
+                start_time = time.perf_counter()
+                ok = run_step(step_name, ctx, payload)
+            else:
+                phase = f'{step_name}.run'
+                start_time = time.perf_counter()
+                ok = run_step(step_name, ctx)
+            results.append({'phase': phase, 'seconds': time.perf_counter() - start_time,
+                            'rows': _written_rows(), 'write_seconds': _write_seconds(),
+                            'peak_rss_kb': peak_rss_kb(), 'ok': ok})
+    finally:
+        conn.close()
+    return results
+
+
+def _worker_pipeline(spec):
+    """在全新的數據庫上執行完整流水線 (與 main.py --full 相同)。"""
+    db_file = Path(spec['db_file'])
+    db_file.unlink(missing_ok=True)
+    start_time = time.perf_counter()
+    ok = run_preprocessing(db_file, spec['json_dir'], full=True, steps=spec['steps'])
+    return [{'phase': PIPELINE_PHASE, 'seconds': time.perf_counter() - start_time,
+             'rows': _written_rows(), 'peak_rss_kb': peak_rss_kb(), 'ok': ok}]
+
+
+_WORKERS = {
+    'prepare': _worker_prepare,
+    'step': _worker_step,
+    'pipeline': _worker_pipeline,
+}
+
+
+def run_worker(spec):
+    """子進程入口: 執行一項測量並在標準輸出的最後一行輸出結果。"""
+    configure_logging(_WORKER_LOG_LEVEL)
+    results = _WORKERS[spec['kind']](spec)
+    sys.stdout.flush()
+    print(_RESULT_MARKER + json.dumps(results), flush=True)
+
+
+def _spawn(spec, work_dir):
+    """在新的 Python 進程中執行一項測量，返回其結果列表。"""
+    env = dict(os.environ)
+    env.update({'AZURLANE_LOG_LEVEL': _WORKER_LOG_LEVEL, 'AZURLANE_LOG_DIR': str(Path(work_dir) / 'logs')})
+    env['AZURLANE_PER_ROW_WRITES'] = '1' if spec.get('write_mode') == MODE_PER_ROW else '0'
+    completed = subprocess.run(
+        [sys.executable, '-m', 'azurlane_analyzer.preprocessing.benchmark', '--worker', json.dumps(spec)],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, encoding='utf-8',
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(_RESULT_MARKER):
+            return json.loads(line[len(_RESULT_MARKER):])
+    tail = '\n'.join(completed.stderr.strip().splitlines()[-15:])
+    raise RuntimeError(f"基準測試子進程 ({spec['kind']}) 失敗，退出碼 {completed.returncode}:\n{tail}")
+
+
+# --- 編排 ---
+def _benchmarkable_steps(step_names, data_dir):
+    """返回 (可測量的步驟, {跳過的步驟: 原因})：步驟必須能載入且所有輸入文件都存在。"""
+    available, skipped = [], {}
+    for step_name in step_names:
+        try:
+            module = load_step(step_name)
+        except StepError as e:
+            skipped[step_name] = str(e)
+            continue
+        missing = [name for name in get_step_inputs(module) or () if not (Path(data_dir) / name).is_file()]
+        if missing:
+            skipped[step_name] = f"缺少輸入文件: {', '.join(missing)}"
+        else:
+            available.append((step_name, module))
+    return available, skipped
+
+
+def _summarise(scale, phase, samples, rows=None):
+    """把多次重複的原始結果匯總為一條記錄 (牆鐘時間取中位數，峰值 RSS 取最大值)。"""
+    seconds = statistics.median(sample['seconds'] for sample in samples)
+    rss = [sample['peak_rss_kb'] for sample in samples if sample['peak_rss_kb'] is not None]
+    rows = samples[0]['rows'] if rows is None else rows
+    write_seconds = [sample['write_seconds'] for sample in samples if sample.get('write_seconds') is not None]
+    return {
+        'scale': scale,
+        'phase': phase,
+        'wall_seconds': round(seconds, 6),
+        'wall_seconds_samples': [round(sample['seconds'], 6) for sample in samples],
+        'peak_rss_kb': max(rss) if rss else None,
+        'rows': rows,
+        'rows_per_second': round(rows / seconds, 1) if rows and seconds > 0 else None,
+        'write_seconds': round(statistics.median(write_seconds), 6) if write_seconds else None,
+        'ok': all(sample['ok'] for sample in samples),
+    }
+
+
+def _speedup(slow, fast):
+    return round(slow / fast, 2) if slow and fast else None
+
+
+def _per_row_comparison(scale, spec, repeat, work_dir, results):
+    """
+    以逐行 execute 模式重新測量步驟的 write / run 階段 (parse 階段與寫入模式無關，不重複測量)，
+    並在 executemany 的結果中記錄加速比。
+    Args:
+        results (dict): {階段名: executemany 模式的匯總記錄}，原地加入 speedup 字段。
+    Returns:
+        list: 逐行模式的匯總記錄 (階段名帶 PER_ROW_SUFFIX)。
+    """
+    samples = [_spawn(dict(spec, write_mode=MODE_PER_ROW), work_dir) for _ in range(repeat)]
+    per_row_results = []
+    for index, first in enumerate(samples[0]):
+        fast = results.get(first['phase'])
+        if fast is None or first['phase'].endswith('.parse'):
+            continue
+        slow = _summarise(scale, first['phase'] + PER_ROW_SUFFIX, [sample[index] for sample in samples])
+        fast['speedup_vs_per_row'] = _speedup(slow['wall_seconds'], fast['wall_seconds'])
+        fast['write_speedup_vs_per_row'] = _speedup(slow['write_seconds'], fast['write_seconds'])
+        per_row_results.append(slow)
+    return per_row_results
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeat=DEFAULT_REPEAT, steps=PIPELINE_STEPS,
+                   json_dir=JSON_DATA_DIR, work_dir=DEFAULT_WORK_DIR, include_pipeline=True,
+                   compare_write_modes=False):
+    """
+    在每個放大倍數上測量各步驟與完整流水線。
+    Args:
+        scales (tuple): 放大倍數 (1 為原始數據)。
+        repeat (int): 每項測量的重複次數。
+        steps (tuple): 要測量的步驟 (默認為 main.PIPELINE_STEPS)。
+        json_dir (Path): 源 sharecfgdata 目錄。
+        work_dir (Path): 放大數據、數據庫快照與日誌的工作目錄。
+        include_pipeline (bool): 是否測量完整流水線。
+        compare_write_modes (bool): 是否同時以逐行寫入模式測量 write / run 階段並計算加速比。
+    Returns:
+        dict: 機器可讀的結果 (見 RESULT_SCHEMA_VERSION)。
+    """
+    work_dir = Path(work_dir)
+    results, skipped = [], {}
+    for scale in scales:
+        logger.info("\n=== 放大倍數 %d× ===", scale)
+        data_dir, record_counts = prepare_scaled_data(json_dir, work_dir, scale)
+        available, skipped_steps = _benchmarkable_steps(steps, data_dir)
+        for step_name, reason in skipped_steps.items():
+            skipped[step_name] = reason
+            logger.info("  跳過步驟 %s: %s", step_name, reason)
+
+        scale_dir = work_dir / f'x{scale}'
+        snapshots = [str(scale_dir / 'snapshots' / f'{index:02d}_{step_name}.db')
+                     for index, step_name in enumerate(steps)]
+        _spawn({'kind': 'prepare', 'json_dir': str(data_dir), 'steps': list(steps),
+                'db_file': str(scale_dir / 'prepare.db'), 'snapshots': snapshots}, work_dir)
+
+        for step_name, module in available:
+            spec = {'kind': 'step', 'step': step_name, 'json_dir': str(data_dir),
+                    'snapshot': snapshots[list(steps).index(step_name)], 'db_file': str(scale_dir / 'step.db')}
+            samples = [_spawn(spec, work_dir) for _ in range(repeat)]
+            input_rows = sum(record_counts.get(name, 0) for name in get_step_inputs(module) or ())
+            step_results = {}
+            for index, first in enumerate(samples[0]):
+                phase_samples = [sample[index] for sample in samples]
+                rows = input_rows if first['phase'].endswith('.parse') else None
+                step_results[first['phase']] = _summarise(scale, first['phase'], phase_samples, rows)
+            if compare_write_modes:
+                step_results.update((result['phase'], result) for result in
+                                    _per_row_comparison(scale, spec, repeat, work_dir, step_results))
+            for result in step_results.values():
+                results.append(result)
+                logger.info("  %s", format_result(result))
+
+        if include_pipeline:
+            spec = {'kind': 'pipeline', 'json_dir': str(data_dir), 'steps': list(steps),
+                    'db_file': str(scale_dir / 'pipeline.db')}
+            samples = [_spawn(spec, work_dir)[0] for _ in range(repeat)]
+            results.append(_summarise(scale, PIPELINE_PHASE, samples))
+            logger.info("  %s", format_result(results[-1]))
+
+    return {
+        'schema': RESULT_SCHEMA_VERSION,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'git_commit': _git_commit(),
+        },
+        'repeat': repeat,
+        'scales': list(scales),
+        'compare_write_modes': compare_write_modes,
+        'skipped_steps': skipped,
+        'results': results,
+    }
+
+
+def _git_commit():
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                   capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def format_result(result):
+    rss = f"{result['peak_rss_kb'] / 1024:.1f} MiB" if result['peak_rss_kb'] is not None else '-'
+    rate = f"{result['rows_per_second']:,.0f} 行/秒" if result['rows_per_second'] else '-'
+    status = '' if result['ok'] else '  (失敗)'
+    speedup = ''
+    if result.get('speedup_vs_per_row'):
+        write_speedup = result.get('write_speedup_vs_per_row')
+        speedup = (f"  相對逐行寫入 {result['speedup_vs_per_row']:.2f}× "
+                   f"(寫入部分 {f'{write_speedup:.2f}×' if write_speedup else '-'})")
+    return (f"{result['scale']:>4}× {result['phase']:<40} {result['wall_seconds']:>9.3f} 秒  "
+            f"{rss:>11}  {rate:>16}{speedup}{status}")
+
+
+# --- 與基線比較 ---
+def compare_results(current, baseline, time_threshold=DEFAULT_TIME_THRESHOLD, rss_threshold=DEFAULT_RSS_THRESHOLD):
+    """
+    逐項 (放大倍數, 階段) 比較兩次結果。
+    Returns:
+        tuple: (比較記錄列表, 退化記錄列表)。每條記錄包含兩邊的牆鐘時間與峰值 RSS 及其比值。
+    """
+    previous = {(result['scale'], result['phase']): result for result in baseline['results']}
+    comparisons, regressions = [], []
+    for result in current['results']:
+        old = previous.get((result['scale'], result['phase']))
+        if old is None:
+            continue
+        time_ratio = result['wall_seconds'] / old['wall_seconds'] if old['wall_seconds'] else None
+        rss_ratio = (result['peak_rss_kb'] / old['peak_rss_kb']
+                     if result['peak_rss_kb'] and old['peak_rss_kb'] else None)
+        entry = {
+            'scale': result['scale'], 'phase': result['phase'],
+            'wall_seconds': result['wall_seconds'], 'baseline_wall_seconds': old['wall_seconds'],
+            'time_ratio': time_ratio,
+            'peak_rss_kb': result['peak_rss_kb'], 'baseline_peak_rss_kb': old['peak_rss_kb'],
+            'rss_ratio': rss_ratio,
+            'regressed': [],
+        }
+        if time_ratio is not None and time_ratio > 1 + time_threshold:
+            entry['regressed'].append('time')
+        if rss_ratio is not None and rss_ratio > 1 + rss_threshold:
+            entry['regressed'].append('rss')
+        if old['ok'] and not result['ok']:
+            entry['regressed'].append('failed')
+        comparisons.append(entry)
+        if entry['regressed']:
+            regressions.append(entry)
+    return comparisons, regressions
+
+
+def format_comparison(entry):
+    def ratio(value):
+        return f"{value:6.2f}×" if value is not None else '     -'
+    flag = f"  <-- 退化 ({', '.join(entry['regressed'])})" if entry['regressed'] else ''
+    return (f"{entry['scale']:>4}× {entry['phase']:<40} {entry['baseline_wall_seconds']:>9.3f} -> "
+            f"{entry['wall_seconds']:>9.3f} 秒 {ratio(entry['time_ratio'])}   RSS {ratio(entry['rss_ratio'])}{flag}")
+
+
+def write_results(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+
+
+# --- 主執行入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="預處理流水線基準測試")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES),
+                        help=f"數據放大倍數 (默認 {' '.join(map(str, DEFAULT_SCALES))})")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f"每項測量的重複次數，取中位數 (默認 {DEFAULT_REPEAT})")
+    parser.add_argument('--steps', nargs='+', default=list(PIPELINE_STEPS),
+                        help="只測量指定步驟 (默認為 main.py 的全部步驟)")
+    parser.add_argument('--no-pipeline', action='store_true', help="不測量完整流水線")
+    parser.add_argument('--compare-write-modes', action='store_true',
+                        help="同時以逐行 execute 模式測量各步驟的 write / run 階段，輸出 executemany 的加速比")
+    parser.add_argument('--json-dir', type=Path, default=JSON_DATA_DIR,
+                        help=f"源 JSON 數據目錄 (默認 {JSON_DATA_DIR})")
+    parser.add_argument('--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+                        help=f"放大數據與臨時數據庫的目錄 (默認 {DEFAULT_WORK_DIR})")
+    parser.add_argument('--output', type=Path, default=DEFAULT_RESULT_FILE,
+                        help=f"結果文件 (默認 {DEFAULT_RESULT_FILE})")
+    parser.add_argument('--save-baseline', nargs='?', type=Path, const=DEFAULT_BASELINE_FILE,
+                        help=f"同時把結果保存為基線 (默認 {DEFAULT_BASELINE_FILE})")
+    parser.add_argument('--baseline', type=Path, help="與指定的基線結果比較，有退化時以退出碼 1 結束")
+    parser.add_argument('--compare-only', type=Path, metavar='RESULT',
+                        help="不運行測量，直接把已有的結果文件與 --baseline 比較")
+    parser.add_argument('--time-threshold', type=float, default=DEFAULT_TIME_THRESHOLD,
+                        help=f"牆鐘時間的退化閾值 (默認 {DEFAULT_TIME_THRESHOLD * 100:.0f}%%)")
+    parser.add_argument('--rss-threshold', type=float, default=DEFAULT_RSS_THRESHOLD,
+                        help=f"峰值 RSS 的退化閾值 (默認 {DEFAULT_RSS_THRESHOLD * 100:.0f}%%)")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(json.loads(args.worker))
+        sys.exit(0)
+
+    configure_logging(args.log_level)
+    if args.compare_only:
+        if not args.baseline:
+            parser.error("--compare-only 需要同時指定 --baseline")
+        current = json.loads(args.compare_only.read_text(encoding='utf-8'))
+    else:
+        current = run_benchmarks(args.scales, args.repeat, tuple(args.steps), args.json_dir,
+                                 args.work_dir, include_pipeline=not args.no_pipeline,
+                                 compare_write_modes=args.compare_write_modes)
+        write_results(current, args.output)
+        print(f"\n結果已寫入: {args.output}")
+        if args.save_baseline:
+            write_results(current, args.save_baseline)
+            print(f"基線已保存: {args.save_baseline}")
+
+    failed = [f"{result['scale']}× {result['phase']}" for result in current['results'] if not result['ok']]
+    if failed:
+        print(f"注意: 以下測量項未成功 (詳見工作目錄下 logs/ 中的步驟日誌): {', '.join(failed)}")
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        comparisons, regressions = compare_results(current, baseline, args.time_threshold, args.rss_threshold)
+        print(f"\n與基線 {args.baseline} ({baseline.get('created_at')}, "
+              f"{baseline.get('environment', {}).get('git_commit')}) 比較:")
+        for entry in comparisons:
+            print(format_comparison(entry))
+        if regressions:
+            print(f"\n!!! {len(regressions)} 項退化 (時間閾值 {args.time_threshold:.0%}，"
+                  f"RSS 閾值 {args.rss_threshold:.0%}) !!!", file=sys.stderr)
+            exit_code = 1
+        else:
+            print("\n沒有超過閾值的退化。")
+    sys.exit(exit_code)
@@ -0,0 +1,185 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/bulk_writer.py
+#
+# 預處理步驟共用的批量寫入層。
+#   - BulkWriter: 按塊 (chunk) 收集數據元組並以 executemany 寫入，
+#     取代每行一次 cursor.execute 的 Python -> SQLite 往返；
+#   - bulk_load_pragmas: 重建期間臨時使用適合批量載入的 PRAGMA
+#     (WAL、synchronous=OFF、更大的 cache_size)，結束後恢復原有 (安全的) 設置；
+#   - 每個步驟的寫入統計 (行數、耗時、行/秒) 匯總在 WRITE_STATS 中，由調度器在結束時打印。
+#
+# 設置環境變量 AZURLANE_PER_ROW_WRITES=1 (或 main.py --per-row-writes) 可退回逐行 execute，
+# 用於對比測量 executemany 帶來的加速 (benchmark.py --compare-write-modes 按步驟輸出加速比)。
+
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from azurlane_analyzer.preprocessing.log import get_logger
+
+logger = get_logger(__name__)
+
+# 每次 executemany 提交的行數
+DEFAULT_CHUNK_SIZE = 5000
+
+# 批量載入期間使用的 PRAGMA (名稱 -> 值)
+BULK_LOAD_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'OFF',
+    'cache_size': -65536,     # 負數表示 KiB，即 64 MiB
+    'temp_store': 'MEMORY',
+}
+
+# 寫入模式
+MODE_EXECUTEMANY = 'executemany'
+MODE_PER_ROW = 'per_row'
+
+
+def get_write_mode():
+    """當前寫入模式 (由環境變量 AZURLANE_PER_ROW_WRITES 控制)。"""
+    return MODE_PER_ROW if os.environ.get('AZURLANE_PER_ROW_WRITES') == '1' else MODE_EXECUTEMANY
+
+
+# --- 寫入統計 ---
+class WriteStats:
+    """按步驟/標籤累計寫入行數與耗時。"""
+
+    def __init__(self):
+        self._stats = {}
+
+    def add(self, label, rows, seconds):
+        total_rows, total_seconds = self._stats.get(label, (0, 0.0))
+        self._stats[label] = (total_rows + rows, total_seconds + seconds)
+
+    def items(self):
+        return self._stats.items()
+
+    def clear(self):
+        self._stats.clear()
+
+    def report(self, mode=None):
+        """打印每個標籤的寫入行數、耗時與吞吐。"""
+        if not self._stats:
+            return
+        mode = mode or get_write_mode()
+        logger.info("\n  數據庫寫入統計 (模式: %s):", mode)
+        for label, (rows, seconds) in self._stats.items():
+            # 耗時低於計時器精度 (0 秒) 時吞吐沒有意義，顯示為 '-'
+            rate = f'{rows / seconds:,.0f}' if seconds > 0 else '-'
+            logger.info("    - %s: %s 行，%.3f 秒，%s 行/秒", label, rows, seconds, rate)
+
+
+WRITE_STATS = WriteStats()
+
+
+# --- 批量寫入器 ---
+class BulkWriter:
+    """
+    將數據元組按塊以 executemany 寫入同一條 SQL。
+    用法:
+        with BulkWriter(cursor, SQL, label='equipment upsert') as writer:
+            for row in rows:
+                writer.add(row)
+    或一次寫入一個可迭代對象: writer.write_all(rows)。
+    """
+
+    def __init__(self, cursor, sql, label=None, chunk_size=DEFAULT_CHUNK_SIZE, mode=None):
+        self.cursor = cursor
+        self.sql = sql
+        self.label = label or sql.split()[0]
+        self.chunk_size = chunk_size
+        self.mode = mode or get_write_mode()
+        self.rows_written = 0
+        self.rowcount = 0          # SQLite 實際修改的行數 (各次 executemany 的 rowcount 之和)
+        self.seconds = 0.0
+        self._buffer = []
+
+    def add(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def write_all(self, rows):
+        """按塊寫入可迭代對象 (生成器也可以，不會一次性展開)。"""
+        self.flush()
+        iterator = iter(rows)
+        while True:
+            chunk = list(islice(iterator, self.chunk_size))
+            if not chunk:
+                break
+            self._execute(chunk)
+        return self
+
+    def flush(self):
+        if self._buffer:
+            chunk, self._buffer = self._buffer, []
+            self._execute(chunk)
+
+    def _execute(self, chunk):
+        start = time.perf_counter()
+        if self.mode == MODE_PER_ROW:
+            for row in chunk:
+                self.cursor.execute(self.sql, row)
+                if self.cursor.rowcount > 0:
+                    self.rowcount += self.cursor.rowcount
+        else:
+            self.cursor.executemany(self.sql, chunk)
+            if self.cursor.rowcount > 0:
+                self.rowcount += self.cursor.rowcount
+        self.seconds += time.perf_counter() - start
+        self.rows_written += len(chunk)
+
+    def close(self):
+        self.flush()
+        WRITE_STATS.add(self.label, self.rows_written, self.seconds)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+
+def bulk_write(cursor, sql, rows, label=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """一次性批量寫入的便捷函數。Returns: BulkWriter (可讀取 rows_written / rowcount / seconds)。"""
+    with BulkWriter(cursor, sql, label=label, chunk_size=chunk_size) as writer:
+        writer.write_all(rows)
+    return writer
+
+
+# --- 批量載入 PRAGMA ---
+def _get_pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+@contextmanager
+def bulk_load_pragmas(conn, pragmas=None):
+    """
+    在重建期間臨時切換到批量載入 PRAGMA，結束 (包括異常) 時恢復原設置並做一次 WAL checkpoint。
+    必須在事務之外調用 (journal_mode 不能在事務中修改)。
+    """
+    pragmas = BULK_LOAD_PRAGMAS if pragmas is None else pragmas
+    if conn.in_transaction:
+        conn.commit()
+    previous = {name: _get_pragma(conn, name) for name in pragmas}
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    logger.info("  已啟用批量載入設置: %s", ', '.join(f'{k}={v}' for k, v in pragmas.items()))
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        # 先恢復 synchronous 等設置，再把 WAL 內容寫回主文件並恢復原 journal_mode
+        for name, value in previous.items():
+            if name != 'journal_mode':
+                conn.execute(f"PRAGMA {name} = {value}")
+        if 'journal_mode' in previous:
+            try:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                conn.execute(f"PRAGMA journal_mode = {previous['journal_mode']}")
+            except Exception as e:
+                logger.warning("  警告: 恢復 journal_mode 失敗: %s", e)
+        logger.info("  已恢復數據庫的原有 PRAGMA 設置。")
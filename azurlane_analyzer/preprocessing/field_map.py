@@ -0,0 +1,146 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/field_map.py
+#
+# 聲明式欄位映射。
+# 步驟把「目標欄位 <- 來源鍵 + 轉換函數」寫成一個 Field 列表，FieldMap 在模組載入時把它預先整理為:
+#   - 一個行提取函數 extract(record, key): 按預先算好的 (來源, 默認值, 轉換, 是否多欄位) 表循環，
+#     直接返回數據元組 (熱循環中不再逐行組裝字典、不再按字符串鍵二次查找)；
+#   - 一條與元組順序一致的 INSERT 語句 (供 bulk_write / executemany 使用)。
+# 欄位順序只在 Field 列表中定義一次，新增欄位只需新增一行 Field。
+#
+# 用法:
+#     WEAPON_FIELDS = FieldMap('weapon_property', (
+#         Field('id', record_id, to_int),
+#         Field('bullet_ids', 'bullet_ID', to_json, default=[]),
+#     ), conflict=CONFLICT_REPLACE)
+#     rows = [WEAPON_FIELDS.extract(record, key) for key, record in records]
+#     bulk_write(cursor, WEAPON_FIELDS.sql, rows)
+
+import json
+
+# 衝突處理方式
+CONFLICT_NONE = None          # 普通 INSERT
+CONFLICT_REPLACE = 'replace'  # INSERT OR REPLACE
+CONFLICT_IGNORE = 'ignore'    # INSERT OR IGNORE
+CONFLICT_UPSERT = 'upsert'    # INSERT … ON CONFLICT(鍵) DO UPDATE SET 非鍵欄位
+
+
+# --- 常用來源與轉換函數 (輸入 None 時返回 None) ---
+def record_id(record, key):
+    """記錄自身的 'id'，缺失時使用它在頂層對象中的鍵。"""
+    return record.get('id', key)
+
+
+def to_int(value):
+    return None if value is None else int(value)
+
+
+def to_float(value):
+    return None if value is None else float(value)
+
+
+def to_text(value):
+    """數據庫中以 TEXT 存儲的分類欄位 (類型、稀有度、陣營等)。"""
+    return None if value is None else str(value)
+
+
+def to_json(value):
+    return json.dumps(value)
+
+
+def first_item(value):
+    """列表的第一個元素 (空列表或缺失時為 None)。"""
+    return value[0] if value else None
+
+
+def insert_sql(table, columns, conflict=CONFLICT_NONE, conflict_key=('id',), keep_existing=()):
+    """
+    生成與欄位順序一致的 INSERT 語句。
+    Args:
+        table (str): 目標表。
+        columns (tuple): 欄位名 (順序與數據元組一致)。
+        conflict: CONFLICT_* 之一。
+        conflict_key (tuple): CONFLICT_UPSERT 時的衝突鍵。
+        keep_existing (tuple): CONFLICT_UPSERT 時新值為 NULL 則保留舊值的欄位。
+    """
+    verb = {
+        CONFLICT_REPLACE: 'INSERT OR REPLACE',
+        CONFLICT_IGNORE: 'INSERT OR IGNORE',
+    }.get(conflict, 'INSERT')
+    sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    if conflict == CONFLICT_UPSERT:
+        assignments = [
+            f"{column} = COALESCE(excluded.{column}, {table}.{column})" if column in keep_existing
+            else f"{column} = excluded.{column}"
+            for column in columns if column not in conflict_key
+        ]
+        sql += f" ON CONFLICT({', '.join(conflict_key)}) DO UPDATE SET {', '.join(assignments)}"
+    return sql
+
+
+class Field:
+    """
+    一個目標欄位 (或一組欄位) 的映射。
+    Args:
+        column (str | tuple): 目標欄位名；為元組時 source 必須是返回同樣長度序列的函數。
+        source: 來源鍵 (str，默認與欄位同名)，或函數 source(record, key)。
+        convert: 可選的轉換函數，作用於來源值。
+        default: 來源鍵缺失時使用的值 (在轉換之前)。
+        keep_existing (bool): upsert 時新值為 NULL 則保留數據庫中的舊值。
+    """
+
+    __slots__ = ('columns', 'source', 'convert', 'default', 'keep_existing')
+
+    def __init__(self, column, source=None, convert=None, default=None, keep_existing=False):
+        self.columns = (column,) if isinstance(column, str) else tuple(column)
+        if len(self.columns) > 1 and not callable(source):
+            raise ValueError(f"多欄位映射 {self.columns} 的來源必須是函數")
+        self.source = column if source is None else source
+        self.convert = convert
+        self.default = default
+        self.keep_existing = keep_existing
+
+
+class FieldMap:
+    """
+    預先整理好的欄位映射。
+    Attributes:
+        table (str): 目標表。
+        columns (tuple): 所有目標欄位 (數據元組的順序)。
+        sql (str): 與 columns 順序一致的 INSERT 語句。
+        extract: 函數 extract(record, key=None) -> 數據元組。
+    """
+
+    def __init__(self, table, fields, conflict=CONFLICT_NONE, conflict_key=('id',)):
+        self.table = table
+        self.fields = tuple(fields)
+        self.columns = tuple(column for field in self.fields for column in field.columns)
+        if len(set(self.columns)) != len(self.columns):
+            raise ValueError(f"{table} 的欄位映射中有重複的欄位")
+        keep_existing = tuple(column for field in self.fields if field.keep_existing for column in field.columns)
+        self.sql = insert_sql(table, self.columns, conflict, conflict_key, keep_existing)
+        self.extract = self._compile()
+
+    def _compile(self):
+        """生成提取函數: 每個欄位預先整理為一項 (來源, 是否函數, 默認值, 轉換, 是否多欄位)，提取時按表循環。"""
+        steps = tuple(
+            (field.source, callable(field.source), field.default, field.convert, len(field.columns) > 1)
+            for field in self.fields
+        )
+
+        def extract(record, key=None):
+            get = record.get
+            values = []
+            for source, is_function, default, convert, multiple in steps:
+                value = source(record, key) if is_function else get(source, default)
+                if convert is not None:
+                    value = convert(value)
+                if multiple:
+                    values.extend(value)
+                else:
+                    values.append(value)
+            return tuple(values)
+
+        return extract
+
+    def __len__(self):
+        return len(self.columns)
@@ -0,0 +1,158 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/inheritance.py
+#
+# sharecfgdata 中 `base` 繼承鏈的共用解析器。
+# equip_data_statistics.json、equip_data_template.json、weapon_name.json 都使用相同的
+# 方案: 條目只寫出與 `base` 條目不同的欄位，其餘欄位沿用 `base` (可多層)。
+#
+# 與舊的 get_merged_equip_data (每個 ID 都遞迴解析並 .copy() 整條祖先鏈) 相比:
+#   - 迭代而非遞迴，按拓撲順序 (祖先先於子孫) 解析，查找時沿父條目循環，不受遞迴深度限制；
+#   - 每個條目只解析一次並記憶化，共用同一 base 的兄弟條目 (例如 50000 -> 50001…50007)
+#     直接重用父條目的結果；
+#   - 結果是寫時複製的疊加視圖 (InheritedRecord: 自身數據 + 指向已解析父條目的引用)，
+#     不複製任何字典；
+#   - 檢測 `base` 環並在環上斷開，而不是撞上遞迴上限。
+
+from collections.abc import Mapping
+
+from azurlane_analyzer.preprocessing.log import get_logger
+
+logger = get_logger(__name__)
+
+BASE_KEY = 'base'
+
+
+class InheritedRecord(Mapping):
+    """
+    繼承鏈上某個條目合併後的只讀視圖: 先查自身數據，找不到再查父條目 (已解析的 InheritedRecord)。
+    自身數據直接引用原始 JSON 字典，不做任何複製；需要獨立副本時使用 to_dict()。
+    (比 collections.ChainMap 少一層通用邏輯，get() 在熱循環中快得多。)
+    """
+
+    __slots__ = ('_own', '_parent')
+
+    def __init__(self, own, parent=None):
+        self._own = own
+        self._parent = parent
+
+    def __getitem__(self, key):
+        record = self
+        while record is not None:
+            own = record._own
+            if key in own:
+                return own[key]
+            record = record._parent
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        record = self
+        while record is not None:
+            own = record._own
+            if key in own:
+                return own[key]
+            record = record._parent
+        return default
+
+    def __contains__(self, key):
+        record = self
+        while record is not None:
+            if key in record._own:
+                return True
+            record = record._parent
+        return False
+
+    def __iter__(self):
+        seen = set()
+        record = self
+        while record is not None:
+            for key in record._own:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+            record = record._parent
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        """返回合併後的普通字典副本 (從根祖先往下依次寫入，子條目覆蓋)。"""
+        chain = []
+        record = self
+        while record is not None:
+            chain.append(record._own)
+            record = record._parent
+        merged = {}
+        for own in reversed(chain):
+            merged.update(own)
+        return merged
+
+    def __repr__(self):
+        return f"InheritedRecord({self.to_dict()!r})"
+
+
+def _overlay(own, parent):
+    """子條目自身數據疊加在已解析的父條目之上 (子條目的欄位優先)。"""
+    return InheritedRecord(own, parent)
+
+
+def resolve_inheritance(records, base_key=BASE_KEY, source_name=''):
+    """
+    解析所有條目的 `base` 繼承。
+    Args:
+        records (dict): {id_str: 原始數據字典}，即已解析的 sharecfgdata JSON。
+        base_key (str): 指向父條目 ID 的鍵名。
+        source_name (str): 來源文件名 (僅用於日誌)。
+    Returns:
+        dict: {id_str: 合併後的只讀映射 (InheritedRecord)}，鍵順序與 records 相同。
+              注意: 結果直接引用 records 中的原始字典，調用方不得修改。
+    """
+    resolved = {}
+    missing_count = 0
+    cycle_count = 0
+    prefix = f"{source_name}: " if source_name else ''
+
+    for start in records:
+        if start in resolved:
+            continue
+
+        # 1. 沿 base 向上走，收集尚未解析的祖先路徑 (path[i] 的父條目是 path[i + 1])
+        path = []
+        on_path = set()
+        anchor = None       # 路徑頂端之上、已解析的祖先
+        cycle_root = None   # 若遇到環，在此條目處斷開
+        node = start
+        while node is not None:
+            if node in resolved:
+                anchor = resolved[node]
+                break
+            if node in on_path:
+                cycle_root = node
+                cycle = path[path.index(node):] + [node]
+                cycle_count += 1
+                logger.warning("  嚴重警告: %s檢測到 'base' 循環 %s，將在 '%s' 處斷開。",
+                               prefix, ' -> '.join(cycle), node)
+                break
+            if node not in records:
+                missing_count += 1
+                logger.warning("  嚴重警告: %sID '%s' 的基礎 ID '%s' 未找到！將只使用 '%s' 的資料。",
+                               prefix, path[-1], node, path[-1])
+                break
+            path.append(node)
+            on_path.add(node)
+            base = records[node].get(base_key)
+            node = str(base) if base else None
+
+        # 2. 按拓撲順序 (祖先先於子孫) 解析路徑上的條目
+        if cycle_root is not None:
+            resolved[cycle_root] = _overlay(records[cycle_root], None)
+            anchor = resolved[cycle_root]
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            if node == cycle_root:
+                continue
+            parent = resolved[path[i + 1]] if i + 1 < len(path) else anchor
+            resolved[node] = _overlay(records[node], parent)
+
+    if missing_count or cycle_count:
+        logger.warning("  %s'base' 繼承解析: %d 個缺失的基礎 ID，%d 個循環。", prefix, missing_count, cycle_count)
+    # 保持與輸入相同的順序
+    return {key: resolved[key] for key in records}
@@ -0,0 +1,92 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/json_stream.py
+#
+# sharecfgdata JSON 的讀取後端。
+# sharecfgdata 的文件都是 {id: 記錄} 形式的頂層對象。不需要隨機訪問的步驟通過
+# iter_json_records() 逐條取得 (id, 記錄)，邊讀邊組裝數據行，不必先把整個嵌套字典留在記憶體中。
+#   - 安裝了 ijson 時真正串流解析 (峰值記憶體只與單條記錄大小有關)；
+#   - 否則退回整文件解析，但優先使用更快的 orjson，最後才是標準庫 json。
+# 環境變量 AZURLANE_JSON_BACKEND=ijson|orjson|json 可強制指定後端 (用於對比測量)。
+
+import json
+import os
+
+from azurlane_analyzer.preprocessing.log import get_logger
+
+try:
+    import ijson
+except ImportError:  # 可選依賴
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # 可選依賴
+    orjson = None
+
+logger = get_logger(__name__)
+
+BACKEND_ENV = 'AZURLANE_JSON_BACKEND'
+BACKEND_IJSON = 'ijson'      # 串流
+BACKEND_ORJSON = 'orjson'    # 整文件，快
+BACKEND_JSON = 'json'        # 整文件，標準庫
+
+_AVAILABLE = {
+    BACKEND_IJSON: ijson is not None,
+    BACKEND_ORJSON: orjson is not None,
+    BACKEND_JSON: True,
+}
+
+
+def get_backend():
+    """
+    返回當前使用的讀取後端。
+    環境變量指定的後端未安裝時給出警告並按默認順序 (ijson > orjson > json) 選擇。
+    """
+    requested = os.environ.get(BACKEND_ENV)
+    if requested:
+        if _AVAILABLE.get(requested):
+            return requested
+        logger.warning("  警告: JSON 後端 '%s' 不可用，改用默認後端。", requested)
+    for backend in (BACKEND_IJSON, BACKEND_ORJSON, BACKEND_JSON):
+        if _AVAILABLE[backend]:
+            return backend
+    return BACKEND_JSON
+
+
+def is_streaming(backend=None):
+    """當前後端是否真正串流 (否則 iter_json_records 會先解析整個文件)。"""
+    return (backend or get_backend()) == BACKEND_IJSON
+
+
+def load_json_file(path, backend=None):
+    """
+    整文件解析 JSON (需要隨機訪問，例如解析 'base' 繼承時使用)。
+    orjson 可用時使用 orjson；解析錯誤統一拋出 json.JSONDecodeError (orjson.JSONDecodeError 是其子類)。
+    """
+    backend = backend or get_backend()
+    if backend != BACKEND_JSON and orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_json_records(path, backend=None):
+    """
+    逐條產生頂層 JSON 對象中的 (id_str, 記錄)。
+    Args:
+        path (Path): JSON 文件路徑。
+        backend (str): 讀取後端；None 時由 get_backend() 決定。
+    Yields:
+        tuple: (id_str, 記錄字典)，順序與文件中相同。
+    """
+    backend = backend or get_backend()
+    if backend == BACKEND_IJSON:
+        with open(path, 'rb') as f:
+            # use_float: 小數解析為 float 而不是 Decimal，與 json/orjson 的結果一致
+            yield from ijson.kvitems(f, '', use_float=True)
+        return
+
+    data = load_json_file(path, backend)
+    if not isinstance(data, dict):
+        raise ValueError(f"文件 {path} 的頂層結構不是預期的字典。")
+    yield from data.items()
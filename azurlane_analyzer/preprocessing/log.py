@@ -0,0 +1,183 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/log.py
+#
+# 預處理流水線共用的分級日誌。
+#   - 所有模組通過 get_logger(__name__) 取得 'azurlane.*' 下的 logger，
+#     以 %-格式的參數調用 (logger.debug("ID %s", equip_id))，級別未啟用時不會格式化字符串；
+#     熱循環中先以 logger.isEnabledFor(DEBUG) 判斷一次，完全跳過逐條目的調試輸出；
+#   - 終端默認只顯示 INFO 及以上 (步驟的進度與匯總)，WARNING 及以上寫到 stderr；
+#   - step_log_file() 在步驟執行期間把同一份日誌另外寫入 <log_dir>/<step>.log；
+#   - StepCounters 累計逐條目的事件 (例如未識別的屬性名)，步驟結束時以一行匯總輸出，
+#     取代逐條目的打印。
+#
+# 級別由 main.py --log-level 或環境變量 AZURLANE_LOG_LEVEL 控制 (進程池的工作進程通過
+# 環境變量繼承同一設置)。
+
+import logging
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT_LOGGER_NAME = 'azurlane'
+DEFAULT_LEVEL = 'INFO'
+LOG_LEVEL_ENV = 'AZURLANE_LOG_LEVEL'
+LOG_DIR_ENV = 'AZURLANE_LOG_DIR'
+
+# 終端輸出保持與原 print 相同的外觀 (只有消息本身)；日誌文件附帶時間與級別
+CONSOLE_FORMAT = '%(message)s'
+FILE_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+DEBUG = logging.DEBUG
+
+_configured = False
+
+
+def get_logger(name):
+    """
+    返回 'azurlane' 命名空間下的 logger。
+    Args:
+        name (str): 模組名 (通常傳入 __name__) 或步驟名。
+    """
+    if name.startswith(ROOT_LOGGER_NAME + '.') or name == ROOT_LOGGER_NAME:
+        return logging.getLogger(name)
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name.rsplit('.', 1)[-1]}")
+
+
+class _BelowLevelFilter(logging.Filter):
+    """只放行低於指定級別的記錄 (stdout 處理器用，WARNING 及以上交給 stderr)。"""
+
+    def __init__(self, level):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record):
+        return record.levelno < self.level
+
+
+class _StdStream:
+    """延遲解析的 sys.stdout / sys.stderr 代理。"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def write(self, text):
+        return getattr(sys, self.name).write(text)
+
+    def flush(self):
+        getattr(sys, self.name).flush()
+
+
+def configure_logging(level=None, log_dir=None):
+    """
+    配置 'azurlane' 根 logger 的終端輸出 (可重複調用，後一次覆蓋前一次)。
+    Args:
+        level (str|int): 日誌級別；None 時取環境變量 AZURLANE_LOG_LEVEL，默認 INFO。
+        log_dir (Path): 每個步驟的日誌文件目錄；None 時取環境變量 AZURLANE_LOG_DIR (未設置則不寫文件)。
+    Returns:
+        logging.Logger: 已配置的根 logger。
+    """
+    global _configured
+    level = level if level is not None else os.environ.get(LOG_LEVEL_ENV, DEFAULT_LEVEL)
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    # 寫入環境變量，讓 (spawn 方式啟動的) 工作進程使用相同設置
+    os.environ[LOG_LEVEL_ENV] = logging.getLevelName(level)
+    if log_dir is not None:
+        os.environ[LOG_DIR_ENV] = str(log_dir)
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    for handler in list(root.handlers):
+        if getattr(handler, '_azurlane_console', False):
+            root.removeHandler(handler)
+
+    # 每次輸出時才解析 sys.stdout/sys.stderr，以便與重定向 (例如 contextlib.redirect_stdout) 配合
+    stdout_handler = logging.StreamHandler(_StdStream('stdout'))
+    stdout_handler.addFilter(_BelowLevelFilter(logging.WARNING))
+    stderr_handler = logging.StreamHandler(_StdStream('stderr'))
+    stderr_handler.setLevel(logging.WARNING)
+    for handler in (stdout_handler, stderr_handler):
+        handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handler._azurlane_console = True
+        root.addHandler(handler)
+
+    root.setLevel(level)
+    root.propagate = False
+    _configured = True
+    return root
+
+
+def ensure_logging():
+    """尚未配置時按環境變量配置 (供工作進程和單獨運行的步驟使用)。"""
+    if not _configured:
+        configure_logging()
+
+
+def get_log_dir():
+    """返回每個步驟日誌文件的目錄；未配置時返回 None。"""
+    log_dir = os.environ.get(LOG_DIR_ENV)
+    return Path(log_dir) if log_dir else None
+
+
+def step_log_path(step_name, log_dir=None):
+    log_dir = log_dir if log_dir is not None else get_log_dir()
+    return None if log_dir is None else Path(log_dir) / f"{step_name}.log"
+
+
+def reset_step_logs(step_names, log_dir=None):
+    """在一次流水線開始時清空各步驟的日誌文件 (同一步驟的 parse 與 write 階段追加到同一文件)。"""
+    for step_name in step_names:
+        path = step_log_path(step_name, log_dir)
+        if path is not None and path.exists():
+            path.unlink()
+
+
+@contextmanager
+def step_log_file(step_name, log_dir=None):
+    """
+    在 with 區塊內把 'azurlane' 下的所有日誌額外追加寫入 <log_dir>/<step_name>.log。
+    未配置日誌目錄時什麼也不做。
+    """
+    path = step_log_path(step_name, log_dir)
+    if path is None:
+        yield None
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = logging.FileHandler(path, mode='a', encoding='utf-8')
+    handler.setFormatter(logging.Formatter(FILE_FORMAT))
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.addHandler(handler)
+    try:
+        yield path
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+
+
+# --- 匯總計數 ---
+class StepCounters:
+    """
+    逐條目事件的計數器: 熱循環中只做一次 add()，結束時由 report() 輸出一行匯總。
+    用法:
+        counters = StepCounters('process_equip_stats')
+        counters.add('unknown_attribute')
+        counters.report(logger)
+    """
+
+    def __init__(self, title):
+        self.title = title
+        self.counts = Counter()
+
+    def add(self, key, count=1):
+        self.counts[key] += count
+
+    def __getitem__(self, key):
+        return self.counts[key]
+
+    def report(self, logger, level=logging.INFO):
+        if not self.counts or not logger.isEnabledFor(level):
+            return
+        summary = ', '.join(f"{key}={count}" for key, count in sorted(self.counts.items()))
+        logger.log(level, "  %s 計數匯總: %s", self.title, summary)
@@ -1,7 +1,8 @@
 # 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/main.py
 
+import argparse
+import os
 import sqlite3
-import subprocess
 import sys
 from pathlib import Path
 
@@ -28,17 +29,30 @@ OUTPUT_DIR = PROJECT_ROOT / 'DataOutput'
 DB_FILE = OUTPUT_DIR / 'azur_lane_data.db'
 # 6. 原始 JSON 數據目錄的絕對路徑
 JSON_DATA_DIR = PROJECT_ROOT / 'AzurLaneData' / 'sharecfgdata'
-# 7. 預處理步驟子腳本目錄
+# 7. 預處理步驟模組目錄
 STEPS_DIR = SCRIPT_DIR / 'steps'
-
-# --- 子腳本路徑定義 ---
-#  process_equip_templates.py ?
-PROCESS_WEAPON_NAME_SCRIPT = STEPS_DIR / 'process_weapon_name.py'
-PROCESS_STATS_SCRIPT = STEPS_DIR / 'process_equip_stats.py'
-PROCESS_WEAPON_PROP_SCRIPT = STEPS_DIR / 'process_weapon_property.py'
-PROCESS_SHIPS_SCRIPT = STEPS_DIR / 'process_ships.py'
-PROCESS_SKILLS_SCRIPT = STEPS_DIR / 'process_skills.py'
-# ... 其他子腳本 ...
+# 8. 每個步驟的日誌文件目錄
+LOG_DIR = OUTPUT_DIR / 'logs'
+
+# 以腳本方式運行 (python main.py) 時，確保項目根目錄在導入路徑上，
+# 這樣才能以 azurlane_analyzer.preprocessing.steps.* 的形式導入各步驟模組。
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from azurlane_analyzer.preprocessing.log import configure_logging  # noqa: E402
+from azurlane_analyzer.preprocessing.scheduler import run_scheduled  # noqa: E402
+from azurlane_analyzer.query import ensure_query_indexes  # noqa: E402
+from azurlane_analyzer.snapshot import export_snapshot  # noqa: E402
+
+# --- 步驟模組定義 (steps/ 下的模組名，每個模組都提供 run(ctx) 入口) ---
+PROCESS_WEAPON_NAME_STEP = 'process_weapon_name'
+PROCESS_STATS_STEP = 'process_equip_stats'
+PROCESS_TEMPLATES_STEP = 'process_equip_templates'
+PROCESS_WEAPON_PROP_STEP = 'process_weapon_property'
+PROCESS_SHIPS_STEP = 'process_ships'
+PROCESS_SKILLS_STEP = 'process_skills'
+PROCESS_SEARCH_INDEX_STEP = 'process_search_index'
+# ... 其他步驟 ...
 
 
 # --- 數據庫結構定義 (*** 更新此函數 ***) ---
@@ -139,11 +153,169 @@ def create_all_tables(db_path):
                 wp_fire_fx TEXT,
                 wp_fire_sfx TEXT,
                 wp_fire_fx_loop_type INTEGER,
-                weapon_property_json TEXT    -- weapon_property 完整 JSON (備份/參考)
+                weapon_property_json TEXT    -- (已棄用，恆為 NULL；完整 JSON 見 weapon_property.property_json)
             )
         ''')
         print("  - 表 'equipment' 結構檢查/創建完成 (已包含詳細屬性欄位 stat_*)。")
 
+        # --- 武器屬性表 (weapon_property) - 以屬性 ID 為主鍵，每個武器屬性只保存一份 ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weapon_property (
+                id INTEGER PRIMARY KEY,      -- weapon_property.json 中的 ID (對應 equipment.weapon_id)
+                type INTEGER,
+                bullet_ids TEXT,             -- JSON 列表
+                barrage_ids TEXT,            -- JSON 列表
+                range REAL,
+                angle REAL,
+                min_range REAL,
+                auto_aftercast REAL,
+                recover_time REAL,
+                precast_param TEXT,          -- JSON
+                damage REAL,
+                oxy_type TEXT,               -- JSON 列表
+                expose INTEGER,
+                fire_fx TEXT,
+                fire_sfx TEXT,
+                fire_fx_loop_type INTEGER,
+                reload_max REAL,             -- 裝填時間參數 (倉庫 CD = reload_max / 150)
+                property_json TEXT           -- weapon_property 完整 JSON (備份/參考)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_equipment_weapon_id
+            ON equipment (weapon_id)
+        ''')
+        # 兼容視圖: 需要完整武器屬性 JSON 的查詢改讀此視圖 (取代舊的 equipment.weapon_property_json)
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS equipment_with_weapon_property AS
+            SELECT equipment.*, wp.property_json AS full_weapon_property_json
+            FROM equipment
+            LEFT JOIN weapon_property AS wp ON wp.id = equipment.weapon_id
+        ''')
+        print("  - 表 'weapon_property' / 視圖 'equipment_with_weapon_property' 結構檢查/創建完成。")
+
+        # --- 武器表 (weapon) - weapon_name.json 的武器名稱 (已解析 'base' 繼承) ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weapon (
+                id INTEGER PRIMARY KEY,      -- 武器 ID (對應 equipment.weapon_id)
+                name TEXT,
+                base_id INTEGER              -- 原始數據中的 'base' 引用 (名稱繼承自此武器)
+            )
+        ''')
+        # 裝備及其主武器名稱 (UI 顯示武器名稱時讀此視圖)
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS equipment_with_weapon AS
+            SELECT equipment.*, weapon.name AS weapon_name
+            FROM equipment
+            LEFT JOIN weapon ON weapon.id = equipment.weapon_id
+        ''')
+        print("  - 表 'weapon' / 視圖 'equipment_with_weapon' 結構檢查/創建完成。")
+
+        # --- 強化等級表 (equipment_level) - 每條強化鏈的每一個 +N 等級一行，屬性與成本已預先計算 ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS equipment_level (
+                chain_id INTEGER NOT NULL,   -- 強化鏈第一級 (+0) 的裝備 ID
+                group_id INTEGER,            -- equip_data_template 的 group (同一 group 可能有多條鏈)
+                level INTEGER NOT NULL,      -- 模板等級 (1 起算)
+                enhance_level INTEGER,       -- +N (level - 1)
+                equip_id INTEGER NOT NULL,   -- 此等級對應的 equipment.id
+                prev_id INTEGER,
+                next_id INTEGER,
+                is_max INTEGER,              -- 是否為該鏈最高強化等級 (0 或 1)
+                max_level INTEGER,           -- 該鏈的最高等級
+                template_type INTEGER,       -- 模板中的裝備類型
+                upgrade_gold INTEGER,        -- 由此級升到下一級所需金幣
+                upgrade_items TEXT,          -- 由此級升到下一級所需道具 (JSON [[item_id, count], ...])
+                cumulative_gold INTEGER,     -- 由第一級升到此級的累計金幣
+                cumulative_items TEXT,       -- 由第一級升到此級的累計道具 (JSON)
+                forbidden_ship_types TEXT,   -- 禁用艦種類型 (JSON)
+
+                -- 此等級的屬性 (來自 equipment 表中此等級的裝備)
+                weapon_id INTEGER,
+                base_damage REAL,
+                volley_count INTEGER,
+                storehouse_cd REAL,
+                stat_hp REAL, stat_firepower REAL, stat_torpedo REAL, stat_aviation REAL,
+                stat_reload REAL, stat_antiair REAL, stat_hit REAL, stat_evasion REAL,
+                stat_speed REAL, stat_luck REAL, stat_antisub REAL,
+                stat_oxy_max REAL, stat_raid_distance REAL,
+                PRIMARY KEY (chain_id, level)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_equipment_level_equip_id
+            ON equipment_level (equip_id)
+        ''')
+        # 滿強對比只需查此部分索引
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_equipment_level_max
+            ON equipment_level (chain_id) WHERE is_max = 1
+        ''')
+        print("  - 表 'equipment_level' 結構檢查/創建完成。")
+
+        # --- 關聯表 - equipment 中 JSON 列表欄位的規範化形式，供反向查詢 (例如「使用子彈 X 的所有裝備」) ---
+        # (原 JSON 欄位 wp_bullet_ids / wp_barrage_ids / forbidden_ship_types 照常寫入以保持兼容)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS equipment_bullet (
+                equip_id INTEGER NOT NULL,   -- equipment.id
+                position INTEGER NOT NULL,   -- 在 bullet_ID 列表中的位置 (0 起算)
+                bullet_id INTEGER NOT NULL,
+                PRIMARY KEY (equip_id, position)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_equipment_bullet_bullet
+            ON equipment_bullet (bullet_id, equip_id)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS equipment_barrage (
+                equip_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,   -- 在 barrage_ID 列表中的位置 (0 起算)
+                barrage_id INTEGER NOT NULL,
+                PRIMARY KEY (equip_id, position)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_equipment_barrage_barrage
+            ON equipment_barrage (barrage_id, equip_id)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS equipment_forbidden_ship_type (
+                equip_id INTEGER NOT NULL,
+                ship_type INTEGER NOT NULL,  -- 不能裝備此裝備的艦種
+                PRIMARY KEY (equip_id, ship_type)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_equipment_forbidden_ship_type
+            ON equipment_forbidden_ship_type (ship_type, equip_id)
+        ''')
+        print("  - 關聯表 'equipment_bullet' / 'equipment_barrage' / 'equipment_forbidden_ship_type' 結構檢查/創建完成。")
+
+        # --- 裝備行指紋表 (equipment_fingerprint) - 行級增量寫入用 ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS equipment_fingerprint (
+                id INTEGER PRIMARY KEY,      -- equipment.id
+                row_hash TEXT NOT NULL       -- 上次寫入時該行數據的指紋
+            )
+        ''')
+        # --- 裝備變更記錄表 (equipment_changelog) - 每次數據更新中變化的裝備 ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS equipment_changelog (
+                change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                changed_at TEXT,             -- 寫入時間
+                source_hash TEXT,            -- 源 equip_data_statistics.json 的內容哈希 (標識數據版本)
+                equip_id INTEGER NOT NULL,
+                change_type TEXT NOT NULL,   -- 'added' / 'changed' / 'removed'
+                changed_columns TEXT         -- 變化的欄位名 (JSON 列表，僅 'changed' 時有值)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_equipment_changelog_source
+            ON equipment_changelog (source_hash, equip_id)
+        ''')
+        print("  - 表 'equipment_fingerprint' / 'equipment_changelog' 結構檢查/創建完成。")
+
         # --- 艦船表 (ships) ---
         # (結構不變)
         cursor.execute('''
@@ -155,6 +327,27 @@ def create_all_tables(db_path):
         ''')
         print("  - 表 'ships' 結構檢查/創建完成。")
 
+        # --- 艦船等級屬性表 (ship_stat_level) - 預先計算的最終屬性 ---
+        # 每艘艦船 × 突破檔位 × 等級 (1/100/120/125) × 好感度加成 一行 (見 steps/process_ships.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ship_stat_level (
+                ship_id INTEGER NOT NULL,    -- ships.id (艦船 group)
+                limit_break INTEGER NOT NULL, -- 突破檔位 0..3
+                level INTEGER NOT NULL,
+                affection INTEGER NOT NULL,  -- 好感度屬性加成 (百分比: 0/1/3/6/9/12)
+                stat_hp REAL, stat_firepower REAL, stat_torpedo REAL, stat_aviation REAL,
+                stat_reload REAL, stat_antiair REAL, stat_hit REAL, stat_evasion REAL,
+                stat_speed REAL, stat_luck REAL, stat_antisub REAL,
+                PRIMARY KEY (ship_id, limit_break, level, affection)
+            ) WITHOUT ROWID
+        ''')
+        # 跨艦船比較: 在同一 (等級, 好感度, 突破) 條件下掃描所有艦船
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ship_stat_level_tier
+            ON ship_stat_level (level, affection, limit_break, ship_id)
+        ''')
+        print("  - 表 'ship_stat_level' 結構檢查/創建完成。")
+
         # --- 技能表 (skills) ---
         # (結構不變)
         cursor.execute('''
@@ -164,6 +357,65 @@ def create_all_tables(db_path):
         ''')
         print("  - 表 'skills' 結構檢查/創建完成。")
 
+        # --- 技能觸發與效果表 (skill_trigger / skill_effect) - 從 buff 配置展開 ---
+        # skill_trigger 以觸發類型開頭的主鍵即「事件 -> 技能」索引 (見 steps/process_skills.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS skill_trigger (
+                trigger_type TEXT NOT NULL,  -- 'battle_start' / 'on_fire' / 'interval' / …
+                skill_id INTEGER NOT NULL,   -- skills.id
+                effect_index INTEGER NOT NULL, -- 在 buff effect_list 中的位置 (0 起算)
+                raw_trigger TEXT NOT NULL,   -- 遊戲中的觸發名 (onFire 等)
+                interval REAL,               -- 'interval' 的觸發間隔 (秒)
+                probability REAL NOT NULL,   -- 觸發機率 (0..1)
+                quota INTEGER,               -- 觸發次數上限 (NULL 為不限)
+                PRIMARY KEY (trigger_type, skill_id, effect_index, raw_trigger)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_skill_trigger_skill
+            ON skill_trigger (skill_id, trigger_type)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS skill_effect (
+                skill_id INTEGER NOT NULL,
+                effect_index INTEGER NOT NULL,
+                effect_type TEXT NOT NULL,   -- 'cast_skill' / 'add_attr' / 'add_buff' / …
+                raw_type TEXT NOT NULL,      -- 遊戲中的效果類型 (BattleBuffCastSkill 等)
+                target TEXT,
+                attr TEXT,                   -- 屬性類效果的屬性名
+                number REAL,                 -- 屬性類效果的數值
+                cast_skill_id INTEGER,       -- cast_skill 釋放的技能
+                buff_id INTEGER,             -- add_buff 附加的 buff
+                args TEXT,                   -- 完整 arg_list (JSON)
+                PRIMARY KEY (skill_id, effect_index)
+            ) WITHOUT ROWID
+        ''')
+        print("  - 表 'skill_trigger' / 'skill_effect' 結構檢查/創建完成。")
+
+        # --- 全文檢索表 (search_text / search_index) - 裝備、武器、技能的名稱與描述 ---
+        # search_text 保存文本 (1-2 字的短查詢直接掃描此表)；search_index 是以它為外部內容的
+        # FTS5 trigram 索引，需要 SQLite 3.34+ 且編譯了 FTS5，不支持時只跳過檢索 (見 steps/process_search_index.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS search_text (
+                id INTEGER PRIMARY KEY,      -- search_index 的 rowid
+                kind TEXT NOT NULL,          -- 'equipment' / 'weapon' / 'skill'
+                item_id INTEGER NOT NULL,    -- 對應表中的 ID
+                name TEXT,                   -- 規範化後的名稱 (NFKC、合併空白)
+                description TEXT,            -- 規範化後的描述
+                display_name TEXT            -- 原始名稱 (顯示用)
+            )
+        ''')
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5 (
+                    name, description,
+                    content = 'search_text', content_rowid = 'id', tokenize = 'trigram'
+                )
+            ''')
+            print("  - 表 'search_text' / 全文檢索表 'search_index' 結構檢查/創建完成。")
+        except sqlite3.OperationalError as e:
+            print(f"  - 警告: 無法創建全文檢索表 'search_index' (SQLite {sqlite3.sqlite_version}): {e}")
+
         conn.commit()
         print("數據庫結構已準備就緒。")
 
@@ -175,117 +427,110 @@ def create_all_tables(db_path):
             conn.close()
 
 
-# --- 子腳本執行 (函數邏輯不變, 使用新的子腳本路徑) ---
-def run_script(script_path: Path, json_dir: Path, db_file: Path):
-    """運行指定的 Python 子腳本，並將 JSON 目錄和 DB 文件路徑作為參數傳遞。"""
-    if not script_path.is_file():
-        print(f"!!! 錯誤: 子腳本未找到: {script_path} !!!", file=sys.stderr)
-        print("請確保所有 process_*.py 文件都存在於 'steps' 目錄下。", file=sys.stderr)
-        return False
+# --- 流水線步驟 (steps/ 目錄下的模組名) ---
+# 各步驟在模組內聲明 READS/WRITES，調度器據此推導依賴；列表順序只決定衝突步驟的先後。
+PIPELINE_STEPS = (
+    PROCESS_STATS_STEP,          # 1. 首先處理 equip_data_statistics.json (插入主要裝備數據)
+    PROCESS_WEAPON_PROP_STEP,    # 2. 處理 weapon_property.json (依賴 weapon_id)
+    PROCESS_TEMPLATES_STEP,      # 3. 處理 equip_data_template.json (強化等級鏈，依賴每級的裝備屬性)
+    PROCESS_WEAPON_NAME_STEP,    # 4. 處理 weapon_name.json (weapon 表)
+    PROCESS_SHIPS_STEP,          # 5. 處理艦船數據
+    PROCESS_SKILLS_STEP,         # 6. 處理技能數據
+    PROCESS_SEARCH_INDEX_STEP,   # 7. 重建名稱與描述的全文檢索表 (依賴技能數據)
+    # ... 添加更多步驟模組 ...
+)
+
+
+def run_preprocessing(db_file=DB_FILE, json_dir=JSON_DATA_DIR, full=False, steps=PIPELINE_STEPS, snapshot=True):
+    """
+    執行完整的預處理流程: 初始化數據庫結構、按依賴調度所有步驟、創建查詢索引、導出二進制快照。
+    Args:
+        db_file (Path): 數據庫文件路徑。
+        json_dir (Path): sharecfgdata 目錄。
+        full (bool): 忽略構建清單 (manifest)，全量重建所有步驟。
+        steps (tuple): 要運行的步驟模組名。
+        snapshot (bool): 是否在數據庫旁導出只讀二進制快照 (azurlane_analyzer/snapshot.py)。
+    Returns:
+        bool: 是否所有步驟都成功。
+    """
+    db_file, json_dir = Path(db_file), Path(json_dir)
+
+    # 步驟 0: 檢查 JSON 數據目錄是否存在
+    if not json_dir.is_dir():
+        print(f"!!! 致命錯誤: JSON 數據目錄未找到: {json_dir} !!!", file=sys.stderr)
+        print("請確保 'AzurLaneData/sharecfgdata' 目錄存在於項目根目錄下。", file=sys.stderr)
+        sys.exit(1)
+
+    # 步驟 1: 初始化數據庫結構
+    create_all_tables(db_file)
+
+    # 步驟 2: 按依賴關係調度 (解析在進程池中並行，寫入由唯一寫入者串行完成；失敗只中止下游分支)
+    # 默認為增量模式: 源 JSON 內容未變化的步驟 (及其下游) 不會重跑；full=True 強制全量重建。
+    all_success = run_scheduled(list(steps), json_dir, db_file, incremental=not full)
 
-    script_name = script_path.name
-    print(f"\n--- === [ 開始執行: {script_name} ] === ---")
-    print(f"  傳遞參數: JSON 目錄='{json_dir}', DB 文件='{db_file}'")
+    # 步驟 3: 創建查詢接口 (azurlane_analyzer/query.py) 使用的覆蓋索引並更新統計信息
+    index_conn = sqlite3.connect(db_file)
     try:
-        # 將 JSON 目錄和 DB 文件路徑作為命令行參數傳遞給子腳本
-        cmd_args = [
-            sys.executable, '-u', str(script_path),
-            str(json_dir),
-            str(db_file)
-        ]
-        print(f"  執行命令: {' '.join(cmd_args)}") # 打印實際執行的命令
-
-        result = subprocess.run(
-            cmd_args,
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            # 子腳本的工作目錄可以設置為項目根目錄或腳本所在目錄，
-            # 但由於我們傳遞了絕對路徑，這影響不大。設置為項目根目錄可能更直觀。
-            cwd=PROJECT_ROOT
-        )
-        print(f"--- [ {script_name} 標準輸出 ] ---")
-        # 處理子腳本的標準輸出
-        stdout_content = result.stdout.strip() if result.stdout else "" # 移除首尾空白
-        if stdout_content: # 僅在 strip 後還有內容時打印
-            print(stdout_content)
-        elif result.stdout is not None: # 如果原始 stdout 存在但 strip 後為空 (例如只包含換行符)
-            print("(子腳本標準輸出為空或僅包含空白)") # 可以選擇打印提示或不打印
-        else: # result.stdout 為 None
-            print("(子腳本無標準輸出)")
-
-
-        # 處理子腳本的錯誤輸出
-        if result.stderr:
-            print(f"--- [ {script_name} 錯誤輸出 ] ---", file=sys.stderr)
-            stderr_content = result.stderr.strip() # 移除首尾空白
-            if stderr_content: # 僅在 strip 後還有內容時打印
-                print(stderr_content, file=sys.stderr)
-            elif result.stderr.strip() == "": # 如果原始 stderr 存在但 strip 後為空
-                 # 通常這種情況下不需要特別提示，因為 stderr 本身就是空的
-                 pass
-
-        print(f"--- === [ 完成執行: {script_name} (成功) ] === ---")
-        return True
-
-    except subprocess.CalledProcessError as e:
-        print(f"!!! 運行 {script_name} 時發生錯誤 (返回碼: {e.returncode}) !!!", file=sys.stderr)
-        print(f"--- [ {script_name} 錯誤時的標準輸出 ] ---", file=sys.stderr)
-        print(e.stdout if e.stdout else "(無)", file=sys.stderr)
-        print(f"--- [ {script_name} 錯誤時的錯誤輸出 ] ---", file=sys.stderr)
-        print(e.stderr if e.stderr else "(無)", file=sys.stderr)
-        return False
-    except Exception as e:
-        print(f"!!! 運行 {script_name} 時發生意外錯誤: {e} !!!", file=sys.stderr)
-        return False
+        ensure_query_indexes(index_conn)
+    except sqlite3.Error as e:
+        print(f"!!! 創建查詢索引時發生數據庫錯誤: {e} !!!", file=sys.stderr)
+        all_success = False
+    finally:
+        index_conn.close()
+
+    # 步驟 4: 導出二進制快照 (數據版本未變化時跳過；有步驟失敗時不導出，保留上一份完整的快照)
+    if snapshot and all_success:
+        try:
+            export_snapshot(db_file)
+        except (OSError, sqlite3.Error) as e:
+            print(f"!!! 導出二進制快照時發生錯誤: {e} !!!", file=sys.stderr)
+            all_success = False
+    return all_success
 
 
 # --- 主執行流程 ---
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="碧藍航線數據預處理主控腳本")
+    parser.add_argument('--full', action='store_true',
+                        help="忽略構建清單 (manifest)，全量重建所有步驟")
+    parser.add_argument('--per-row-writes', action='store_true',
+                        help="退回逐行 execute 寫入 (用於對比測量 executemany 批量寫入的加速)")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="終端與日誌文件的日誌級別 (默認 INFO；DEBUG 輸出逐條目的解析細節，會明顯變慢)")
+    parser.add_argument('--log-dir', type=Path, default=LOG_DIR,
+                        help=f"每個步驟的日誌文件目錄 (默認 {LOG_DIR})")
+    parser.add_argument('--db', type=Path, default=DB_FILE,
+                        help=f"輸出的數據庫文件 (默認 {DB_FILE})")
+    parser.add_argument('--json-dir', type=Path, default=JSON_DATA_DIR,
+                        help=f"源 JSON 數據目錄 (默認 {JSON_DATA_DIR})")
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="不導出只讀二進制快照 (azur_lane_data.snapshot)")
+    args = parser.parse_args()
+    if args.per_row_writes:
+        os.environ['AZURLANE_PER_ROW_WRITES'] = '1'
+    configure_logging(args.log_level, args.log_dir)
+
+    # 步驟在同一進程內運行，輸出被重定向到文件/管道時也按行即時寫出
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=True)
+
     print("========================================")
-    print("=== 碧藍航線數據預處理主控腳本 (v2) ===")
+    print("=== 碧藍航線數據預處理主控腳本 (v3) ===")
     print("========================================")
     print(f"項目根目錄: {PROJECT_ROOT}")
     print(f"Python 包目錄: {PACKAGE_ROOT}")
     print(f"預處理腳本目錄: {SCRIPT_DIR}")
-    print(f"數據庫文件: {DB_FILE}")
-    print(f"JSON 數據目錄: {JSON_DATA_DIR}")
-    print(f"處理步驟腳本目錄: {STEPS_DIR}")
+    print(f"數據庫文件: {args.db}")
+    print(f"JSON 數據目錄: {args.json_dir}")
+    print(f"處理步驟模組目錄: {STEPS_DIR}")
+    print(f"步驟日誌目錄: {args.log_dir} (級別: {args.log_level})")
     print("-" * 40)
 
-    # 步驟 0: 檢查 JSON 數據目錄是否存在
-    if not JSON_DATA_DIR.is_dir():
-        print(f"!!! 致命錯誤: JSON 數據目錄未找到: {JSON_DATA_DIR} !!!", file=sys.stderr)
-        print("請確保 'AzurLaneData/sharecfgdata' 目錄存在於項目根目錄下。", file=sys.stderr)
-        sys.exit(1)
-
-    # 步驟 1: 初始化數據庫結構
-    create_all_tables(DB_FILE)
-
-    # 步驟 2: 定義要運行的腳本列表 (使用 steps/ 目錄下的路徑)
-    scripts_to_run = [
-        PROCESS_STATS_SCRIPT,          # 1. 首先處理 equip_data_statistics.json (插入主要裝備數據)
-        PROCESS_WEAPON_PROP_SCRIPT,    # 2. 處理 weapon_property.json (依賴 weapon_id)
-        PROCESS_WEAPON_NAME_SCRIPT,    # 3. 處理 weapon_name.json (其確切用途和更新目標待進一步確認)
-        PROCESS_SHIPS_SCRIPT,          # 4. 處理艦船數據
-        PROCESS_SKILLS_SCRIPT,         # 5. 處理技能數據
-        # ... 添加更多子腳本的路徑 ...
-    ]
-
-    # 步驟 3: 按順序執行子腳本，並傳遞路徑參數
-    all_success = True
-    for script_path in scripts_to_run:
-        # 將 JSON 目錄和 DB 文件路徑傳遞給 run_script 函數
-        success = run_script(script_path, JSON_DATA_DIR, DB_FILE)
-        if not success:
-            all_success = False
-            print(f"\n!!! 由於腳本 {script_path.name} 執行失敗，預處理流程已中斷 !!!", file=sys.stderr)
-            break
+    all_success = run_preprocessing(args.db, args.json_dir, full=args.full, snapshot=not args.no_snapshot)
 
     print("\n" + "=" * 40)
     if all_success:
         print("=== 所有預處理腳本已成功執行完畢 ===")
     else:
         print("=== 預處理流程因錯誤而中止 ===", file=sys.stderr)
-    print("=" * 40)
\ No newline at end of file
+    print("=" * 40)
@@ -0,0 +1,214 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/manifest.py
+#
+# 增量重建用的輸入清單 (manifest)。
+# 在 azur_lane_data.db 中記錄每個步驟上次成功執行時所消費的每個源 JSON 的
+# 內容哈希、mtime、大小以及步驟版本 (步驟模組中的 STEP_VERSION)。
+# 調度器據此跳過輸入未變化的步驟，只重跑輸入變化的步驟及其下游。
+#
+# 步驟模組需要聲明:
+#     INPUTS = ('equip_data_statistics.json',)   # sharecfgdata 下的源文件
+#     STEP_VERSION = 1                            # 修改處理邏輯/輸出結構時遞增
+#
+# 另外在 data_version 表中為每張被寫入的表記錄一個數據版本號: 步驟成功並修改了數據時 (與寫入同一事務)
+# 把它 WRITES 中涉及的每張表換成新的隨機版本號。派生結果的快取 (azurlane_analyzer/cache.py)
+# 以所依賴的表的版本號作為鍵的一部分，表被重寫後舊結果自然失效。
+
+import hashlib
+import secrets
+import sqlite3
+import time
+from pathlib import Path
+
+MANIFEST_TABLE = 'build_manifest'
+
+MANIFEST_TABLE_SQL = f'''
+    CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+        step_name TEXT NOT NULL,        -- 步驟模組名
+        source_file TEXT NOT NULL,      -- sharecfgdata 下的源 JSON 文件名
+        content_hash TEXT NOT NULL,     -- 源文件內容的 SHA-256
+        mtime_ns INTEGER,               -- 記錄時源文件的 mtime (納秒)
+        size INTEGER,                   -- 記錄時源文件的大小 (字節)
+        step_version INTEGER,           -- 消費該文件的步驟版本
+        built_at TEXT,                  -- 記錄時間
+        PRIMARY KEY (step_name, source_file)
+    )
+'''
+
+DATA_VERSION_TABLE = 'data_version'
+
+DATA_VERSION_TABLE_SQL = f'''
+    CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+        table_name TEXT PRIMARY KEY,    -- 表名；'*' 表示未聲明 WRITES 的步驟 (可能寫入任何表)
+        version TEXT NOT NULL,          -- 每次重寫時生成的隨機版本號 (數據庫重建後也不會與舊值重複)
+        step_name TEXT,                 -- 最後寫入該表的步驟
+        updated_at TEXT
+    )
+'''
+ANY_TABLE = '*'
+
+# 記錄時源文件不存在 (可選輸入，例如只有裝備數據的 sharecfgdata 中的艦船文件) 的 content_hash；
+# 文件仍然不存在時視為未變化，出現後視為已變化
+MISSING_HASH = 'missing'
+
+# 讀取文件內容計算哈希時的塊大小
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def ensure_manifest_table(cursor):
+    """確保 manifest 表與 data_version 表存在。"""
+    cursor.execute(MANIFEST_TABLE_SQL)
+    cursor.execute(DATA_VERSION_TABLE_SQL)
+
+
+def get_step_inputs(module):
+    """返回步驟聲明的源文件列表；未聲明時返回 None (表示無法判斷，總是重跑)。"""
+    inputs = getattr(module, 'INPUTS', None)
+    return tuple(inputs) if inputs is not None else None
+
+
+def get_step_version(module):
+    return getattr(module, 'STEP_VERSION', 0)
+
+
+class InputFingerprints:
+    """
+    源文件指紋的計算與快取。
+    優先用 (mtime, size) 判斷文件是否可能變化，只有在可能變化時才讀取整個文件計算哈希，
+    因此在數據未更新時檢查只需要幾次 stat 調用。
+    """
+
+    def __init__(self, json_dir):
+        self.json_dir = Path(json_dir)
+        self._hashes = {}
+
+    def stat(self, filename):
+        """返回 (mtime_ns, size)；文件不存在時返回 None。"""
+        try:
+            st = (self.json_dir / filename).stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def content_hash(self, filename):
+        """計算 (並快取) 文件內容的 SHA-256。"""
+        stat = self.stat(filename)
+        key = (filename, stat)
+        if key not in self._hashes:
+            digest = hashlib.sha256()
+            with open(self.json_dir / filename, 'rb') as f:
+                for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            self._hashes[key] = digest.hexdigest()
+        return self._hashes[key]
+
+
+def check_step(cursor, step_name, module, fingerprints):
+    """
+    判斷步驟的輸入自上次成功執行以來是否未變化。
+    Args:
+        cursor: SQLite 資料庫游標。
+        step_name (str): 步驟模組名。
+        module: 已載入的步驟模組。
+        fingerprints (InputFingerprints): 源文件指紋計算器。
+    Returns:
+        tuple: (是否為最新 (bool), 原因說明 (str))。
+    """
+    inputs = get_step_inputs(module)
+    if not inputs:
+        return False, "未聲明 INPUTS"
+
+    cursor.execute(
+        f"SELECT source_file, content_hash, mtime_ns, size, step_version FROM {MANIFEST_TABLE} WHERE step_name = ?",
+        (step_name,),
+    )
+    recorded = {row[0]: row[1:] for row in cursor.fetchall()}
+    if not recorded:
+        return False, "無構建記錄"
+
+    version = get_step_version(module)
+    touched = []
+    for filename in inputs:
+        if filename not in recorded:
+            return False, f"{filename} 無構建記錄"
+        content_hash, mtime_ns, size, step_version = recorded[filename]
+        if step_version != version:
+            return False, f"步驟版本 {step_version} -> {version}"
+        stat = fingerprints.stat(filename)
+        if content_hash == MISSING_HASH:
+            if stat is None:
+                continue
+            return False, f"{filename} 已新增"
+        if stat is None:
+            return False, f"{filename} 不存在"
+        if stat == (mtime_ns, size):
+            continue
+        # mtime/大小變了 (例如 git checkout 重寫了文件)，再比對內容
+        if fingerprints.content_hash(filename) != content_hash:
+            return False, f"{filename} 內容已變化"
+        touched.append((stat[0], stat[1], step_name, filename))
+
+    # 內容未變但 mtime 變了: 更新記錄，下次直接走 stat 快速路徑
+    if touched:
+        cursor.executemany(
+            f"UPDATE {MANIFEST_TABLE} SET mtime_ns = ?, size = ? WHERE step_name = ? AND source_file = ?",
+            touched,
+        )
+    return True, "輸入未變化"
+
+
+def record_step(cursor, step_name, module, fingerprints):
+    """在步驟成功後 (與步驟的寫入處於同一事務中) 記錄其所有輸入的指紋 (不存在的輸入記為 MISSING_HASH)。"""
+    inputs = get_step_inputs(module)
+    if not inputs:
+        return
+    version = get_step_version(module)
+    built_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    for filename in inputs:
+        stat = fingerprints.stat(filename)
+        if stat is None:
+            rows.append((step_name, filename, MISSING_HASH, None, None, version, built_at))
+            continue
+        rows.append((step_name, filename, fingerprints.content_hash(filename),
+                     stat[0], stat[1], version, built_at))
+    cursor.execute(f"DELETE FROM {MANIFEST_TABLE} WHERE step_name = ?", (step_name,))
+    cursor.executemany(
+        f"INSERT INTO {MANIFEST_TABLE} (step_name, source_file, content_hash, mtime_ns, size, step_version, built_at) "
+        f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def get_written_tables(module):
+    """返回步驟 WRITES 聲明涉及的表名；未聲明時返回 (ANY_TABLE,)。"""
+    writes = getattr(module, 'WRITES', None)
+    if writes is None:
+        return (ANY_TABLE,)
+    return tuple(sorted({item.split('.', 1)[0] for item in writes}))
+
+
+def bump_data_versions(cursor, step_name, tables):
+    """為步驟寫入的每張表生成新的數據版本號 (在步驟的事務中調用)。"""
+    updated_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO {DATA_VERSION_TABLE} (table_name, version, step_name, updated_at) "
+        f"VALUES (?, ?, ?, ?)",
+        [(table, secrets.token_hex(8), step_name, updated_at) for table in tables],
+    )
+
+
+def read_data_versions(conn):
+    """
+    返回 {表名: 版本號}。
+    數據庫中還沒有 data_version 表 (舊版本構建) 時返回空字典。
+    """
+    try:
+        rows = conn.execute(f"SELECT table_name, version FROM {DATA_VERSION_TABLE}").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {row[0]: row[1] for row in rows}
+
+
+def clear_manifest(cursor):
+    """清空 manifest (強制下次全量重建)。"""
+    cursor.execute(f"DELETE FROM {MANIFEST_TABLE}")
@@ -0,0 +1,294 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/pipeline.py
+#
+# 進程內 (in-process) 預處理流水線引擎。
+# 取代原本 main.py 中以 subprocess 逐一啟動子腳本的做法:
+#   - 每個步驟都是 steps/ 下的一個模組，並遵守相同的入口約定:
+#       * `run(ctx)`，或
+#       * `parse(json_cache) -> payload` 加 `write(ctx, payload)`
+#         (parse 只讀 JSON、不接觸數據庫，可交給進程池並行執行；
+#          write 由唯一的寫入者在共用連接上串行執行，見 scheduler.py)；
+#   - 所有步驟共用同一個 SQLite 連接與同一份已解析的 JSON 快取；
+#   - 步驟的輸出經分級日誌 (log.py) 直接寫到終端，並另存一份到該步驟的日誌文件。
+
+import importlib
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing import manifest
+from azurlane_analyzer.preprocessing.bulk_writer import WRITE_STATS, bulk_load_pragmas
+from azurlane_analyzer.preprocessing.json_stream import get_backend, iter_json_records, load_json_file
+from azurlane_analyzer.preprocessing.log import ensure_logging, get_logger, step_log_file
+
+logger = get_logger(__name__)
+
+# 步驟模組所在的包 (steps/ 目錄)
+STEPS_PACKAGE = 'azurlane_analyzer.preprocessing.steps'
+# 步驟模組的入口函數名稱
+STEP_ENTRY_POINT = 'run'
+STEP_PARSE_ENTRY_POINT = 'parse'
+STEP_WRITE_ENTRY_POINT = 'write'
+
+
+class StepError(Exception):
+    """步驟無法載入或不符合入口約定時拋出。"""
+
+
+# --- 共用 JSON 快取 ---
+class JsonCache:
+    """
+    以文件名為鍵的已解析 JSON 快取。
+    同一次流水線中，多個步驟讀取同一個 sharecfgdata 文件時只會解析一次。
+    只需順序遍歷的步驟改用 iter_records() 串流讀取，其結果不進入快取。
+    """
+
+    def __init__(self, json_dir):
+        self.json_dir = Path(json_dir)
+        self._data = {}
+
+    def path(self, filename):
+        """返回 sharecfgdata 目錄下指定文件的絕對路徑。"""
+        return self.json_dir / filename
+
+    def exists(self, filename):
+        return filename in self._data or self.path(filename).is_file()
+
+    def load(self, filename):
+        """
+        載入 (或從快取返回) 指定的 JSON 文件。
+        Args:
+            filename (str): sharecfgdata 目錄下的文件名，例如 'equip_data_statistics.json'。
+        Returns:
+            已解析的 JSON 對象 (通常是 ID -> 資料 的字典)。
+        """
+        if filename in self._data:
+            return self._data[filename]
+
+        json_file_path = self.path(filename)
+        if not json_file_path.is_file():
+            raise FileNotFoundError(f"目標 JSON 文件 '{filename}' 未找到: {json_file_path}")
+
+        start_time = time.time()
+        try:
+            data = load_json_file(json_file_path)
+        except json.JSONDecodeError as e:
+            logger.error("  錯誤: 解析 JSON 文件 %s 失敗: %s", json_file_path, e)
+            raise
+        load_time = time.time() - start_time
+        size = len(data) if hasattr(data, '__len__') else '?'
+        logger.info("  成功載入 %s (%s 個頂層條目)，耗時: %.2f 秒。", filename, size, load_time)
+
+        self._data[filename] = data
+        return data
+
+    def iter_records(self, filename):
+        """
+        逐條產生頂層對象中的 (id_str, 記錄)。
+        文件已在快取中時直接遍歷快取；否則串流讀取 (見 json_stream.py)，不把整個文件留在記憶體中。
+        """
+        if filename in self._data:
+            yield from self._data[filename].items()
+            return
+
+        json_file_path = self.path(filename)
+        if not json_file_path.is_file():
+            raise FileNotFoundError(f"目標 JSON 文件 '{filename}' 未找到: {json_file_path}")
+
+        backend = get_backend()
+        start_time = time.time()
+        count = 0
+        try:
+            for count, item in enumerate(iter_json_records(json_file_path, backend), 1):
+                yield item
+        except json.JSONDecodeError as e:
+            logger.error("  錯誤: 解析 JSON 文件 %s 失敗: %s", json_file_path, e)
+            raise
+        load_time = time.time() - start_time
+        logger.info("  完成逐條讀取 %s (%d 個頂層條目，後端 %s)，讀取與處理共耗時: %.2f 秒。", filename, count, backend, load_time)
+
+    def clear(self):
+        self._data.clear()
+
+
+# --- 步驟執行上下文 ---
+class StepContext:
+    """
+    傳遞給每個步驟 `run(ctx)` 的上下文。
+    Attributes:
+        json_dir (Path): 原始 JSON 數據目錄 (sharecfgdata)。
+        db_file (Path): 數據庫文件路徑。
+        conn (sqlite3.Connection): 所有步驟共用的數據庫連接。
+        json_cache (JsonCache): 所有步驟共用的 JSON 快取。
+        rows_changed (int): 當前步驟插入/更新/刪除的行數 (sqlite3 total_changes 之差，步驟執行後設置)；
+                            為 0 時步驟沒有修改任何數據 (例如輸入文件不存在)，不更新數據版本號。
+    """
+
+    def __init__(self, json_dir, db_file, conn, json_cache=None):
+        self.json_dir = Path(json_dir)
+        self.db_file = Path(db_file)
+        self.conn = conn
+        self.json_cache = json_cache if json_cache is not None else JsonCache(json_dir)
+        self.rows_changed = 0
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def load_json(self, filename):
+        return self.json_cache.load(filename)
+
+    def json_path(self, filename):
+        return self.json_cache.path(filename)
+
+
+def open_connection(db_file):
+    """打開流水線共用的數據庫連接。"""
+    db_file = Path(db_file)
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    return sqlite3.connect(db_file)
+
+
+# --- 步驟載入 ---
+def load_step(step_name):
+    """
+    以模組形式導入 steps/ 下的步驟，並檢查入口約定。
+    Args:
+        step_name (str): 步驟模組名，例如 'process_equip_stats'。
+    Returns:
+        module: 已導入的步驟模組。
+    """
+    module_name = f"{STEPS_PACKAGE}.{step_name}"
+    try:
+        module = importlib.import_module(module_name)
+    except ModuleNotFoundError as e:
+        if e.name == module_name:
+            raise StepError(f"步驟模組未找到: {step_name}.py") from e
+        raise
+
+    if not callable(getattr(module, STEP_ENTRY_POINT, None)) and not has_parse_phase(module):
+        raise StepError(
+            f"步驟 {step_name} 未提供入口函數 `{STEP_ENTRY_POINT}(ctx)` "
+            f"或 `{STEP_PARSE_ENTRY_POINT}(json_cache)` + `{STEP_WRITE_ENTRY_POINT}(ctx, payload)`。"
+        )
+    return module
+
+
+def has_parse_phase(module):
+    """步驟是否拆分為 parse/write 兩個階段。"""
+    return (callable(getattr(module, STEP_PARSE_ENTRY_POINT, None))
+            and callable(getattr(module, STEP_WRITE_ENTRY_POINT, None)))
+
+
+_NO_PAYLOAD = object()
+
+
+def execute_step(module, ctx, payload=_NO_PAYLOAD):
+    """
+    按入口約定執行步驟 (不負責提交/回滾)。
+    Args:
+        payload: parse 階段已在別處 (例如進程池) 完成時傳入其結果；否則在此就地解析。
+    """
+    if has_parse_phase(module):
+        if payload is _NO_PAYLOAD:
+            payload = getattr(module, STEP_PARSE_ENTRY_POINT)(ctx.json_cache)
+        getattr(module, STEP_WRITE_ENTRY_POINT)(ctx, payload)
+    else:
+        getattr(module, STEP_ENTRY_POINT)(ctx)
+
+
+# --- 步驟執行 ---
+def run_step(step_name, ctx, payload=_NO_PAYLOAD, before_commit=None):
+    """
+    在當前進程內執行單個步驟；成功則提交，失敗則回滾。
+    Args:
+        before_commit: 可選的回調 before_commit(ctx, module)，在步驟成功後、提交前執行，
+                       其寫入與步驟的寫入處於同一事務 (例如記錄 manifest)。
+    Returns:
+        bool: 步驟是否成功。
+    """
+    with step_log_file(step_name):
+        return _run_step_logged(step_name, ctx, payload, before_commit)
+
+
+def _run_step_logged(step_name, ctx, payload, before_commit):
+    logger.info("\n--- === [ 開始執行: %s ] === ---", step_name)
+    start_time = time.time()
+    try:
+        module = load_step(step_name)
+        changes_before = ctx.conn.total_changes
+        execute_step(module, ctx, payload)
+        ctx.rows_changed = ctx.conn.total_changes - changes_before
+        if before_commit is not None:
+            before_commit(ctx, module)
+        ctx.conn.commit()
+    except StepError as e:
+        logger.error("!!! 錯誤: %s !!!", e)
+        logger.warning("請確保所有 process_*.py 文件都存在於 'steps' 目錄下並定義了入口函數。")
+        ctx.conn.rollback()
+        return False
+    except FileNotFoundError as e:
+        logger.error("!!! 運行 %s 時缺少輸入文件: %s !!!", step_name, e)
+        ctx.conn.rollback()
+        return False
+    except sqlite3.Error as e:
+        logger.error("!!! 運行 %s 時發生數據庫錯誤: %s !!!", step_name, e)
+        ctx.conn.rollback()
+        return False
+    except Exception as e:
+        logger.error("!!! 運行 %s 時發生意外錯誤: %s !!!", step_name, e, exc_info=True)
+        ctx.conn.rollback()
+        return False
+
+    elapsed = time.time() - start_time
+    logger.info("--- === [ 完成執行: %s (成功, 耗時 %.2f 秒) ] === ---", step_name, elapsed)
+    return True
+
+
+def run_pipeline(step_names, json_dir, db_file):
+    """
+    按順序在同一進程內執行所有步驟，遇到失敗即中止。
+    Returns:
+        bool: 是否所有步驟都成功。
+    """
+    conn = open_connection(db_file)
+    ctx = StepContext(json_dir, db_file, conn)
+    manifest.ensure_manifest_table(conn.cursor())
+    WRITE_STATS.clear()
+
+    def bump_versions(ctx, module):
+        if ctx.rows_changed:
+            manifest.bump_data_versions(ctx.cursor(), module.__name__.rsplit('.', 1)[-1],
+                                        manifest.get_written_tables(module))
+
+    try:
+        with bulk_load_pragmas(conn):
+            for step_name in step_names:
+                if not run_step(step_name, ctx, before_commit=bump_versions):
+                    logger.error("\n!!! 由於步驟 %s 執行失敗，預處理流程已中斷 !!!", step_name)
+                    return False
+        return True
+    finally:
+        conn.close()
+        WRITE_STATS.report()
+
+
+def run_standalone(step_name, argv=None):
+    """
+    單獨執行某個步驟 (供步驟模組的 `__main__` 使用)。
+    用法: python -m azurlane_analyzer.preprocessing.steps.<step> <json_data_dir> <db_file_path>
+    Returns:
+        int: 進程退出碼。
+    """
+    ensure_logging()
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        logger.error("錯誤: 需要兩個命令行參數：JSON數據目錄路徑 和 數據庫文件路徑。")
+        logger.warning("用法: python -m %s.%s <json_data_dir> <db_file_path>", STEPS_PACKAGE, step_name)
+        return 1
+
+    json_data_dir = Path(argv[0]).resolve()
+    db_file = Path(argv[1]).resolve()
+    logger.info("  接收到 JSON 目錄: %s", json_data_dir)
+    logger.info("  接收到 DB 文件: %s", db_file)
+    return 0 if run_pipeline([step_name], json_data_dir, db_file) else 1
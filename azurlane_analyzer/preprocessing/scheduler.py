@@ -0,0 +1,285 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/scheduler.py
+#
+# 依賴感知的並行步驟調度器。
+# 每個步驟模組以模組級常量聲明它讀取/寫入的表與欄位:
+#     READS  = ('equipment.id', 'equipment.weapon_id')
+#     WRITES = ('equipment.wp_type', ...)
+# 元素可以是 'table.column' (精確到欄位) 或 'table' (整張表)。
+# 調度器據此推導步驟間的依賴關係 (讀後寫、寫後讀、寫後寫都視為衝突，按列表順序排先後；
+# 其中只有寫後讀是真正的數據依賴)，然後:
+#   - 所有步驟的 parse 階段 (只讀 JSON) 一開始就提交到進程池並行執行；
+#   - write 階段由主進程作為唯一的寫入者，在共用連接上串行執行，依賴滿足後才寫入；
+#   - 某步驟失敗時只跳過讀取其數據的下游分支，互不相關的分支照常完成。
+# 未聲明 READS/WRITES 的步驟 (或無法載入的步驟) 被保守地視為屏障: 與前後所有步驟都有依賴。
+# 增量模式下 (默認)，輸入 JSON 未變化 (見 manifest.py) 且沒有數據上游需要重跑的步驟
+# 連 parse 都不會執行。
+
+import os
+import sys
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from azurlane_analyzer.preprocessing import manifest
+from azurlane_analyzer.preprocessing.bulk_writer import WRITE_STATS, bulk_load_pragmas
+from azurlane_analyzer.preprocessing.log import ensure_logging, get_logger, reset_step_logs, step_log_file
+from azurlane_analyzer.preprocessing.pipeline import (
+    JsonCache,
+    StepContext,
+    StepError,
+    has_parse_phase,
+    load_step,
+    open_connection,
+    run_step,
+)
+
+logger = get_logger(__name__)
+
+# 步驟狀態
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+STATUS_UNCHANGED = 'unchanged'   # 增量模式下輸入未變化，無需重跑
+
+
+# --- 依賴推導 ---
+def get_declarations(module):
+    """
+    讀取步驟模組的 READS/WRITES 聲明。
+    Returns:
+        tuple: (reads, writes) 兩個 frozenset；未聲明時返回 None (視為屏障)。
+    """
+    if module is None or not hasattr(module, 'READS') or not hasattr(module, 'WRITES'):
+        return None
+    return frozenset(module.READS), frozenset(module.WRITES)
+
+
+def _overlaps(items_a, items_b):
+    """兩組 'table' / 'table.column' 聲明是否涉及相同的欄位。"""
+    for a in items_a:
+        table_a = a.split('.', 1)[0]
+        for b in items_b:
+            if a == b or a == b.split('.', 1)[0] or b == table_a:
+                return True
+    return False
+
+
+# 依賴種類
+DEP_DATA = 'data'    # 下游讀取上游寫入的數據 (寫後讀)，上游失敗時下游必須跳過
+DEP_ORDER = 'order'  # 僅需保持先後順序 (讀後寫、寫後寫)，上游失敗 (已回滾) 時下游仍可執行
+
+
+def _dependency_kind(decl_a, decl_b):
+    """
+    步驟 b (列表中位於 a 之後) 對步驟 a 的依賴種類；無衝突時返回 None。
+    任一方為屏障 (未聲明) 時保守地視為數據依賴。
+    """
+    if decl_a is None or decl_b is None:
+        return DEP_DATA
+    reads_a, writes_a = decl_a
+    reads_b, writes_b = decl_b
+    if _overlaps(writes_a, reads_b):    # 寫後讀
+        return DEP_DATA
+    if _overlaps(reads_a, writes_b) or _overlaps(writes_a, writes_b):  # 讀後寫 / 寫後寫
+        return DEP_ORDER
+    return None
+
+
+def build_dependency_graph(step_names, declarations):
+    """
+    根據聲明推導依賴圖。只允許列表中靠後的步驟依賴靠前的步驟，因此結果一定是有向無環圖。
+    Args:
+        step_names (list): 步驟名 (按期望的先後順序)。
+        declarations (dict): {step_name: get_declarations() 的結果}。
+    Returns:
+        dict: {step_name: {上游步驟名: DEP_DATA 或 DEP_ORDER}}。
+    """
+    deps = {}
+    for i, name in enumerate(step_names):
+        deps[name] = {}
+        for earlier in step_names[:i]:
+            kind = _dependency_kind(declarations[earlier], declarations[name])
+            if kind is not None:
+                deps[name][earlier] = kind
+    return deps
+
+
+def describe_graph(step_names, deps):
+    """打印依賴圖，便於確認哪些步驟可以並行。"""
+    logger.info("  步驟依賴關係:")
+    for name in step_names:
+        upstream = ', '.join(
+            n if deps[name][n] == DEP_DATA else f"{n} (僅順序)"
+            for n in step_names if n in deps[name]
+        ) or '(無，可立即執行)'
+        logger.info("    - %s <- %s", name, upstream)
+
+
+# --- 進程池中執行的解析任務 ---
+_worker_json_caches = {}
+
+
+def _parse_in_worker(step_name, json_dir):
+    """在進程池的工作進程中執行步驟的 parse 階段。同一工作進程內共用一份 JSON 快取。"""
+    json_cache = _worker_json_caches.get(json_dir)
+    if json_cache is None:
+        json_cache = _worker_json_caches[json_dir] = JsonCache(json_dir)
+    ensure_logging()
+    module = load_step(step_name)
+    with step_log_file(step_name):
+        logger.info("  [parse] %s 開始解析 (PID %s)", step_name, os.getpid())
+        payload = module.parse(json_cache)
+    sys.stdout.flush()
+    return payload
+
+
+# --- 增量判斷 ---
+def mark_unchanged_steps(cursor, step_names, modules, deps, status, fingerprints):
+    """
+    根據 manifest 將輸入未變化的步驟標記為 STATUS_UNCHANGED。
+    步驟只要自身輸入/版本有變化，或任一數據上游需要重跑，就必須重跑。
+    """
+    manifest.ensure_manifest_table(cursor)
+    for name in step_names:
+        if name in status:
+            continue
+        dirty_upstream = [d for d, kind in deps[name].items()
+                          if kind == DEP_DATA and status.get(d) != STATUS_UNCHANGED]
+        if dirty_upstream:
+            logger.info("    - %s: 需要重跑 (上游 %s 將重跑)", name, ', '.join(dirty_upstream))
+            continue
+        up_to_date, reason = manifest.check_step(cursor, name, modules[name], fingerprints)
+        if up_to_date:
+            status[name] = STATUS_UNCHANGED
+            logger.info("    - %s: 跳過 (%s)", name, reason)
+        else:
+            logger.info("    - %s: 需要重跑 (%s)", name, reason)
+
+
+# --- 調度執行 ---
+def run_scheduled(step_names, json_dir, db_file, max_workers=None, incremental=True):
+    """
+    按依賴關係調度所有步驟: parse 階段在進程池中並行，write 階段串行寫入共用連接。
+    Args:
+        step_names (list): 步驟模組名 (列表順序決定衝突步驟的先後)。
+        json_dir (Path): sharecfgdata 目錄。
+        db_file (Path): 數據庫文件路徑。
+        max_workers (int): 進程池大小；默認取 CPU 數與可並行解析步驟數的較小值。
+        incremental (bool): 是否跳過輸入未變化的步驟；False 時全量重建。
+    Returns:
+        bool: 是否所有步驟都成功。
+    """
+    step_names = list(step_names)
+    reset_step_logs(step_names)
+    status = {}
+    modules = {}
+
+    # 1. 預先載入所有步驟模組，讀取依賴聲明
+    for name in step_names:
+        try:
+            modules[name] = load_step(name)
+        except StepError as e:
+            logger.error("!!! 錯誤: %s !!!", e)
+            modules[name] = None
+            status[name] = STATUS_FAILED
+    declarations = {name: get_declarations(modules[name]) for name in step_names}
+    deps = build_dependency_graph(step_names, declarations)
+    describe_graph(step_names, deps)
+
+    conn = open_connection(db_file)
+    ctx = StepContext(json_dir, db_file, conn)
+    fingerprints = manifest.InputFingerprints(json_dir)
+    cursor = conn.cursor()
+    manifest.ensure_manifest_table(cursor)
+    if incremental:
+        logger.info("  增量檢查 (基於源 JSON 內容哈希):")
+        mark_unchanged_steps(cursor, step_names, modules, deps, status, fingerprints)
+    else:
+        manifest.clear_manifest(cursor)
+    conn.commit()
+
+    def record_manifest(ctx, module):
+        step_name = module.__name__.rsplit('.', 1)[-1]
+        manifest.record_step(ctx.cursor(), step_name, module, fingerprints)
+        # 沒有修改任何行的步驟 (例如輸入文件不存在，write 收到 None) 不更新數據版本號，依賴它的快取結果繼續有效
+        if ctx.rows_changed:
+            manifest.bump_data_versions(ctx.cursor(), step_name, manifest.get_written_tables(module))
+
+    parse_steps = [n for n in step_names
+                   if n not in status and modules[n] is not None and has_parse_phase(modules[n])]
+    if max_workers is None:
+        max_workers = max(1, min(len(parse_steps), os.cpu_count() or 1))
+    pool = ProcessPoolExecutor(max_workers=max_workers) if parse_steps else None
+    WRITE_STATS.clear()
+    try:
+        # 2. 所有 parse 階段立即提交 (它們只讀 JSON，與數據庫狀態無關)
+        futures = {}
+        if pool is not None:
+            for name in parse_steps:
+                futures[name] = pool.submit(_parse_in_worker, name, str(json_dir))
+
+        # 3. 主進程作為唯一寫入者，按依賴順序串行執行 write 階段 (期間使用批量載入 PRAGMA)
+        pending = [n for n in step_names if n not in status]
+        with bulk_load_pragmas(conn) if pending else nullcontext():
+            _drain(pending, deps, status, futures, ctx, record_manifest)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        conn.close()
+
+    WRITE_STATS.report()
+    _print_summary(step_names, status)
+    return all(status[name] in (STATUS_OK, STATUS_UNCHANGED) for name in step_names)
+
+
+def _drain(pending, deps, status, futures, ctx, record_manifest):
+    """寫入者主循環: 依賴滿足且 parse 完成的步驟依列表順序寫入；上游失敗的數據下游被跳過。"""
+    while pending:
+        progressed = False
+        for name in pending:
+            upstream = deps[name]
+            blocked_by = [d for d, kind in upstream.items()
+                          if kind == DEP_DATA and status.get(d) in (STATUS_FAILED, STATUS_SKIPPED)]
+            if blocked_by:
+                status[name] = STATUS_SKIPPED
+                if name in futures:
+                    futures[name].cancel()
+                logger.error("\n!!! 跳過步驟 %s: 上游步驟 %s 未成功 !!!", name, ', '.join(sorted(blocked_by)))
+            elif all(d in status for d in upstream):
+                future = futures.get(name)
+                if future is not None and not future.done():
+                    continue
+                status[name] = _write_step(name, ctx, future, record_manifest)
+            else:
+                continue
+            pending.remove(name)
+            progressed = True
+            break  # 重新從頭掃描，讓可寫入的步驟保持列表順序
+
+        if not progressed:
+            running = [futures[n] for n in pending if n in futures and not futures[n].done()]
+            if not running:
+                raise RuntimeError(f"調度器無法推進，剩餘步驟: {pending}")
+            wait(running, return_when=FIRST_COMPLETED)
+
+
+def _write_step(name, ctx, future, before_commit=None):
+    """取出 parse 結果 (若有) 並在共用連接上執行 write 階段。"""
+    if future is None:
+        return STATUS_OK if run_step(name, ctx, before_commit=before_commit) else STATUS_FAILED
+    try:
+        payload = future.result()
+    except FileNotFoundError as e:
+        logger.error("\n!!! 解析 %s 時缺少輸入文件: %s !!!", name, e)
+        return STATUS_FAILED
+    except Exception as e:
+        logger.error("\n!!! 解析 %s 時發生錯誤: %s !!!", name, e)
+        return STATUS_FAILED
+    return STATUS_OK if run_step(name, ctx, payload, before_commit) else STATUS_FAILED
+
+
+def _print_summary(step_names, status):
+    labels = {STATUS_OK: '成功', STATUS_FAILED: '失敗', STATUS_SKIPPED: '已跳過 (上游失敗)',
+              STATUS_UNCHANGED: '未變化 (增量跳過)'}
+    logger.info("\n  步驟執行結果:")
+    for name in step_names:
+        logger.info("    - %s: %s", name, labels[status[name]])
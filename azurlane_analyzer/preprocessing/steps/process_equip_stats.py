@@ -1,362 +1,437 @@
 # 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/steps/process_equip_stats.py
 
+import hashlib
 import json
-import sqlite3
 import sys
+from collections import Counter
 from pathlib import Path
 import time
 
+from azurlane_analyzer.preprocessing.bulk_writer import bulk_write
+from azurlane_analyzer.preprocessing.field_map import (
+    CONFLICT_UPSERT,
+    Field,
+    FieldMap,
+    first_item,
+    record_id,
+    to_int,
+    to_text,
+)
+from azurlane_analyzer.preprocessing.inheritance import resolve_inheritance
+from azurlane_analyzer.preprocessing.log import DEBUG, StepCounters, get_logger
+from azurlane_analyzer.preprocessing.manifest import InputFingerprints
+
+logger = get_logger(__name__)
+
 # --- 配置 ---
 TARGET_JSON_FILENAME = 'equip_data_statistics.json' # 處理的目標JSON檔案
 
-# --- 輔助函數：處理 `base` 繼承 (保持不變) ---
-def get_merged_equip_data(equip_id_str, all_equip_data):
+# --- 輸入聲明 (供增量重建判斷輸入是否變化；修改處理邏輯或輸出結構時遞增 STEP_VERSION) ---
+INPUTS = (TARGET_JSON_FILENAME,)
+STEP_VERSION = 3
+
+# --- 屬性解析 ---
+# attribute_N / value_N 中的屬性名 -> equipment 的 stat_* 欄位 (唯一的對照表；
+# 數據元組中屬性欄位的位置由 STAT_COLUMNS 的順序決定，無需另外維護)
+STAT_COLUMNS = (
+    'stat_hp', 'stat_firepower', 'stat_torpedo', 'stat_aviation', 'stat_reload',
+    'stat_antiair', 'stat_hit', 'stat_evasion', 'stat_speed', 'stat_luck',
+    'stat_antisub', 'stat_oxy_max', 'stat_raid_distance',
+)
+ATTRIBUTE_TO_STAT_COLUMN = {
+    "health": "stat_hp",          # 耐久
+    "durability": "stat_hp",      # 耐久 durability
+    "cannon": "stat_firepower",   # 炮擊 (Firepower)
+    "torpedo": "stat_torpedo",    # 雷擊 (Torpedo)
+    "air": "stat_aviation",       # 航空 (Aviation)
+    "reload": "stat_reload",      # 裝填
+    "antiaircraft": "stat_antiair",  # 防空 (Anti-Air)
+    "hit": "stat_hit",            # 命中 (Hit/Accuracy)
+    "dodge": "stat_evasion",      # 機動/閃避 (Evasion)
+    "speed": "stat_speed",        # 航速 (Speed)
+    "luck": "stat_luck",          # 幸運
+    "antisub": "stat_antisub",    # 反潛
+    "oxy_max": "stat_oxy_max",    # 氧氣最大
+    "raid_distance": "stat_raid_distance",  # 突襲距離
+    # --- 請根據數據源添加更多映射 (值必須是 STAT_COLUMNS 中的欄位) ---
+}
+# 直接寫在記錄頂層 (而不是 attribute_N) 的屬性: JSON 鍵 -> 欄位，覆蓋 attribute_N 的結果
+DIRECT_STAT_KEYS = {
+    'oxy_max': 'stat_oxy_max',
+    'raid_distance': 'stat_raid_distance',
+}
+ATTRIBUTE_SLOTS = (1, 2, 3)  # attribute_1..3 / value_1..3
+
+
+class StatDecoder:
     """
-    遞迴獲取並合併裝備資料，處理 'base' 繼承。
-    Args:
-        equip_id_str (str): 要獲取資料的裝備 ID (字串形式)。
-        all_equip_data (dict): 包含所有裝備原始資料的字典。
-    Returns:
-        dict: 合併了所有基礎屬性後的最終裝備資料字典。
-              如果 equip_id_str 不存在，返回 None。
+    屬性解碼器: 把一條裝備記錄的 attribute_N/value_N (以及頂層的 DIRECT_STAT_KEYS)
+    解碼為與 STAT_COLUMNS 對齊的屬性元組。
+      - 屬性名在第一次出現時駐留為槽位索引 (小寫化與查表每種名稱只做一次，未知名稱駐留為 -1)；
+      - 要讀取的鍵與其目標槽位在構造時預先算好 (見 _attribute_keys / _direct_slots)，
+        解碼時按表循環，每個鍵只讀取一次，數值寫入按槽位預先填好 None 的列表；
+      - 每個槽位的賦值次數、轉換失敗與未知屬性名只在解碼期間累計，由 report() 匯總輸出一次。
+    計數對象由所有調用共用，因此不可並發使用 (每個進程的解析階段是單線程的)。
     """
-    if equip_id_str not in all_equip_data:
-        return None
-
-    current_data = all_equip_data[equip_id_str].copy()
-    base_id_str = current_data.get('base')
-
-    if base_id_str:
-        base_id_str = str(base_id_str)
-        base_data = get_merged_equip_data(base_id_str, all_equip_data)
-        if base_data:
-            merged_data = base_data.copy()
-            merged_data.update(current_data)
-            return merged_data
-        else:
-            print(f"  嚴重警告: ID '{equip_id_str}' 的基礎 ID '{base_id_str}' 未找到！將只使用 '{equip_id_str}' 的資料。", file=sys.stderr)
-            return current_data
-    else:
-        return current_data
+
+    def __init__(self):
+        self._column_index = {name: STAT_COLUMNS.index(column) for name, column in ATTRIBUTE_TO_STAT_COLUMN.items()}
+        self._slots = {}  # 原始屬性名 -> 槽位索引 (-1 為未知)
+        # 預先算好的讀取表: (屬性名鍵, 數值鍵)，以及 (頂層鍵, 槽位)
+        self._attribute_keys = tuple((f'attribute_{i}', f'value_{i}') for i in ATTRIBUTE_SLOTS)
+        self._direct_slots = tuple((key, STAT_COLUMNS.index(column)) for key, column in DIRECT_STAT_KEYS.items())
+        self._hp_slot = STAT_COLUMNS.index('stat_hp')
+        self._empty = [None] * len(STAT_COLUMNS)
+        self._assigned = [0] * len(STAT_COLUMNS)
+        self.counters = StepCounters('process_equip_stats')
+        self.unknown_attributes = Counter()   # 未處理的屬性名 -> 出現次數
+        self.conversion_failures = Counter()  # 數值無法轉換的屬性名 -> 次數
+        self._failure_examples = {}           # 屬性名 -> 第一個失敗的 (ID, 原始值)
+        self._debug = False
+        self.reset()
+
+    def reset(self):
+        """開始新一輪解碼: 清空計數 (駐留的槽位保留)。"""
+        self.counters.counts.clear()
+        self.unknown_attributes.clear()
+        self.conversion_failures.clear()
+        self._failure_examples.clear()
+        self._assigned[:] = [0] * len(STAT_COLUMNS)
+        self._debug = logger.isEnabledFor(DEBUG)
+
+    def _intern(self, name):
+        slot = self._column_index.get(name.lower(), -1)
+        self._slots[name] = slot
+        return slot
+
+    def _failed(self, key, name, value):
+        self.conversion_failures[name] += 1
+        self._failure_examples.setdefault(name, (key, value))
+
+    def _log_record(self, key, data, stats):
+        logger.debug("  ID %s 原始屬性: %s", key, ', '.join(
+            f"{data.get(f'attribute_{i}')}={data.get(f'value_{i}')!r}" for i in ATTRIBUTE_SLOTS
+            if data.get(f'value_{i}') is not None))
+        logger.debug("  ID %s 最終屬性 (準備寫入DB): %s", key, ', '.join(
+            f"{column}: {value}" for column, value in zip(STAT_COLUMNS, stats)))
+
+    def decode(self, data, key):
+        """
+        解碼一條記錄。
+        Args:
+            data (dict): 裝備記錄 (已處理 'base' 繼承)。
+            key (str): 記錄的 ID (僅用於日誌與失敗示例)。
+        Returns:
+            tuple: 與 STAT_COLUMNS 順序一致的屬性值，未出現的屬性為 None。
+        """
+        get = data.get
+        slots = self._slots
+        assigned = self._assigned
+        stats = self._empty.copy()
+        for name_key, value_key in self._attribute_keys:
+            name = get(name_key)
+            value = get(value_key)
+            if not name or value is None:
+                continue
+            slot = slots.get(name)
+            if slot is None:
+                slot = self._intern(name)
+            if slot < 0:
+                self.unknown_attributes[name] += 1
+                continue
+            try:
+                stats[slot] = float(value)
+                assigned[slot] += 1
+            except (TypeError, ValueError):
+                self._failed(key, name, value)
+
+        # 後備: 沒有 attribute_1 但有 value_1 時視為耐久
+        first_name_key, first_value_key = self._attribute_keys[0]
+        first_value = get(first_value_key)
+        if get(first_name_key) is None and first_value is not None and stats[self._hp_slot] is None:
+            try:
+                stats[self._hp_slot] = float(first_value)
+                self.counters.add('fallback_value_1_to_hp')
+            except (ValueError, TypeError):
+                pass
+
+        for direct_key, slot in self._direct_slots:
+            value = get(direct_key)
+            if value is not None:
+                try:
+                    stats[slot] = float(value)
+                except (ValueError, TypeError):
+                    self._failed(key, direct_key, value)
+
+        stats = tuple(stats)
+        if self._debug:
+            self._log_record(key, data, stats)
+        return stats
+
+    def __call__(self, data, key):
+        return self.decode(data, key)
+
+    def report(self):
+        """輸出本輪解碼的匯總 (每種未知屬性名、每種轉換失敗只出現一次)。"""
+        assigned = sum(self._assigned)
+        if assigned:
+            self.counters.counts['attribute_assigned'] = assigned
+        failed = sum(self.conversion_failures.values())
+        if failed:
+            self.counters.counts['attribute_conversion_failed'] = failed
+            logger.warning("  警告: %d 種屬性值轉換失敗: %s", len(self.conversion_failures), ', '.join(
+                f"'{name}' x{count} (例如 ID {self._failure_examples[name][0]}: "
+                f"'{self._failure_examples[name][1]}')"
+                for name, count in self.conversion_failures.most_common()))
+        if self.unknown_attributes:
+            logger.warning("  信息: %d 種屬性名未處理 (檢查 ATTRIBUTE_TO_STAT_COLUMN): %s", len(self.unknown_attributes),
+                           ', '.join(f"'{name}' x{count}" for name, count in self.unknown_attributes.most_common()))
+        if assigned and logger.isEnabledFor(DEBUG):
+            logger.debug("  各屬性欄位賦值次數: %s", ', '.join(
+                f"{column}={count}" for column, count in zip(STAT_COLUMNS, self._assigned) if count))
+        self.counters.report(logger)
+
+
+decode_stats = StatDecoder()
+
+
+# --- 其他欄位的來源函數 ---
+def parse_damage(data, key):
+    """'damage' 欄位: '40x3' -> (40, 3)；純數字 -> (數字, 1)；其他 -> (None, None)。"""
+    damage = data.get('damage')
+    if isinstance(damage, str) and 'x' in damage:
+        parts = damage.split('x')
+        try:
+            return int(parts[0].strip()), int(parts[1].strip())
+        except (ValueError, IndexError):
+            logger.warning("  警告: ID %s damage 解析錯誤: '%s'", key, damage)
+    elif isinstance(damage, (int, float)):
+        return damage, 1
+    return None, None
+
+
+def sub_type_from_labels(data, key):
+    labels = data.get('label', [])
+    if "MG" in labels:
+        return "主炮"
+    if "TP" in labels:
+        return "魚雷"
+    return None
+
+
+def stat_bonus_json(data, key):
+    """原始 value_N 的 JSON 存儲 (備份/參考)；沒有任何 value_N 時為 None。"""
+    raw = {f'value_{i}': data[f'value_{i}'] for i in ATTRIBUTE_SLOTS if data.get(f'value_{i}') is not None}
+    return json.dumps(raw) if raw else None
+
+
+# equipment 表的欄位映射 (數據元組的順序即此列表的順序)。
+# upsert 時 name 為 NULL 則保留舊值 (不以缺失的名稱覆蓋已有名稱)。
+EQUIPMENT_FIELDS = FieldMap('equipment', (
+    Field('id', record_id, to_int),
+    Field('name', keep_existing=True),
+    Field('equipment_type', 'type', to_text),
+    Field('rarity', convert=to_text),
+    Field('faction', 'nationality', to_text),
+    Field('weapon_id', convert=first_item),             # 主武器 ID
+    Field('sub_type', sub_type_from_labels),
+    Field(('base_damage_initial', 'volley_count'), parse_damage),
+    Field('stat_bonus', stat_bonus_json),
+    Field(STAT_COLUMNS, decode_stats.decode),
+), conflict=CONFLICT_UPSERT)
+
+# build_equipment_rows 產生的元組中各元素對應的 equipment 欄位
+EQUIPMENT_STATS_COLUMNS = EQUIPMENT_FIELDS.columns
+SQL_UPSERT_EQUIPMENT = EQUIPMENT_FIELDS.sql
+
+# --- 依賴聲明 (供調度器推導步驟間的依賴關係) ---
+READS = ()
+WRITES = tuple(f'equipment.{column}' for column in EQUIPMENT_STATS_COLUMNS) + (
+    'equipment_fingerprint', 'equipment_changelog',
+)
+
 
 # --- 核心處理函數 ---
-def process_equipment_stats(cursor, json_file_path):
+def build_equipment_rows(raw_equip_data, source_name=TARGET_JSON_FILENAME):
     """
-    處理 equip_data_statistics.json，提取屬性並使用 Upsert (插入或更新) 到 equipment 表。
+    解析 equip_data_statistics.json 的內容，處理 'base' 繼承並按 EQUIPMENT_FIELDS 提取數據元組。
+    此函數不接觸數據庫，可以在進程池中執行。
+    Args:
+        raw_equip_data (dict): 已解析的 equip_data_statistics.json 內容。
+        source_name (str): 來源文件名 (僅用於日誌)。
+    Returns:
+        list: 與 EQUIPMENT_STATS_COLUMNS 順序一致的數據元組列表。
     """
-    print(f"  -> 開始處理裝備統計檔案: {json_file_path.name}")
-    start_time_load = time.time()
-    raw_equip_data = {}
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            raw_equip_data = json.load(f) # 載入JSON數據
-        load_time = time.time() - start_time_load
-        print(f"  成功載入 {json_file_path.name} ({len(raw_equip_data)} 個頂層條目)，耗時: {load_time:.2f} 秒。")
-    except FileNotFoundError:
-        print(f"  錯誤: 檔案未找到 {json_file_path}", file=sys.stderr)
-        raise
-    except json.JSONDecodeError as e:
-        print(f"  錯誤: 解析 JSON 檔案 {json_file_path} 失敗: {e}", file=sys.stderr)
-        raise
-    except Exception as e:
-        print(f"  載入 {json_file_path.name} 時發生意外錯誤: {e}", file=sys.stderr)
-        raise
+    logger.info("  -> 開始處理裝備統計檔案: %s", source_name)
 
     # --- 預處理所有裝備，處理繼承關係 ---
-    print(f"  正在處理 'base' 繼承關係...")
+    logger.info("  正在處理 'base' 繼承關係...")
     start_time_merge = time.time()
-    final_equip_data = {}
-    all_ids_to_process = []
     # 假設JSON結構直接是 ID:data 的字典
-    if isinstance(raw_equip_data, dict) and all(isinstance(k, str) for k in raw_equip_data.keys()):
-        all_ids_to_process = list(raw_equip_data.keys())
-        actual_data_dict = raw_equip_data
-    # (可選) 如果您的 JSON 頂層有 'all' 鍵包含所有 ID 列表，可以取消註釋並調整以下邏輯
-    # elif 'all' in raw_equip_data and isinstance(raw_equip_data['all'], list):
-    #     all_ids_to_process = [str(eid) for eid in raw_equip_data['all']]
-    #     actual_data_dict = {str(k): v for k, v in raw_equip_data.items() if k != 'all'}
-    else:
-        print(f"  錯誤: {json_file_path.name} 的頂層結構無法識別。期望是直接的 ID->資料的字典。", file=sys.stderr)
-        raise ValueError(f"無法處理 {json_file_path.name} 的結構")
+    if not (isinstance(raw_equip_data, dict) and all(isinstance(k, str) for k in raw_equip_data.keys())):
+        logger.error("  錯誤: %s 的頂層結構無法識別。期望是直接的 ID->資料的字典。", source_name)
+        raise ValueError(f"無法處理 {source_name} 的結構")
 
-    for equip_id_str in all_ids_to_process:
-        merged_data = get_merged_equip_data(equip_id_str, actual_data_dict) # 獲取合併繼承後的數據
-        if merged_data:
-            final_equip_data[equip_id_str] = merged_data
+    # 共用的繼承解析器: 記憶化、按拓撲順序解析，結果是不複製字典的疊加視圖
+    final_equip_data = resolve_inheritance(raw_equip_data, source_name=source_name)
     merge_time = time.time() - start_time_merge
-    print(f"  完成 'base' 繼承處理，得到 {len(final_equip_data)} 筆最終裝備資料，耗時: {merge_time:.2f} 秒。")
+    logger.info("  完成 'base' 繼承處理，得到 %d 筆最終裝備資料，耗時: %.2f 秒。", len(final_equip_data), merge_time)
 
-    # --- 遍歷處理後的資料並 Upsert 到數據庫 ---
-    print(f"  開始將裝備統計數據插入或更新到資料庫 (基於 attribute_x 解析屬性)...")
-    start_time_db = time.time()
-    processed_count = 0
+    # --- 遍歷處理後的資料並提取數據元組 ---
+    logger.info("  開始解析裝備統計數據 (基於 attribute_x 解析屬性)...")
+    start_time_parse = time.time()
+    rows = []
     skipped_errors_count = 0
+    # 逐條目的細節只在 DEBUG 級別輸出；默認級別下熱循環只做計數，結束時輸出一行匯總
+    debug = logger.isEnabledFor(DEBUG)
+    decode_stats.reset()
+    extract = EQUIPMENT_FIELDS.extract
+
+    for equip_id_str, data in final_equip_data.items():
+        try:
+            rows.append(extract(data, equip_id_str))
+        except KeyError as e:
+            logger.warning("  警告: ID %s 缺少鍵: %s", equip_id_str, e)
+            skipped_errors_count += 1
+        except ValueError as e:
+            logger.warning("  警告: ID %s 資料轉換錯誤: %s", equip_id_str, e)
+            skipped_errors_count += 1
+        except Exception as e:
+            # DEBUG 級別時附帶 traceback
+            logger.error("  錯誤: ID %s 意外錯誤: %s", equip_id_str, e, exc_info=debug)
+            skipped_errors_count += 1
+
+    parse_time = time.time() - start_time_parse
+    decode_stats.report()
+    logger.info("  完成解析。得到 %d 筆，跳過 %d 筆。耗時: %.2f 秒。", len(rows), skipped_errors_count, parse_time)
+    return rows
+
 
-    # SQL Upsert 語句保持不變，因為欄位定義是一樣的
-    sql_upsert_query = """
-        INSERT INTO equipment (
-            id, name, equipment_type, rarity, faction, weapon_id,               -- 基礎6個
-            sub_type, base_damage_initial, volley_count, stat_bonus,            -- 舊擴展4個 (總共10個)
-            stat_hp, stat_firepower, stat_torpedo, stat_aviation, stat_reload,  -- 屬性第1組5個 (總共15個)
-            stat_antiair,stat_hit, stat_evasion, stat_speed, stat_luck,         -- 屬性第2組5個 (總共20個)
-            stat_antisub,                                                       -- 屬性第3組1個 (總共21個)
-
-            -- *** 新增的欄位 ***
-            stat_oxy_max, stat_raid_distance                                    -- 新增2個 (總共23個)
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-            ?, ?                             -- 對應新欄位的 VALUES 佔位符
-        )
-        ON CONFLICT(id) DO UPDATE SET
-            name = COALESCE(excluded.name, equipment.name),
-            equipment_type = excluded.equipment_type,
-            rarity = excluded.rarity,
-            faction = excluded.faction,
-            weapon_id = excluded.weapon_id,
-            sub_type = excluded.sub_type,
-            base_damage_initial = excluded.base_damage_initial,
-            volley_count = excluded.volley_count,
-            stat_bonus = excluded.stat_bonus,
-            stat_hp = excluded.stat_hp,
-            stat_firepower = excluded.stat_firepower,
-            stat_torpedo = excluded.stat_torpedo,
-            stat_aviation = excluded.stat_aviation,
-            stat_reload = excluded.stat_reload,
-            stat_antiair = excluded.stat_antiair,
-            stat_hit = excluded.stat_hit,
-            stat_evasion = excluded.stat_evasion,
-            stat_speed = excluded.stat_speed,
-            stat_luck = excluded.stat_luck,
-            stat_antisub = excluded.stat_antisub,
-            stat_oxy_max = excluded.stat_oxy_max,
-            stat_raid_distance = excluded.stat_raid_distance
-        ;
+def write_equipment_rows(cursor, rows):
     """
-    # 創建一個從 JSON attribute 名稱到數據庫 stat_* 欄位名的映射
-    # 您需要根據 wiki 或數據實際情況擴充這個映射
-    # 鍵是 JSON 中 attribute_x 的值，值是 s_* 變量名 (用於 locals() 賦值) 或直接的數據庫欄位名
-    attribute_to_stat_map = {
-        "health": "s_hp",          # 耐久
-        "durability": "s_hp",      # 耐久 durability
-        "cannon": "s_fp",          # 炮擊 (Firepower)
-        "torpedo": "s_trp",        # 雷擊 (Torpedo)
-        "air": "s_avi",            # 航空 (Aviation)
-        "reload": "s_reload",      # 裝填
-        "antiaircraft": "s_aa",    # 防空 (Anti-Air)
-        "hit": "s_hit",            # 命中 (Hit/Accuracy)
-        "dodge": "s_eva",          # 機動/閃避 (Evasion)
-        "speed": "s_spd",          # 航速 (Speed)
-        "luck": "s_luck",          # 幸運
-        "antisub": "s_asw",        # 反潛
-        "oxy_max": "s_oxy_max",    # 氧氣最大 
-        "raid_distance": "s_raid_distance",   # 突襲距離
-
-        # --- 請根據您的數據源添加更多映射 ---
-        # 例如，如果 JSON 中有 "antiair" 代表防空，則也加入 "antiair": "s_aa",
-        # 如果有 "range" 代表射程 (這通常不是 value_x 屬性，但舉例)
-        # 如果有 "accuracy" 代表命中
-        # 如果有 "aviation_correction" 代表空襲引導之類的
-    }
+    將 build_equipment_rows 產生的數據元組 Upsert (插入或更新) 到 equipment 表 (全量，按塊 executemany)。
+    """
+    logger.info("  開始將 %d 筆裝備統計數據插入或更新到資料庫...", len(rows))
+    writer = bulk_write(cursor, SQL_UPSERT_EQUIPMENT, rows, label='process_equip_stats: equipment upsert')
+    logger.info("  完成資料庫操作。成功處理 %d 筆。耗時: %.2f 秒。", writer.rows_written, writer.seconds)
 
 
-    for equip_id_str, data in final_equip_data.items():
-        try:
-            equip_id_int = int(data.get('id', equip_id_str))
-            name_val = data.get('name')
-            type_val_json = data.get('type') # 裝備大類 (來自 JSON)
-            type_val_db = str(type_val_json) if type_val_json is not None else None # 存入DB的equipment_type
-
-            rarity_val = str(data.get('rarity')) if data.get('rarity') is not None else None
-            faction_val = str(data.get('nationality')) if data.get('nationality') is not None else None
-            weapon_id_list = data.get('weapon_id', [])
-            main_weapon_id_val = weapon_id_list[0] if weapon_id_list else None
-
-            damage_str = data.get('damage')
-            base_dmg_val = None
-            volley_ct_val = None
-            if isinstance(damage_str, str) and 'x' in damage_str:
-                parts = damage_str.split('x')
-                try:
-                    base_dmg_val = int(parts[0].strip())
-                    volley_ct_val = int(parts[1].strip())
-                except (ValueError, IndexError):
-                    print(f"  警告: ID {equip_id_int} damage 解析錯誤: '{damage_str}'", file=sys.stderr)
-            elif isinstance(damage_str, (int, float)):
-                 base_dmg_val = damage_str
-                 volley_ct_val = 1
-
-            label_list = data.get('label', [])
-            sub_type_val = None
-            # 之前的 sub_type 示例，您可以保持或完善:
-            if "MG" in label_list: sub_type_val = "主炮"
-            elif "TP" in label_list: sub_type_val = "魚雷"
-            # ... (其他 sub_type 判斷)
-
-            # --- 初始化所有 s_* 屬性變量為 None ---
-            # 這樣可以確保每次循環都從乾淨的狀態開始
-            # 改為初始化一個字典來存儲這些屬性值
-            current_stats = {
-                "s_hp": None, "s_fp": None, "s_trp": None, "s_avi": None, "s_reload": None, "s_aa": None,
-                "s_hit": None, "s_eva": None, "s_spd": None, "s_luck": None, "s_asw": None,
-                "s_oxy_max": None, "s_raid_distance": None # 使用與 map 值一致的鍵名
-            }
-            # 初始化新欄位的變量
-            # (如果添加了更多 stat_* 欄位，這裡也要對應初始化)
-
-            # --- 獲取 attribute_x 和 value_x ---
-            # 字典推導式，方便獲取所有存在的 attribute_x 和 value_x
-            attributes = {
-                f"attribute_{i}": data.get(f"attribute_{i}") for i in range(1, 4) # 通常是 1, 2, 3
-            }
-            values = {
-                f"value_{i}": data.get(f"value_{i}") for i in range(1, 4)
-            }
-
-            # 創建一個字典來存儲原始 value_x，用於 stat_bonus 欄位
-            raw_stat_bonus_dict = {}
-            for i in range(1, 4):
-                val_key = f"value_{i}"
-                if values.get(val_key) is not None:
-                    raw_stat_bonus_dict[val_key] = values[val_key]
-            stat_bonus_json = json.dumps(raw_stat_bonus_dict) if raw_stat_bonus_dict else None
-
-
-            # --- 根據 attribute_x 和 value_x 填充 current_stats 字典 ---
-            for i in range(1, 4):
-                attr_key = f"attribute_{i}"
-                val_key = f"value_{i}"
-                json_attr_name = attributes.get(attr_key)
-                attr_value = values.get(val_key)
-
-                print(f"  DEBUG LOOP: ID {equip_id_int}, attr_idx: {i}, json_attr: '{json_attr_name}', val: '{attr_value}'")
-
-                if json_attr_name and attr_value is not None:
-                    stat_key_in_dict = attribute_to_stat_map.get(json_attr_name.lower()) # 得到 "s_fp", "s_reload" 等
-                    print(f"    Mapped_stat_key: '{stat_key_in_dict}'")
-                    if stat_key_in_dict and stat_key_in_dict in current_stats: # 確保鍵存在於我們的字典中
-                        try:
-                            if isinstance(attr_value, str):
-                                if '.' in attr_value: attr_value_numeric = float(attr_value)
-                                else: attr_value_numeric = int(attr_value)
-                            else:
-                                attr_value_numeric = float(attr_value)
-
-                            current_stats[stat_key_in_dict] = attr_value_numeric # 直接給字典賦值
-                            print(f"    賦值成功(循環內): {stat_key_in_dict} = {current_stats[stat_key_in_dict]}")
-                        except ValueError:
-                            print(f"    警告: ID {equip_id_int}, 屬性 {json_attr_name} 值 '{attr_value}' 轉換失敗。", file=sys.stderr)
-                    elif not stat_key_in_dict:
-                        print(f"    信息: ID {equip_id_int}, 未處理屬性 '{json_attr_name}'。檢查 attribute_to_stat_map。", file=sys.stderr)
-                    elif stat_key_in_dict not in current_stats:
-                         print(f"   嚴重警告: ID {equip_id_int}, 鍵 '{stat_key_in_dict}' 不在 current_stats 字典中！請檢查初始化。", file=sys.stderr)
-
-                elif json_attr_name and attr_value is None and data.get(val_key) == 0:
-                    stat_key_in_dict = attribute_to_stat_map.get(json_attr_name.lower())
-                    if stat_key_in_dict and stat_key_in_dict in current_stats:
-                        current_stats[stat_key_in_dict] = 0.0
-                        print(f"    賦值成功(循環內, value is 0): {stat_key_in_dict} = {current_stats[stat_key_in_dict]}")
-            # --- attribute_x 循環結束 ---
-
-            # --- 後備邏輯 (如果有的話，也應該更新 current_stats 字典) ---
-            if attributes.get("attribute_1") is None and values.get("value_1") is not None and current_stats["s_hp"] is None:
-                try:
-                    current_stats["s_hp"] = float(values["value_1"])
-                    print(f"  DEBUG FALLBACK: ID {equip_id_int}, 後備邏輯將 value_1 ({values['value_1']}) 賦值給 s_hp。")
-                except (ValueError, TypeError):
-                    pass
-            # --- 後備邏輯結束 ---
+# --- 行級增量寫入 ---
+def fingerprint_row(data_tuple):
+    """計算單筆裝備數據元組的指紋 (用於判斷該行自上次寫入後是否變化)。"""
+    return hashlib.blake2b(repr(data_tuple).encode('utf-8'), digest_size=16).hexdigest()
 
-            # --- 直接從 JSON data 中讀取新欄位的值 (也更新 current_stats 字典) ---
-            oxy_max_json_val = data.get('oxy_max')
-            if oxy_max_json_val is not None:
-                try: current_stats["s_oxy_max"] = float(oxy_max_json_val)
-                except ValueError: print(f"  警告: ID {equip_id_int}, oxy_max 值 '{oxy_max_json_val}' 轉換失敗。", file=sys.stderr)
 
-            raid_distance_json_val = data.get('raid_distance')
-            if raid_distance_json_val is not None:
-                try: current_stats["s_raid_distance"] = float(raid_distance_json_val)
-                except ValueError: print(f"  警告: ID {equip_id_int}, raid_distance 值 '{raid_distance_json_val}' 轉換失敗。", file=sys.stderr)
+def write_equipment_rows_delta(cursor, rows, fingerprints, source_hash=None):
+    """
+    行級增量寫入: 與 equipment_fingerprint 中記錄的指紋比對，
+    只 Upsert 新增/變化的 ID，刪除已從源文件中消失的 ID，並把變化記入 equipment_changelog。
+    Args:
+        cursor: SQLite 資料庫游標。
+        rows (list): build_equipment_rows 產生的數據元組列表。
+        fingerprints (list): 與 rows 一一對應的指紋 (fingerprint_row 的結果)。
+        source_hash (str): 源 JSON 的內容哈希，用於在 changelog 中標識這一版數據。
+    Returns:
+        dict: {'added': n, 'changed': n, 'removed': n, 'unchanged': n}。
+    """
+    start_time_db = time.time()
+    cursor.execute("SELECT id, row_hash FROM equipment_fingerprint")
+    previous = dict(cursor.fetchall())
+    is_baseline = not previous
+
+    added, changed = [], []
+    seen_ids = set()
+    for data_tuple, row_hash in zip(rows, fingerprints):
+        equip_id = data_tuple[0]
+        seen_ids.add(equip_id)
+        old_hash = previous.get(equip_id)
+        if old_hash is None:
+            added.append((data_tuple, row_hash))
+        elif old_hash != row_hash:
+            changed.append((data_tuple, row_hash))
+    removed_ids = [equip_id for equip_id in previous if equip_id not in seen_ids]
+    unchanged_count = len(rows) - len(added) - len(changed)
+    logger.info("  行級比對完成: 新增 %d 筆，變化 %d 筆，消失 %d 筆，未變化 %d 筆。",
+                len(added), len(changed), len(removed_ids), unchanged_count)
+
+    # --- 記錄變化的欄位 (必須在 Upsert 之前讀取舊值) ---
+    changelog_rows = []
+    changed_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    if not is_baseline:
+        column_list = ', '.join(EQUIPMENT_STATS_COLUMNS)
+        for data_tuple, _ in changed:
+            cursor.execute(f"SELECT {column_list} FROM equipment WHERE id = ?", (data_tuple[0],))
+            old_row = cursor.fetchone()
+            if old_row is None:
+                changed_columns = list(EQUIPMENT_STATS_COLUMNS[1:])
+            else:
+                changed_columns = [
+                    column for column, old, new in zip(EQUIPMENT_STATS_COLUMNS, old_row, data_tuple)
+                    if old != new
+                ]
+                if not changed_columns:
+                    # 只是表示形式變化 (例如整數改為浮點數)，數據庫中的值相同，不記入 changelog
+                    continue
+            changelog_rows.append((changed_at, source_hash, data_tuple[0], 'changed',
+                                   json.dumps(changed_columns)))
+        changelog_rows.extend((changed_at, source_hash, data_tuple[0], 'added', None)
+                              for data_tuple, _ in added)
+        changelog_rows.extend((changed_at, source_hash, equip_id, 'removed', None)
+                              for equip_id in removed_ids)
+    else:
+        logger.info("  (首次記錄行指紋，作為基線，不寫入 changelog)")
+
+    # --- 寫入 (按塊 executemany) ---
+    upserts = added + changed
+    bulk_write(cursor, SQL_UPSERT_EQUIPMENT, (data_tuple for data_tuple, _ in upserts),
+               label='process_equip_stats: equipment upsert')
+    bulk_write(cursor, "INSERT OR REPLACE INTO equipment_fingerprint (id, row_hash) VALUES (?, ?)",
+               ((data_tuple[0], row_hash) for data_tuple, row_hash in upserts),
+               label='process_equip_stats: equipment_fingerprint')
+    if removed_ids:
+        bulk_write(cursor, "DELETE FROM equipment WHERE id = ?", ((i,) for i in removed_ids),
+                   label='process_equip_stats: equipment delete')
+        bulk_write(cursor, "DELETE FROM equipment_fingerprint WHERE id = ?", ((i,) for i in removed_ids),
+                   label='process_equip_stats: equipment_fingerprint')
+    if changelog_rows:
+        bulk_write(cursor,
+                   "INSERT INTO equipment_changelog (changed_at, source_hash, equip_id, change_type, changed_columns) "
+                   "VALUES (?, ?, ?, ?, ?)",
+                   changelog_rows, label='process_equip_stats: equipment_changelog')
 
+    db_time = time.time() - start_time_db
+    logger.info("  完成資料庫操作。寫入 %d 筆，刪除 %d 筆。耗時: %.2f 秒。", len(added) + len(changed), len(removed_ids), db_time)
+    return {'added': len(added), 'changed': len(changed), 'removed': len(removed_ids),
+            'unchanged': unchanged_count}
 
-            # --- 正確的 DEBUG FINAL STATS 打印位置 ---
-            print(f"  DEBUG FINAL STATS for ID {equip_id_int} (準備寫入DB):")
-            # 從 current_stats 字典中獲取值來打印
-            print(f"    s_hp: {current_stats['s_hp']}, s_fp: {current_stats['s_fp']}, s_trp: {current_stats['s_trp']}, s_avi: {current_stats['s_avi']}, s_reload: {current_stats['s_reload']}, s_aa: {current_stats['s_aa']}")
-            print(f"    s_hit: {current_stats['s_hit']}, s_eva: {current_stats['s_eva']}, s_spd: {current_stats['s_spd']}, s_luck: {current_stats['s_luck']}, s_asw: {current_stats['s_asw']}")
-            print(f"    s_oxy_max: {current_stats['s_oxy_max']}, s_raid_distance: {current_stats['s_raid_distance']}")
 
+def process_equipment_stats(cursor, raw_equip_data, source_name=TARGET_JSON_FILENAME):
+    """
+    處理 equip_data_statistics.json，提取屬性並使用 Upsert (插入或更新) 到 equipment 表。
+    Args:
+        cursor: SQLite 資料庫游標。
+        raw_equip_data (dict): 已解析的 equip_data_statistics.json 內容。
+        source_name (str): 來源文件名 (僅用於日誌)。
+    """
+    rows = build_equipment_rows(raw_equip_data, source_name)
+    write_equipment_rows(cursor, rows)
 
-            # --- 準備 data_tuple (從 current_stats 字典中按順序取值) ---
-            data_tuple = (
-                equip_id_int, name_val, type_val_db, rarity_val, faction_val, main_weapon_id_val,
-                sub_type_val, base_dmg_val, volley_ct_val, stat_bonus_json,
-                current_stats['s_hp'], current_stats['s_fp'], current_stats['s_trp'], current_stats['s_avi'], current_stats['s_reload'], current_stats['s_aa'],
-                current_stats['s_hit'], current_stats['s_eva'], current_stats['s_spd'], current_stats['s_luck'], current_stats['s_asw'],
-                current_stats['s_oxy_max'], current_stats['s_raid_distance'] # 確保鍵名與 current_stats 初始化時一致
-            )
+# --- 流水線入口 ---
+def parse(json_cache):
+    """解析階段 (可在進程池中執行)：讀取 JSON，組裝數據元組並計算每行指紋。"""
+    rows = build_equipment_rows(json_cache.load(TARGET_JSON_FILENAME))
+    row_fingerprints = [fingerprint_row(data_tuple) for data_tuple in rows]
+    source_hash = InputFingerprints(json_cache.json_dir).content_hash(TARGET_JSON_FILENAME)
+    return rows, row_fingerprints, source_hash
 
-            cursor.execute(sql_upsert_query, data_tuple)
-            processed_count += 1
 
-        except KeyError as e:
-            print(f"  警告: ID {equip_id_str} 缺少鍵: {e}", file=sys.stderr)
-            skipped_errors_count += 1
-        except ValueError as e:
-            print(f"  警告: ID {equip_id_str} 資料轉換錯誤: {e}", file=sys.stderr)
-            skipped_errors_count += 1
-        except Exception as e:
-            print(f"  錯誤: ID {equip_id_str} 意外錯誤: {e}", file=sys.stderr)
-            # 為了更詳細的錯誤追蹤，可以打印 traceback
-            # import traceback
-            # traceback.print_exc()
-            skipped_errors_count += 1
+def write(ctx, payload):
+    """寫入階段 (由唯一的寫入者在共用連接上執行)：只寫入變化的行。"""
+    rows, row_fingerprints, source_hash = payload
+    write_equipment_rows_delta(ctx.cursor(), rows, row_fingerprints, source_hash)
 
-    db_time = time.time() - start_time_db
-    print(f"  完成資料庫操作。成功處理 {processed_count} 筆，跳過 {skipped_errors_count} 筆。耗時: {db_time:.2f} 秒。")
 
-# --- 主執行入口 (保持不變) ---
+# --- 主執行入口 (單獨調試此步驟時使用) ---
 if __name__ == '__main__':
-    print(f"\n--- [子腳本執行開始]: {Path(__file__).name} ---")
-    if len(sys.argv) != 3:
-        print("錯誤: 需要兩個命令行參數：JSON數據目錄路徑 和 數據庫文件路徑。", file=sys.stderr)
-        sys.exit(1)
-
-    json_data_dir = Path(sys.argv[1]).resolve()
-    db_file = Path(sys.argv[2]).resolve()
-    print(f"  接收到 JSON 目錄: {json_data_dir}")
-    print(f"  接收到 DB 文件: {db_file}")
-
-    target_json_file = json_data_dir / TARGET_JSON_FILENAME
-    print(f"  目標處理文件: {target_json_file}")
-
-    if not target_json_file.is_file():
-        print(f"錯誤: 目標 JSON 檔案 '{TARGET_JSON_FILENAME}' 未找到: {target_json_file}", file=sys.stderr)
-        sys.exit(1)
-
-    conn = None
-    try:
-        print(f"  連接到數據庫: {db_file} ...")
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-        print("  數據庫連接成功。")
-
-        process_equipment_stats(cursor, target_json_file) # 調用核心處理函數
-
-        print("  提交資料庫更改...")
-        conn.commit() # 提交事務
-        print("  資料庫更改已提交。")
-
-    except sqlite3.Error as e:
-        print(f"!!! 數據庫操作過程中發生錯誤: {e} !!!", file=sys.stderr)
-        if conn: conn.rollback()
-        sys.exit(1)
-    except Exception as e:
-        print(f"!!! 處理過程中發生意外錯誤: {e} !!!", file=sys.stderr)
-        if conn: conn.rollback()
-        sys.exit(1)
-    finally:
-        if conn:
-            conn.close()
-            print("  數據庫連接已關閉。")
-    print(f"--- [子腳本執行結束]: {Path(__file__).name} ---")
\ No newline at end of file
+    from azurlane_analyzer.preprocessing.pipeline import run_standalone
+    sys.exit(run_standalone(Path(__file__).stem))
@@ -0,0 +1,278 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/steps/process_equip_templates.py
+
+import json
+import sqlite3
+import sys
+from collections import Counter
+from pathlib import Path
+import time
+
+from azurlane_analyzer.preprocessing.bulk_writer import bulk_write
+from azurlane_analyzer.preprocessing.field_map import insert_sql
+from azurlane_analyzer.preprocessing.inheritance import resolve_inheritance
+from azurlane_analyzer.preprocessing.log import StepCounters, get_logger
+
+logger = get_logger(__name__)
+
+# --- 配置 ---
+TARGET_JSON_FILENAME = 'equip_data_template.json' # 處理的目標JSON檔案
+
+# --- 輸入聲明 (供增量重建判斷輸入是否變化；修改處理邏輯或輸出結構時遞增 STEP_VERSION) ---
+INPUTS = (TARGET_JSON_FILENAME,)
+STEP_VERSION = 2
+
+# equipment_level 中預先計算的每級屬性: (equipment_level 欄位, 來源 equipment 欄位)
+LEVEL_STAT_COLUMNS = (
+    ('weapon_id', 'weapon_id'),
+    ('base_damage', 'base_damage_initial'),
+    ('volley_count', 'volley_count'),
+    ('storehouse_cd', 'storehouse_cd_initial'),
+    ('stat_hp', 'stat_hp'),
+    ('stat_firepower', 'stat_firepower'),
+    ('stat_torpedo', 'stat_torpedo'),
+    ('stat_aviation', 'stat_aviation'),
+    ('stat_reload', 'stat_reload'),
+    ('stat_antiair', 'stat_antiair'),
+    ('stat_hit', 'stat_hit'),
+    ('stat_evasion', 'stat_evasion'),
+    ('stat_speed', 'stat_speed'),
+    ('stat_luck', 'stat_luck'),
+    ('stat_antisub', 'stat_antisub'),
+    ('stat_oxy_max', 'stat_oxy_max'),
+    ('stat_raid_distance', 'stat_raid_distance'),
+)
+
+# build_level_rows 產生的元組中各元素對應的 equipment_level 欄位 (不含屬性欄位，屬性在寫入時從 equipment 關聯取得)
+LEVEL_TEMPLATE_COLUMNS = (
+    'chain_id', 'group_id', 'level', 'enhance_level', 'equip_id', 'prev_id', 'next_id',
+    'is_max', 'max_level', 'template_type',
+    'upgrade_gold', 'upgrade_items', 'cumulative_gold', 'cumulative_items',
+    'forbidden_ship_types',
+)
+
+# --- 依賴聲明 (供調度器推導步驟間的依賴關係) ---
+READS = ('equipment.id',) + tuple(f'equipment.{source}' for _, source in LEVEL_STAT_COLUMNS)
+WRITES = (
+    'equipment_level', 'equipment_forbidden_ship_type',
+    'equipment.enhancement_data', 'equipment.storehouse_cd_max',
+    'equipment.base_damage_max', 'equipment.forbidden_ship_types',
+)
+
+SQL_CREATE_STAGE = f"""
+    CREATE TEMP TABLE IF NOT EXISTS equip_template_stage (
+        {', '.join(LEVEL_TEMPLATE_COLUMNS)}
+    )
+"""
+
+SQL_INSERT_STAGE = insert_sql('equip_template_stage', LEVEL_TEMPLATE_COLUMNS)
+
+# 一條 INSERT … SELECT: 模板數據 + 從 equipment 關聯取得的該級屬性
+SQL_FILL_EQUIPMENT_LEVEL = f"""
+    INSERT INTO equipment_level (
+        {', '.join(LEVEL_TEMPLATE_COLUMNS)},
+        {', '.join(column for column, _ in LEVEL_STAT_COLUMNS)}
+    )
+    SELECT
+        {', '.join(f's.{column}' for column in LEVEL_TEMPLATE_COLUMNS)},
+        {', '.join(f'e.{source}' for _, source in LEVEL_STAT_COLUMNS)}
+    FROM equip_template_stage AS s
+    LEFT JOIN equipment AS e ON e.id = s.equip_id
+"""
+
+# 同組每一級的裝備都寫入禁用艦種、強化摘要以及滿強 (最高級) 的數值
+_EQUIPMENT_UPDATE_COLUMNS = ('forbidden_ship_types', 'enhancement_data', 'base_damage_max', 'storehouse_cd_max')
+_EQUIPMENT_UPDATE_VALUES = """
+        lvl.forbidden_ship_types,
+        json_object(
+            'chain_id', lvl.chain_id,
+            'group_id', lvl.group_id,
+            'level', lvl.level,
+            'enhance_level', lvl.enhance_level,
+            'max_level', lvl.max_level,
+            'max_equip_id', top.equip_id,
+            'prev_id', lvl.prev_id,
+            'next_id', lvl.next_id,
+            'cumulative_gold', lvl.cumulative_gold
+        ),
+        top.base_damage,
+        top.storehouse_cd
+"""
+_LEVEL_WITH_TOP = """
+    equipment_level AS lvl
+    JOIN equipment_level AS top ON top.chain_id = lvl.chain_id AND top.is_max = 1
+"""
+
+# 一條集合式 UPDATE … FROM (SQLite >= 3.33)
+SQL_UPDATE_EQUIPMENT = f"""
+    UPDATE equipment
+    SET ({', '.join(_EQUIPMENT_UPDATE_COLUMNS)}) = ({_EQUIPMENT_UPDATE_VALUES})
+    FROM {_LEVEL_WITH_TOP}
+    WHERE lvl.equip_id = equipment.id
+"""
+
+# 舊版 SQLite (< 3.33) 不支持 UPDATE … FROM，改用行值 (row value) 子查詢，同樣只是一條語句
+SQL_UPDATE_EQUIPMENT_LEGACY = f"""
+    UPDATE equipment
+    SET ({', '.join(_EQUIPMENT_UPDATE_COLUMNS)}) = (
+        SELECT {_EQUIPMENT_UPDATE_VALUES}
+        FROM {_LEVEL_WITH_TOP}
+        WHERE lvl.equip_id = equipment.id
+    )
+    WHERE id IN (SELECT equip_id FROM equipment_level)
+"""
+
+# 關聯表: 強化鏈每一級的禁用艦種展開為一行一個艦種
+SQL_FILL_FORBIDDEN_SHIP_TYPE = """
+    INSERT OR IGNORE INTO equipment_forbidden_ship_type (equip_id, ship_type)
+    SELECT lvl.equip_id, j.value
+    FROM equipment_level AS lvl, json_each(lvl.forbidden_ship_types) AS j
+"""
+
+
+# --- 核心處理函數 ---
+def _add_items(total, items):
+    """把 [[item_id, count], ...] 累加到 Counter 中。"""
+    for entry in items or ():
+        if isinstance(entry, (list, tuple)) and len(entry) >= 2:
+            total[entry[0]] += entry[1]
+
+
+def _items_json(total):
+    """Counter -> 與源數據相同的 [[item_id, count], ...] JSON (按 item_id 排序)。"""
+    return json.dumps([[item_id, count] for item_id, count in sorted(total.items()) if count])
+
+
+def build_level_rows(raw_templates, source_name=TARGET_JSON_FILENAME):
+    """
+    沿 next/prev 鏈把每條強化鏈 (從 prev 為 0 的第一級開始) 的所有等級展開為 equipment_level 的數據元組。
+    注意同一 group 可能有多條鏈 (例如 46260 與 46440)，因此以鏈首 ID (chain_id) 區分。
+    此函數不接觸數據庫，可以在進程池中執行。
+    Args:
+        raw_templates (dict): 已解析的 equip_data_template.json 內容 {id_str: 模板}。
+        source_name (str): 來源文件名 (僅用於日誌)。
+    Returns:
+        list: 與 LEVEL_TEMPLATE_COLUMNS 順序一致的數據元組列表。
+    """
+    logger.info("  -> 開始處理裝備模板檔案: %s", source_name)
+    start_time = time.time()
+    if not isinstance(raw_templates, dict):
+        logger.error("  錯誤: %s 的頂層結構無法識別。期望是直接的 ID->資料的字典。", source_name)
+        raise ValueError(f"無法處理 {source_name} 的結構")
+
+    # 模板也使用 'base' 繼承 (group、type、ship_type_forbidden 等只寫在每組的第一級)
+    templates = resolve_inheritance(raw_templates, source_name=source_name)
+    counters = StepCounters('process_equip_templates')
+
+    rows = []
+    visited = set()
+    heads = [key for key, template in templates.items() if not template.get('prev')]
+    for head_key in heads:
+        head = templates[head_key]
+        group_id = head.get('group', head.get('id'))
+
+        # 1. 沿 next 走完整條鏈 (檢測缺失與循環)
+        chain = []
+        key = head_key
+        while key is not None:
+            if key in visited:
+                counters.add('chain_cycle')
+                logger.warning("  警告: group %s 的 next 鏈在 ID %s 處形成循環或與其他鏈重疊，已截斷。", group_id, key)
+                break
+            template = templates.get(key)
+            if template is None:
+                counters.add('chain_missing_next')
+                logger.warning("  警告: group %s 的 next 指向不存在的 ID %s，已截斷。", group_id, key)
+                break
+            visited.add(key)
+            chain.append(template)
+            if template.get('group', group_id) != group_id:
+                counters.add('group_mismatch')
+            next_id = template.get('next')
+            key = str(next_id) if next_id else None
+
+        if not chain:
+            continue
+
+        # 2. 按等級展開，累計升到每一級所需的成本
+        max_level = chain[-1].get('level', len(chain))
+        cumulative_gold = 0
+        cumulative_items = Counter()
+        for index, template in enumerate(chain):
+            level = template.get('level', index + 1)
+            rows.append((
+                chain[0].get('id'),
+                group_id,
+                level,
+                level - 1,                                   # +N
+                template.get('id'),
+                template.get('prev') or None,
+                template.get('next') or None,
+                1 if index == len(chain) - 1 else 0,
+                max_level,
+                template.get('type'),
+                template.get('trans_use_gold', 0),           # 由此級升到下一級的成本
+                json.dumps(template.get('trans_use_item', [])),
+                cumulative_gold,                             # 由第一級升到此級的累計成本
+                _items_json(cumulative_items),
+                json.dumps(template.get('ship_type_forbidden', [])),
+            ))
+            cumulative_gold += template.get('trans_use_gold', 0) or 0
+            _add_items(cumulative_items, template.get('trans_use_item'))
+        counters.add('chains')
+
+    orphans = len(templates) - len(visited)
+    if orphans:
+        counters.add('unreachable_templates', orphans)
+        logger.warning("  警告: %d 個模板不在任何強化鏈上，已忽略。", orphans)
+    counters.report(logger)
+    logger.info("  完成解析。%d 條強化鏈展開為 %d 個強化等級。耗時: %.2f 秒。",
+                len(heads), len(rows), time.time() - start_time)
+    return rows
+
+
+def write_level_rows(cursor, rows):
+    """
+    重建 equipment_level 表 (模板數據 + 從 equipment 關聯的每級屬性)，
+    再以集合式 UPDATE 把禁用艦種、強化摘要與滿強數值寫回 equipment 表，並重建禁用艦種關聯表。
+    """
+    start_time = time.time()
+    cursor.execute(SQL_CREATE_STAGE)
+    cursor.execute("DELETE FROM equip_template_stage")
+    bulk_write(cursor, SQL_INSERT_STAGE, rows, label='process_equip_templates: equip_template_stage')
+
+    cursor.execute("DELETE FROM equipment_level")
+    cursor.execute(SQL_FILL_EQUIPMENT_LEVEL)
+    level_count = cursor.rowcount
+    cursor.execute("DROP TABLE equip_template_stage")
+
+    if sqlite3.sqlite_version_info >= (3, 33, 0):
+        cursor.execute(SQL_UPDATE_EQUIPMENT)
+    else:
+        cursor.execute(SQL_UPDATE_EQUIPMENT_LEGACY)
+    updated_count = cursor.rowcount
+    cursor.execute("DELETE FROM equipment_forbidden_ship_type")
+    cursor.execute(SQL_FILL_FORBIDDEN_SHIP_TYPE)
+    forbidden_count = cursor.rowcount
+    cursor.execute("SELECT count(*) FROM equipment_level WHERE equip_id NOT IN (SELECT id FROM equipment)")
+    missing_count = cursor.fetchone()[0]
+    if missing_count:
+        logger.warning("  警告: %d 個強化等級在 equipment 表中沒有對應的裝備 (屬性為空)。", missing_count)
+    logger.info("  完成資料庫操作。寫入 %d 個強化等級，更新 %d 筆裝備，%d 條禁用艦種關聯。耗時: %.2f 秒。",
+                level_count, updated_count, forbidden_count, time.time() - start_time)
+
+
+# --- 流水線入口 ---
+def parse(json_cache):
+    """解析階段 (可在進程池中執行)：讀取模板 JSON，沿 next 鏈展開每個強化等級。"""
+    return build_level_rows(json_cache.load(TARGET_JSON_FILENAME))
+
+
+def write(ctx, rows):
+    """寫入階段 (由唯一的寫入者執行)：重建 equipment_level 並更新 equipment 表。"""
+    write_level_rows(ctx.cursor(), rows)
+
+
+# --- 主執行入口 (單獨調試此步驟時使用) ---
+if __name__ == '__main__':
+    from azurlane_analyzer.preprocessing.pipeline import run_standalone
+    sys.exit(run_standalone(Path(__file__).stem))
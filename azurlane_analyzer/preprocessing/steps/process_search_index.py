@@ -0,0 +1,146 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/steps/process_search_index.py
+#
+# 名稱與描述的全文檢索表 (FTS5)。
+# search_index 是一張 trigram 分詞的 FTS5 虛擬表: 中文名稱沒有空格分詞，trigram 把文本切成
+# 每 3 個字符一個詞元，任意 3 字以上的子串都能走索引查找，不需要 LIKE '%…%' 全表掃描。
+# 文本保存在普通表 search_text 中 (search_index 以它為外部內容，不重複存儲)，每個可搜索的對象一行:
+#   - equipment: equip_data_statistics.json 的 name / descrip (已處理 'base' 繼承)；
+#   - weapon: weapon 表的 name (由 process_weapon_name 寫入)；
+#   - skill: skills 表的 name / description (由 process_skills 寫入)。
+# 索引文本先做 NFKC 規範化並合併連續空白 (全角字母數字與半角一致，'2 x  炸彈' 與 '2 x 炸彈' 一致)，
+# 顯示用的原始名稱保存在 display_name。查詢接口見 azurlane_analyzer/search.py。
+
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing.bulk_writer import bulk_write
+from azurlane_analyzer.preprocessing.field_map import insert_sql
+from azurlane_analyzer.preprocessing.inheritance import resolve_inheritance
+from azurlane_analyzer.preprocessing.log import get_logger
+
+logger = get_logger(__name__)
+
+# --- 配置 ---
+EQUIP_JSON_FILENAME = 'equip_data_statistics.json'
+
+# --- 輸入聲明 (供增量重建判斷輸入是否變化；修改處理邏輯或輸出結構時遞增 STEP_VERSION) ---
+INPUTS = (EQUIP_JSON_FILENAME,)
+STEP_VERSION = 2
+
+# --- 依賴聲明 (供調度器推導步驟間的依賴關係) ---
+READS = ('weapon.id', 'weapon.name', 'skills.id', 'skills.name', 'skills.description')
+WRITES = ('search_text', 'search_index')
+
+# 可搜索對象的類型 (search_text.kind)
+KIND_EQUIPMENT = 'equipment'
+KIND_WEAPON = 'weapon'
+KIND_SKILL = 'skill'
+
+SEARCH_TEXT_COLUMNS = ('kind', 'item_id', 'name', 'description', 'display_name')
+SQL_INSERT_SEARCH_TEXT = insert_sql('search_text', SEARCH_TEXT_COLUMNS)
+
+# 從數據庫收錄的對象: 類型 -> 返回 (id, name, description) 的查詢
+DB_SOURCES = (
+    (KIND_WEAPON, "SELECT id, name, NULL FROM weapon WHERE name IS NOT NULL AND name != ''"),
+    (KIND_SKILL, "SELECT id, name, description FROM skills WHERE name IS NOT NULL AND name != ''"),
+)
+
+
+def normalize_text(text):
+    """索引與查詢共用的文本規範化: NFKC、合併連續空白、去掉首尾空白。None 或空串返回 None。"""
+    if not text:
+        return None
+    text = ' '.join(unicodedata.normalize('NFKC', str(text)).split())
+    return text or None
+
+
+def _search_row(kind, item_id, name, description):
+    return (kind, item_id, normalize_text(name), normalize_text(description), name)
+
+
+# --- 核心處理函數 ---
+def build_search_rows(equipment, source_name=EQUIP_JSON_FILENAME):
+    """
+    把裝備的名稱、描述整理為 search_text 的數據元組 (沒有名稱的裝備不收錄)。
+    此函數不接觸數據庫，可以在進程池中執行。
+    Args:
+        equipment (dict): equip_data_statistics.json 的內容 (可為 None)。
+        source_name (str): 來源文件名 (僅用於日誌)。
+    Returns:
+        list: 與 SEARCH_TEXT_COLUMNS 順序一致的數據元組列表。
+    """
+    rows = []
+    skipped = 0
+    for key, record in resolve_inheritance(equipment or {}, source_name=source_name).items():
+        name = record.get('name')
+        if not name:
+            skipped += 1
+            continue
+        try:
+            item_id = int(record.get('id', key))
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        rows.append(_search_row(KIND_EQUIPMENT, item_id, name, record.get('descrip')))
+    if skipped:
+        logger.info("  %s: %d 條記錄沒有名稱或 ID 無效，不收錄到檢索表。", source_name, skipped)
+    return rows
+
+
+def load_search_index(cursor, rows, rebuild_index=True):
+    """
+    全量重建檢索表: 寫入 JSON 中的裝備，再從 weapon / skills 表收錄武器與技能，最後一次性重建 FTS 索引。
+    Args:
+        rebuild_index (bool): 是否重建 search_index (沒有 FTS5 時為 False，只寫入 search_text)。
+    """
+    start_time = time.time()
+    cursor.execute("DELETE FROM search_text")
+    writer = bulk_write(cursor, SQL_INSERT_SEARCH_TEXT, rows, label='process_search_index: search_text insert')
+    counts = {KIND_EQUIPMENT: writer.rows_written}
+    for kind, sql in DB_SOURCES:
+        db_rows = [_search_row(kind, item_id, name, description)
+                   for item_id, name, description in cursor.execute(sql).fetchall()]
+        counts[kind] = bulk_write(cursor, SQL_INSERT_SEARCH_TEXT, db_rows,
+                                  label=f'process_search_index: search_text {kind} insert').rows_written
+    # 外部內容表: 從 search_text 一次性重建索引 (只產生一個 b-tree 段，查詢時只需查一個段)
+    if rebuild_index:
+        cursor.execute("INSERT INTO search_index (search_index) VALUES ('rebuild')")
+    logger.info("  已建立檢索表: %d 個裝備，%d 個武器，%d 個技能。耗時: %.2f 秒。", counts[KIND_EQUIPMENT],
+                counts[KIND_WEAPON], counts[KIND_SKILL], time.time() - start_time)
+
+
+def search_index_available(cursor):
+    """search_index 表是否存在 (SQLite 未編譯 FTS5 或不支持 trigram 時 create_all_tables 不會創建它)。"""
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'").fetchone() is not None
+
+
+# --- 流水線入口 ---
+def parse(json_cache):
+    """解析階段 (可在進程池中執行)。輸入文件不存在時記錄警告，檢索表中只有武器與技能。"""
+    start_time = time.time()
+    if json_cache.exists(EQUIP_JSON_FILENAME):
+        rows = build_search_rows(json_cache.load(EQUIP_JSON_FILENAME))
+    else:
+        logger.warning("  警告: 找不到 %s，檢索表中不包含裝備名稱。", EQUIP_JSON_FILENAME)
+        rows = []
+    logger.info("  完成檢索文本整理 (%d 條)。耗時: %.2f 秒。", len(rows), time.time() - start_time)
+    return rows
+
+
+def write(ctx, rows):
+    """寫入階段 (由唯一的寫入者執行)。"""
+    cursor = ctx.cursor()
+    rebuild_index = search_index_available(cursor)
+    if not rebuild_index:
+        logger.warning("  警告: 數據庫中沒有 search_index 表 (SQLite 不支持 FTS5 trigram)，"
+                       "只寫入 search_text，檢索將退化為掃描。")
+    load_search_index(cursor, rows, rebuild_index)
+
+
+# --- 主執行入口 (單獨調試此步驟時使用) ---
+if __name__ == '__main__':
+    from azurlane_analyzer.preprocessing.pipeline import run_standalone
+    sys.exit(run_standalone(Path(__file__).stem))
@@ -0,0 +1,246 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/steps/process_ships.py
+
+import json
+import math
+import sys
+from pathlib import Path
+import time
+
+from azurlane_analyzer.preprocessing.bulk_writer import bulk_write
+from azurlane_analyzer.preprocessing.field_map import CONFLICT_REPLACE, insert_sql
+from azurlane_analyzer.preprocessing.inheritance import resolve_inheritance
+from azurlane_analyzer.preprocessing.log import StepCounters, get_logger
+
+logger = get_logger(__name__)
+
+# --- 配置 ---
+STATISTICS_JSON_FILENAME = 'ship_data_statistics.json'  # 每個 (艦船, 突破) 的基礎屬性與成長
+TEMPLATE_JSON_FILENAME = 'ship_data_template.json'       # 艦船分組 (group_type)、強化 ID、裝備欄
+STRENGTHEN_JSON_FILENAME = 'ship_data_strengthen.json'   # 強化 (餵養) 的屬性上限 (可選)
+
+# --- 輸入聲明 (供增量重建判斷輸入是否變化；修改處理邏輯或輸出結構時遞增 STEP_VERSION) ---
+INPUTS = (STATISTICS_JSON_FILENAME, TEMPLATE_JSON_FILENAME, STRENGTHEN_JSON_FILENAME)
+STEP_VERSION = 1
+
+# --- 依賴聲明 (供調度器推導步驟間的依賴關係) ---
+READS = ()
+WRITES = ('ships', 'ship_stat_level')
+
+# --- 屬性與成長公式 ---
+# ship_data_statistics 中 attrs / attrs_growth / attrs_growth_extra 的順序 (第 7 項 armor 未使用)
+ATTRIBUTE_ORDER = (
+    'durability', 'cannon', 'torpedo', 'antiaircraft', 'air', 'reload',
+    'armor', 'hit', 'dodge', 'speed', 'luck', 'antisub',
+)
+# ship_stat_level 的屬性欄位 <- attrs 中的屬性名
+STAT_COLUMN_SOURCES = (
+    ('stat_hp', 'durability'),
+    ('stat_firepower', 'cannon'),
+    ('stat_torpedo', 'torpedo'),
+    ('stat_aviation', 'air'),
+    ('stat_reload', 'reload'),
+    ('stat_antiair', 'antiaircraft'),
+    ('stat_hit', 'hit'),
+    ('stat_evasion', 'dodge'),
+    ('stat_speed', 'speed'),
+    ('stat_luck', 'luck'),
+    ('stat_antisub', 'antisub'),
+)
+STAT_COLUMNS = tuple(column for column, _ in STAT_COLUMN_SOURCES)
+_STAT_ATTRIBUTE_INDEX = tuple(ATTRIBUTE_ORDER.index(source) for _, source in STAT_COLUMN_SOURCES)
+
+# ship_data_strengthen 的 durability 列表 (滿強化時的屬性加成) 依次對應的屬性
+STRENGTHEN_ATTRIBUTES = ('cannon', 'torpedo', 'air', 'reload')
+
+# 預先計算的等級 (比較與時間軸查詢最常用的幾個等級)
+STAT_LEVELS = (1, 100, 120, 125)
+# 100 級以後改用 attrs_growth_extra 成長
+GROWTH_EXTRA_FROM_LEVEL = 100
+# 好感度檔位的屬性加成 (百分比): 陌生 0、友好 1、喜歡 3、愛 6、誓約 9、誓約 200 好感 12。
+# ship_stat_level.affection 直接保存這個百分比
+AFFECTION_BONUSES = (0, 1, 3, 6, 9, 12)
+# 不受好感度加成的屬性
+AFFECTION_EXEMPT = ('speed', 'luck')
+# 一個艦船 group 的突破檔位: statistics ID = group * 10 + 突破 + 1 (改造為 group * 10 + 9，不在此表中)
+MAX_LIMIT_BREAK = 3
+
+SHIP_STAT_LEVEL_COLUMNS = ('ship_id', 'limit_break', 'level', 'affection') + STAT_COLUMNS
+SQL_INSERT_SHIP_STAT_LEVEL = insert_sql('ship_stat_level', SHIP_STAT_LEVEL_COLUMNS)
+
+SHIPS_COLUMNS = (
+    'id', 'name', 'ship_type', 'rarity', 'faction',
+    'base_reload_stat', 'base_fp', 'base_trp', 'base_avi', 'base_aa', 'base_hp',
+    'slots', 'aircraft_slots',
+)
+SQL_INSERT_SHIPS = insert_sql('ships', SHIPS_COLUMNS, CONFLICT_REPLACE)
+
+
+def level_stats(attrs, growth, growth_extra, level, strengthen=None):
+    """
+    某一等級 (未計好感度) 的屬性向量 (與 ATTRIBUTE_ORDER 對齊)。
+    屬性 = 基礎 + (等級 - 1) × 成長 / 1000 + (等級 - 100) × 額外成長 / 1000 (僅 100 級以上) + 滿強化加成。
+    """
+    extra_levels = max(0, level - GROWTH_EXTRA_FROM_LEVEL)
+    values = [
+        base + (level - 1) * g / 1000.0 + extra_levels * e / 1000.0
+        for base, g, e in zip(attrs, growth, growth_extra)
+    ]
+    if strengthen:
+        for index, bonus in strengthen:
+            values[index] += bonus
+    return values
+
+
+def affection_multipliers(bonus_percent):
+    """好感度加成的乘數向量 (與 ATTRIBUTE_ORDER 對齊)。"""
+    factor = 1 + bonus_percent / 100.0
+    return [1.0 if name in AFFECTION_EXEMPT else factor for name in ATTRIBUTE_ORDER]
+
+
+# 向下取整前加上的容差 (避免 1.06 × 50 = 52.999… 之類的浮點誤差少算 1 點)
+_FLOOR_EPSILON = 1e-6
+
+# 每個好感度檔位的乘數向量只計算一次
+_AFFECTION_VECTORS = tuple((bonus, affection_multipliers(bonus)) for bonus in AFFECTION_BONUSES)
+
+
+def _attribute_vector(values):
+    """attrs 系列列表補齊到 ATTRIBUTE_ORDER 的長度 (缺失的項為 0)。"""
+    values = list(values or ())[:len(ATTRIBUTE_ORDER)]
+    return values + [0] * (len(ATTRIBUTE_ORDER) - len(values))
+
+
+def _strengthen_bonus(strengthen_record):
+    """ship_data_strengthen 的一條記錄 -> [(屬性索引, 滿強化加成)]。"""
+    if not strengthen_record:
+        return ()
+    return tuple(
+        (ATTRIBUTE_ORDER.index(name), value)
+        for name, value in zip(STRENGTHEN_ATTRIBUTES, strengthen_record.get('durability') or ())
+        if value
+    )
+
+
+def _limit_break_of(ship_id, group_id):
+    """statistics ID -> 突破檔位 (0..3)；改造等其他 ID 返回 None。"""
+    limit_break = ship_id - group_id * 10 - 1
+    return limit_break if 0 <= limit_break <= MAX_LIMIT_BREAK else None
+
+
+# --- 核心處理函數 ---
+def build_ship_rows(statistics, templates, strengthen=None):
+    """
+    把艦船的統計、模板與強化數據展開為 ships 與 ship_stat_level 的數據元組。
+    每個艦船 group 在每個突破檔位 × STAT_LEVELS × AFFECTION_BONUSES 上各有一行最終屬性
+    (滿強化，取整方式與遊戲面板相同: 向下取整)。
+    此函數不接觸數據庫，可以在進程池中執行。
+    Args:
+        statistics (dict): ship_data_statistics.json 的內容 {id_str: 記錄}。
+        templates (dict): ship_data_template.json 的內容 {id_str: 記錄}。
+        strengthen (dict): ship_data_strengthen.json 的內容 (可為 None，此時不計強化加成)。
+    Returns:
+        tuple: (ships 數據元組列表, ship_stat_level 數據元組列表)。
+    """
+    statistics = resolve_inheritance(statistics, source_name=STATISTICS_JSON_FILENAME)
+    templates = resolve_inheritance(templates, source_name=TEMPLATE_JSON_FILENAME)
+    strengthen = strengthen or {}
+    counters = StepCounters('process_ships')
+
+    # 1. 按 group 歸類每個突破檔位的 (statistics, template)
+    groups = {}
+    for key, template in templates.items():
+        ship_id = int(template.get('id', key))
+        group_id = int(template.get('group_type') or ship_id // 10)
+        limit_break = _limit_break_of(ship_id, group_id)
+        if limit_break is None:
+            counters.add('non_limit_break_entry')  # 改造等
+            continue
+        stats = statistics.get(str(ship_id))
+        if stats is None:
+            counters.add('missing_statistics')
+            continue
+        groups.setdefault(group_id, {})[limit_break] = (stats, template)
+
+    # 2. 每個檔位: 先算每個等級的屬性向量，再乘以每個好感度檔位的乘數
+    ship_rows, stat_rows = [], []
+    for group_id in sorted(groups):
+        tiers = groups[group_id]
+        for limit_break in sorted(tiers):
+            stats, template = tiers[limit_break]
+            attrs = _attribute_vector(stats.get('attrs'))
+            growth = _attribute_vector(stats.get('attrs_growth'))
+            growth_extra = _attribute_vector(stats.get('attrs_growth_extra'))
+            bonus = _strengthen_bonus(strengthen.get(str(template.get('strengthen_id', ''))))
+            if not bonus and template.get('strengthen_id') is not None:
+                counters.add('missing_strengthen')
+            for level in STAT_LEVELS:
+                values = level_stats(attrs, growth, growth_extra, level, bonus)
+                for affection, multipliers in _AFFECTION_VECTORS:
+                    stat_rows.append((group_id, limit_break, level, affection) + tuple(
+                        math.floor(values[index] * multipliers[index] + _FLOOR_EPSILON)
+                        for index in _STAT_ATTRIBUTE_INDEX))
+            counters.add('limit_break_tiers')
+
+        # ships: 名稱、類型等取最高突破的記錄；base_* 為最低突破的 1 級基礎屬性
+        top_stats, top_template = tiers[max(tiers)]
+        low_attrs = _attribute_vector(tiers[min(tiers)][0].get('attrs'))
+        base = dict(zip(ATTRIBUTE_ORDER, low_attrs))
+        ship_rows.append((
+            group_id,
+            top_stats.get('name'),
+            None if top_stats.get('type') is None else str(top_stats['type']),
+            None if top_stats.get('rarity') is None else str(top_stats['rarity']),
+            None if top_stats.get('nationality') is None else str(top_stats['nationality']),
+            base['reload'], base['cannon'], base['torpedo'], base['air'], base['antiaircraft'], base['durability'],
+            json.dumps([top_template.get(f'equip_{slot}', []) for slot in (1, 2, 3, 4, 5)]),
+            json.dumps(top_stats.get('base_list', [])),
+        ))
+
+    counters.report(logger)
+    logger.info("  展開 %d 艘艦船，共 %d 行等級屬性。", len(ship_rows), len(stat_rows))
+    return ship_rows, stat_rows
+
+
+def load_ship_tables(cursor, ship_rows, stat_rows):
+    """全量重新載入 ships 與 ship_stat_level 表。"""
+    cursor.execute("DELETE FROM ships")
+    cursor.execute("DELETE FROM ship_stat_level")
+    ships_writer = bulk_write(cursor, SQL_INSERT_SHIPS, ship_rows, label='process_ships: ships insert')
+    stats_writer = bulk_write(cursor, SQL_INSERT_SHIP_STAT_LEVEL, stat_rows,
+                              label='process_ships: ship_stat_level insert')
+    logger.info("  已載入 %s 艘艦船、%s 行等級屬性。耗時: %.2f 秒。", ships_writer.rows_written,
+                stats_writer.rows_written, ships_writer.seconds + stats_writer.seconds)
+
+
+# --- 流水線入口 ---
+def parse(json_cache):
+    """
+    解析階段 (可在進程池中執行)。
+    艦船數據文件不存在時 (例如 sharecfgdata 中只有裝備數據) 記錄警告並返回 None，寫入階段不做任何修改。
+    """
+    missing = [name for name in (STATISTICS_JSON_FILENAME, TEMPLATE_JSON_FILENAME) if not json_cache.exists(name)]
+    if missing:
+        logger.warning("  警告: 找不到艦船數據文件 %s，跳過艦船處理 (ships 表保持不變)。", ', '.join(missing))
+        return None
+    start_time = time.time()
+    strengthen = json_cache.load(STRENGTHEN_JSON_FILENAME) if json_cache.exists(STRENGTHEN_JSON_FILENAME) else None
+    if strengthen is None:
+        logger.warning("  警告: 找不到 %s，最終屬性不含強化加成。", STRENGTHEN_JSON_FILENAME)
+    rows = build_ship_rows(json_cache.load(STATISTICS_JSON_FILENAME), json_cache.load(TEMPLATE_JSON_FILENAME),
+                           strengthen)
+    logger.info("  完成艦船數據解析。耗時: %.2f 秒。", time.time() - start_time)
+    return rows
+
+
+def write(ctx, payload):
+    """寫入階段 (由唯一的寫入者執行)。"""
+    if payload is None:
+        return
+    ship_rows, stat_rows = payload
+    load_ship_tables(ctx.cursor(), ship_rows, stat_rows)
+
+
+# --- 主執行入口 (單獨調試此步驟時使用) ---
+if __name__ == '__main__':
+    from azurlane_analyzer.preprocessing.pipeline import run_standalone
+    sys.exit(run_standalone(Path(__file__).stem))
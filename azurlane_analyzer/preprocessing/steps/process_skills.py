@@ -0,0 +1,260 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/steps/process_skills.py
+#
+# 技能與 buff 數據。
+# 艦船技能在戰鬥中以 buff 的形式生效: buff 配置的 effect_list 中每一項效果都有
+#   - trigger: 觸發事件列表 (onStartGame / onFire / onUpdate …)；
+#   - type: 效果類型 (BattleBuffCastSkill / BattleBuffAddAttr …)；
+#   - arg_list: 效果參數 (time 間隔秒數、rant 觸發機率、quota 觸發次數上限、attr/number …)。
+# 此步驟把它們展開為帶類型的行:
+#   - skill_trigger: 每個 (技能, 效果, 觸發事件) 一行，主鍵以 trigger_type 開頭，
+#     「某類事件會觸發哪些技能」是一次索引範圍查詢，不需要逐個解碼 JSON；
+#   - skill_effect: 每個 (技能, 效果) 一行，常用參數拆為獨立欄位，完整參數保存在 args；
+#   - skills: 名稱、描述，trigger_info / effects 為觸發類型與效果類型的摘要 (JSON 列表)。
+# 艦船技能的技能 ID 與其 buff ID 相同，因此兩個文件按 ID 合併。
+
+import json
+import re
+import sys
+from pathlib import Path
+import time
+
+from azurlane_analyzer.preprocessing.bulk_writer import bulk_write
+from azurlane_analyzer.preprocessing.field_map import CONFLICT_REPLACE, insert_sql
+from azurlane_analyzer.preprocessing.inheritance import resolve_inheritance
+from azurlane_analyzer.preprocessing.log import StepCounters, get_logger
+
+logger = get_logger(__name__)
+
+# --- 配置 ---
+SKILL_JSON_FILENAME = 'skill_data_template.json'  # 技能名稱、描述、最高等級
+BUFF_JSON_FILENAME = 'buff_data_template.json'     # buff 配置 (gamecfg/buff 合併為 {buff_id: 配置})
+
+# --- 輸入聲明 (供增量重建判斷輸入是否變化；修改處理邏輯或輸出結構時遞增 STEP_VERSION) ---
+INPUTS = (SKILL_JSON_FILENAME, BUFF_JSON_FILENAME)
+STEP_VERSION = 1
+
+# --- 依賴聲明 (供調度器推導步驟間的依賴關係) ---
+READS = ()
+WRITES = ('skills', 'skill_trigger', 'skill_effect')
+
+# --- 觸發事件類型 ---
+# 遊戲中的觸發名為 camelCase (onFire)，存儲為 snake_case (on_fire)；以下幾個改用更直接的名稱
+TRIGGER_BATTLE_START = 'battle_start'  # onStartGame: 戰鬥開始時觸發一次
+TRIGGER_INTERVAL = 'interval'          # 帶 time 參數的 onUpdate: 每 interval 秒觸發一次
+TRIGGER_ON_FIRE = 'on_fire'            # onFire: 武器開火
+TRIGGER_ALIASES = {
+    'onStartGame': TRIGGER_BATTLE_START,
+}
+# 沒有 time 參數的 onUpdate 是逐幀檢查 (條件類效果)，保留為 on_update
+INTERVAL_TRIGGER = 'onUpdate'
+# arg_list.rant 的分母 (10000 = 100%)
+PROBABILITY_SCALE = 10000.0
+# 效果類型名去掉的前綴 (BattleBuffAddAttr -> add_attr)
+EFFECT_TYPE_PREFIXES = ('BattleBuff', 'BattleSkill', 'Battle')
+
+SKILL_TRIGGER_COLUMNS = (
+    'trigger_type', 'skill_id', 'effect_index', 'raw_trigger', 'interval', 'probability', 'quota',
+)
+SKILL_EFFECT_COLUMNS = (
+    'skill_id', 'effect_index', 'effect_type', 'raw_type', 'target', 'attr', 'number',
+    'cast_skill_id', 'buff_id', 'args',
+)
+SKILLS_COLUMNS = ('id', 'name', 'description', 'trigger_info', 'effects')
+SQL_INSERT_SKILL_TRIGGER = insert_sql('skill_trigger', SKILL_TRIGGER_COLUMNS)
+SQL_INSERT_SKILL_EFFECT = insert_sql('skill_effect', SKILL_EFFECT_COLUMNS)
+SQL_INSERT_SKILLS = insert_sql('skills', SKILLS_COLUMNS, CONFLICT_REPLACE)
+
+_CAMEL_BOUNDARY = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
+
+
+def snake_case(name):
+    """onHPRatioUpdate -> on_hpratio_update；AddAttr -> add_attr。"""
+    return _CAMEL_BOUNDARY.sub('_', name).lower()
+
+
+def trigger_type_of(raw_trigger, args):
+    """遊戲的觸發名 (+ 效果參數) -> 存儲的觸發類型。"""
+    if raw_trigger == INTERVAL_TRIGGER and _number(args.get('time')):
+        return TRIGGER_INTERVAL
+    return TRIGGER_ALIASES.get(raw_trigger) or snake_case(raw_trigger)
+
+
+def effect_type_of(raw_type):
+    """BattleBuffCastSkill -> cast_skill。"""
+    for prefix in EFFECT_TYPE_PREFIXES:
+        if raw_type.startswith(prefix):
+            raw_type = raw_type[len(prefix):]
+            break
+    return snake_case(raw_type)
+
+
+def _number(value):
+    """數值參數 -> float；缺失或非數值 (例如公式字符串) 時為 None。"""
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _int_or_none(value):
+    number = _number(value)
+    return None if number is None else int(number)
+
+
+def _level_effects(buff):
+    """
+    buff 在最高等級的效果列表。
+    等級條目 ("1" … "10") 可以覆蓋頂層 effect_list 中同一位置效果的 arg_list，此處取最高的等級條目。
+    """
+    effects = buff.get('effect_list') or []
+    if isinstance(effects, dict):  # Lua 表轉出的 {"1": …, "2": …}
+        effects = [effects[key] for key in sorted(effects, key=int)]
+    levels = [int(key) for key in buff if isinstance(key, str) and key.isdigit()]
+    level_entry = buff.get(str(max(levels))) if levels else None
+    overrides = (level_entry or {}).get('effect_list') if isinstance(level_entry, dict) else None
+    if not overrides:
+        return effects
+    if isinstance(overrides, dict):
+        overrides = [overrides[key] for key in sorted(overrides, key=int)]
+    merged = []
+    for index, effect in enumerate(effects):
+        override = overrides[index] if index < len(overrides) else None
+        if override:
+            effect = dict(effect, **{k: v for k, v in override.items() if k != 'arg_list'})
+            effect['arg_list'] = dict(effects[index].get('arg_list') or {}, **(override.get('arg_list') or {}))
+        merged.append(effect)
+    return merged
+
+
+# --- 核心處理函數 ---
+def build_skill_rows(skills, buffs):
+    """
+    把技能模板與 buff 配置展開為 skills / skill_trigger / skill_effect 的數據元組。
+    此函數不接觸數據庫，可以在進程池中執行。
+    Args:
+        skills (dict): skill_data_template.json 的內容 {id_str: 記錄} (可為空)。
+        buffs (dict): buff_data_template.json 的內容 {id_str: 記錄} (可為空)。
+    Returns:
+        tuple: (skills 數據元組列表, skill_trigger 數據元組列表, skill_effect 數據元組列表)。
+    """
+    skills = resolve_inheritance(skills or {}, source_name=SKILL_JSON_FILENAME)
+    buffs = resolve_inheritance(buffs or {}, source_name=BUFF_JSON_FILENAME)
+    counters = StepCounters('process_skills')
+
+    names = {}
+    for key, skill in skills.items():
+        skill_id = int(skill.get('id', key))
+        names[skill_id] = (skill.get('name'), skill.get('desc'))
+
+    trigger_rows, effect_rows = [], []
+    summaries = {}
+    for key, buff in buffs.items():
+        skill_id = int(buff.get('id', key))
+        if skill_id not in names:
+            names[skill_id] = (buff.get('name'), buff.get('desc'))
+        trigger_types, effect_types = summaries.setdefault(skill_id, ([], []))
+        for effect_index, effect in enumerate(_level_effects(buff)):
+            raw_type = effect.get('type')
+            if not raw_type:
+                counters.add('effect_without_type')
+                continue
+            args = effect.get('arg_list') or {}
+            if not isinstance(args, dict):
+                args = {}
+            effect_type = effect_type_of(raw_type)
+            target = args.get('target')
+            if isinstance(target, list):
+                target = ','.join(map(str, target))
+            effect_rows.append((
+                skill_id, effect_index, effect_type, raw_type,
+                None if target is None else str(target),
+                None if args.get('attr') is None else str(args['attr']),
+                _number(args.get('number')),
+                _int_or_none(args.get('skill_id')),
+                _int_or_none(args.get('buff_id')),
+                json.dumps(args, ensure_ascii=False, sort_keys=True),
+            ))
+            if effect_type not in effect_types:
+                effect_types.append(effect_type)
+
+            rant = _number(args.get('rant'))
+            probability = 1.0 if rant is None else min(rant / PROBABILITY_SCALE, 1.0)
+            quota = _int_or_none(args.get('quota'))
+            if quota is not None and quota <= 0:
+                quota = None  # 不限次數
+            raw_triggers = effect.get('trigger') or []
+            if isinstance(raw_triggers, str):
+                raw_triggers = [raw_triggers]
+            if not raw_triggers:
+                counters.add('effect_without_trigger')
+            for raw_trigger in dict.fromkeys(raw_triggers):
+                trigger_type = trigger_type_of(raw_trigger, args)
+                interval = _number(args.get('time')) if trigger_type == TRIGGER_INTERVAL else None
+                trigger_rows.append((trigger_type, skill_id, effect_index, raw_trigger,
+                                     interval, probability, quota))
+                counters.add(f'trigger:{trigger_type}')
+                if trigger_type not in trigger_types:
+                    trigger_types.append(trigger_type)
+
+    skill_rows = []
+    for skill_id in sorted(names):
+        name, description = names[skill_id]
+        trigger_types, effect_types = summaries.get(skill_id, ((), ()))
+        skill_rows.append((skill_id, name, description, json.dumps(trigger_types), json.dumps(effect_types)))
+        if skill_id not in summaries:
+            counters.add('skill_without_buff')
+
+    counters.report(logger)
+    logger.info("  展開 %d 個技能: %d 條觸發、%d 條效果。", len(skill_rows), len(trigger_rows), len(effect_rows))
+    return skill_rows, trigger_rows, effect_rows
+
+
+def load_skill_tables(cursor, skill_rows, trigger_rows, effect_rows):
+    """全量重新載入 skills、skill_trigger 與 skill_effect 表。"""
+    cursor.execute("DELETE FROM skills")
+    cursor.execute("DELETE FROM skill_trigger")
+    cursor.execute("DELETE FROM skill_effect")
+    seconds = 0.0
+    for sql, rows, table in ((SQL_INSERT_SKILLS, skill_rows, 'skills'),
+                             (SQL_INSERT_SKILL_TRIGGER, trigger_rows, 'skill_trigger'),
+                             (SQL_INSERT_SKILL_EFFECT, effect_rows, 'skill_effect')):
+        seconds += bulk_write(cursor, sql, rows, label=f'process_skills: {table} insert').seconds
+    logger.info("  已載入 %d 個技能、%d 條觸發、%d 條效果。耗時: %.2f 秒。",
+                len(skill_rows), len(trigger_rows), len(effect_rows), seconds)
+
+
+# --- 流水線入口 ---
+def parse(json_cache):
+    """
+    解析階段 (可在進程池中執行)。
+    兩個文件都不存在時記錄警告並返回 None，寫入階段不做任何修改；只缺 buff 配置時技能沒有觸發與效果行。
+    """
+    present = {name: json_cache.exists(name) for name in INPUTS}
+    if not any(present.values()):
+        logger.warning("  警告: 找不到技能數據文件 %s，跳過技能處理 (skills 表保持不變)。", ', '.join(INPUTS))
+        return None
+    for name, exists in present.items():
+        if not exists:
+            logger.warning("  警告: 找不到 %s，僅使用另一個文件中的技能數據。", name)
+    start_time = time.time()
+    rows = build_skill_rows(
+        json_cache.load(SKILL_JSON_FILENAME) if present[SKILL_JSON_FILENAME] else None,
+        json_cache.load(BUFF_JSON_FILENAME) if present[BUFF_JSON_FILENAME] else None,
+    )
+    logger.info("  完成技能數據解析。耗時: %.2f 秒。", time.time() - start_time)
+    return rows
+
+
+def write(ctx, payload):
+    """寫入階段 (由唯一的寫入者執行)。"""
+    if payload is None:
+        return
+    load_skill_tables(ctx.cursor(), *payload)
+
+
+# --- 主執行入口 (單獨調試此步驟時使用) ---
+if __name__ == '__main__':
+    from azurlane_analyzer.preprocessing.pipeline import run_standalone
+    sys.exit(run_standalone(Path(__file__).stem))
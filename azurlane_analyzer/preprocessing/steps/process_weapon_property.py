@@ -1,211 +1,231 @@
 # 位於: AzurLane-Analyzer/azurlane_analyzer/preprocessing/steps/process_weapon_property.py
+#
+# weapon_property.json -> weapon_property 表，並把武器屬性關聯到 equipment 的 wp_* 欄位。
+# weapon_property.json 是 sharecfgdata 中最大的文件之一，因此此步驟沒有拆分為 parse/write:
+# 拆分後解析結果要在進程池中整份組裝成列表再 pickle 回寫入者，峰值記憶體隨文件大小增長。
+# 改為在寫入者中以 run(ctx) 串流讀取 (JsonCache.iter_records)，逐條轉換後直接按塊交給 BulkWriter，
+# 記憶體中只保留一個塊 (DEFAULT_CHUNK_SIZE 行)；代價是字段轉換不再與其他步驟的解析並行。
 
-import json
 import sqlite3
 import sys
 from pathlib import Path
 import time  # 用於計時
 
+from azurlane_analyzer.preprocessing.bulk_writer import BulkWriter
+from azurlane_analyzer.preprocessing.field_map import CONFLICT_REPLACE, Field, FieldMap, record_id, to_int, to_json
+from azurlane_analyzer.preprocessing.log import get_logger
+
+logger = get_logger(__name__)
+
 # --- 配置 ---
 # 此腳本負責處理的 JSON 文件名
 TARGET_JSON_FILENAME = 'weapon_property.json'
 
+# --- 輸入聲明 (供增量重建判斷輸入是否變化；修改處理邏輯或輸出結構時遞增 STEP_VERSION) ---
+INPUTS = (TARGET_JSON_FILENAME,)
+STEP_VERSION = 5
+
+# 遊戲的裝填時間常數: 武器冷卻 (秒) = reload_max / RELOAD_TIME_CONSTANT * sqrt(200 / (100 + 裝填))。
+# 裝填為 100 時根號項為 1，因此倉庫面板 CD = reload_max / RELOAD_TIME_CONSTANT。
+RELOAD_TIME_CONSTANT = 150.0
+
+# --- 依賴聲明 (供調度器推導步驟間的依賴關係) ---
+READS = ('equipment.id', 'equipment.weapon_id')
+WRITES = (
+    'weapon_property', 'equipment_bullet', 'equipment_barrage',
+    'equipment.weapon_property_id', 'equipment.wp_type', 'equipment.wp_bullet_ids',
+    'equipment.wp_barrage_ids', 'equipment.wp_range', 'equipment.wp_angle',
+    'equipment.wp_min_range', 'equipment.wp_auto_aftercast', 'equipment.wp_recover_time',
+    'equipment.wp_precast_param', 'equipment.wp_damage', 'equipment.wp_oxy_type',
+    'equipment.wp_expose', 'equipment.wp_fire_fx', 'equipment.wp_fire_sfx',
+    'equipment.wp_fire_fx_loop_type', 'equipment.weapon_property_json',
+    'equipment.storehouse_cd_initial',
+)
+
+# weapon_property 表的欄位映射 (目標欄位 <- weapon_property.json 的鍵 + 轉換)。
+# 列表類型缺失時寫入 '[]'，完整 JSON 在 property_json 中每個武器屬性只保存一份。
+WEAPON_PROPERTY_FIELDS = FieldMap('weapon_property', (
+    Field('id', record_id, to_int),              # weapon_property 自身的 id (表的主鍵)
+    Field('type'),
+    Field('bullet_ids', 'bullet_ID', to_json, default=[]),
+    Field('barrage_ids', 'barrage_ID', to_json, default=[]),
+    Field('range'),
+    Field('angle'),
+    Field('min_range'),
+    Field('auto_aftercast'),
+    Field('recover_time'),
+    Field('precast_param', convert=to_json, default=[]),
+    Field('damage'),
+    Field('oxy_type', convert=to_json, default=[]),
+    Field('expose'),
+    Field('fire_fx'),
+    Field('fire_sfx'),
+    Field('fire_fx_loop_type'),
+    Field('reload_max'),
+    Field('property_json', lambda record, key: record, to_json),
+), conflict=CONFLICT_REPLACE)
+WEAPON_PROPERTY_COLUMNS = WEAPON_PROPERTY_FIELDS.columns
+SQL_INSERT_WEAPON_PROPERTY = WEAPON_PROPERTY_FIELDS.sql
+
+# 以一條集合式 UPDATE … FROM 把 weapon_property 的欄位寫入 equipment 的 wp_* 欄位 (SQLite >= 3.33)。
+# 完整 JSON 只保存在 weapon_property.property_json 中，不再在每個共用同一武器的裝備行上重複一份
+# (需要時經 equipment_with_weapon_property 視圖取得)。
+SQL_ENRICH_EQUIPMENT = f"""
+    UPDATE equipment
+    SET
+        weapon_property_id = wp.id,
+        wp_type = wp.type,
+        wp_bullet_ids = wp.bullet_ids,
+        wp_barrage_ids = wp.barrage_ids,
+        wp_range = wp.range,
+        wp_angle = wp.angle,
+        wp_min_range = wp.min_range,
+        wp_auto_aftercast = wp.auto_aftercast,
+        wp_recover_time = wp.recover_time,
+        wp_precast_param = wp.precast_param,
+        wp_damage = wp.damage,
+        wp_oxy_type = wp.oxy_type,
+        wp_expose = wp.expose,
+        wp_fire_fx = wp.fire_fx,
+        wp_fire_sfx = wp.fire_sfx,
+        wp_fire_fx_loop_type = wp.fire_fx_loop_type,
+        weapon_property_json = NULL,
+        storehouse_cd_initial = wp.reload_max / {RELOAD_TIME_CONSTANT}
+    FROM weapon_property AS wp
+    WHERE wp.id = equipment.weapon_id
+"""
+
+# 舊版 SQLite (< 3.33) 不支持 UPDATE … FROM，改用行值 (row value) 子查詢，同樣只是一條語句
+SQL_ENRICH_EQUIPMENT_LEGACY = f"""
+    UPDATE equipment
+    SET (
+        weapon_property_id, wp_type, wp_bullet_ids, wp_barrage_ids, wp_range, wp_angle,
+        wp_min_range, wp_auto_aftercast, wp_recover_time, wp_precast_param, wp_damage,
+        wp_oxy_type, wp_expose, wp_fire_fx, wp_fire_sfx, wp_fire_fx_loop_type, weapon_property_json,
+        storehouse_cd_initial
+    ) = (
+        SELECT id, type, bullet_ids, barrage_ids, range, angle,
+               min_range, auto_aftercast, recover_time, precast_param, damage,
+               oxy_type, expose, fire_fx, fire_sfx, fire_fx_loop_type, NULL,
+               reload_max / {RELOAD_TIME_CONSTANT}
+        FROM weapon_property AS wp WHERE wp.id = equipment.weapon_id
+    )
+    WHERE weapon_id IN (SELECT id FROM weapon_property)
+"""
+
+# 關聯表: 把 equipment 的 wp_bullet_ids / wp_barrage_ids JSON 列表展開為一行一個 ID (json_each，一條語句)
+SQL_FILL_EQUIPMENT_BULLET = """
+    INSERT INTO equipment_bullet (equip_id, position, bullet_id)
+    SELECT e.id, j.key, j.value
+    FROM equipment AS e, json_each(e.wp_bullet_ids) AS j
+    WHERE e.weapon_property_id IS NOT NULL
+"""
+
+SQL_FILL_EQUIPMENT_BARRAGE = """
+    INSERT INTO equipment_barrage (equip_id, position, barrage_id)
+    SELECT e.id, j.key, j.value
+    FROM equipment AS e, json_each(e.wp_barrage_ids) AS j
+    WHERE e.weapon_property_id IS NOT NULL
+"""
+
 # --- 核心處理函數 ---
-def update_equipment_with_weapon_properties(cursor, weapon_properties, equipment_to_update):
+def iter_weapon_property_rows(weapon_properties):
     """
-    根據 weapon_id 將 weapon_properties 中的數據更新到 equipment 表中。
+    將 weapon_property.json 的每一項轉換為 weapon_property 表的數據元組 (生成器，逐條產生)。
 
     Args:
-        cursor: SQLite 資料庫游標。
-        weapon_properties (dict): 從 weapon_property.json 載入的字典 {prop_id_str: prop_data_dict}。
-        equipment_to_update (list): 從 equipment 表查詢到的 [(equip_id, weapon_id)] 列表。
-    """
-    print(f"  -> 開始更新 {len(equipment_to_update)} 筆裝備資料的武器屬性...")
-    start_time = time.time()
-    updated_count = 0
-    skipped_count = 0
-
-    # 準備 SQL UPDATE 語句 (只準備一次)
-    # 注意欄位順序必須與後面的 data_tuple 完全一致
-    sql_update_query = """
-        UPDATE equipment
-        SET
-            weapon_property_id = ?,  -- 1
-            wp_type = ?,             -- 2
-            wp_bullet_ids = ?,       -- 3
-            wp_barrage_ids = ?,      -- 4
-            wp_range = ?,            -- 5
-            wp_angle = ?,            -- 6
-            wp_min_range = ?,        -- 7
-            wp_auto_aftercast = ?,   -- 8
-            wp_recover_time = ?,     -- 9
-            wp_precast_param = ?,    -- 10
-            wp_damage = ?,           -- 11
-            wp_oxy_type = ?,         -- 12
-            wp_expose = ?,           -- 13
-            wp_fire_fx = ?,          -- 14
-            wp_fire_sfx = ?,         -- 15
-            wp_fire_fx_loop_type = ?,-- 16
-            weapon_property_json = ? -- 17
-        WHERE id = ?                 -- 18 (用於 WHERE 條件)
+        weapon_properties: 從 weapon_property.json 載入的字典 {prop_id_str: prop_data_dict}，
+                           或逐條產生 (prop_id_str, prop_data_dict) 的可迭代對象 (串流讀取)。
+    Yields:
+        tuple: 與 WEAPON_PROPERTY_COLUMNS 順序一致的數據元組。
     """
+    if isinstance(weapon_properties, dict):
+        weapon_properties = weapon_properties.items()
+    extract = WEAPON_PROPERTY_FIELDS.extract
+    for weapon_id_str, prop_data in weapon_properties:
+        try:
+            yield extract(prop_data, weapon_id_str)
+        except Exception as e:
+            logger.error("  錯誤: 解析武器屬性 %s 時發生錯誤: %s", weapon_id_str, e)
 
-    for equip_id, weapon_id_int in equipment_to_update:
-        if weapon_id_int is None:
-            skipped_count += 1
-            continue # 理論上不應發生，因為 SELECT 查詢已過濾
 
-        # weapon_property.json 的鍵通常是字串
-        weapon_id_str = str(weapon_id_int)
+def load_weapon_property_table(cursor, property_rows):
+    """
+    全量重新載入 weapon_property 表 (以武器屬性 ID 為主鍵)。
 
-        # 在載入的 weapon_properties 中查找對應的資料
-        prop_data = weapon_properties.get(weapon_id_str)
+    Args:
+        cursor: SQLite 資料庫游標。
+        property_rows: 數據元組的可迭代對象 (iter_weapon_property_rows 的生成器按塊寫入，不會一次性展開)。
+    """
+    cursor.execute("DELETE FROM weapon_property")
+    with BulkWriter(cursor, SQL_INSERT_WEAPON_PROPERTY,
+                    label='process_weapon_property: weapon_property insert') as writer:
+        writer.write_all(property_rows)
+    logger.info("  已載入 %s 筆武器屬性到 weapon_property 表。耗時: %.2f 秒。", writer.rows_written, writer.seconds)
 
-        if prop_data is None:
-            # print(f"  警告: 裝備 ID {equip_id} 的 weapon_id '{weapon_id_str}' 在 {TARGET_JSON_FILENAME} 中未找到，跳過。", file=sys.stderr)
-            skipped_count += 1
-            continue
 
-        try:
-            # --- 提取需要放入獨立欄位的數據 ---
-            wp_id = prop_data.get('id') # weapon_property 自身的 id
-            wp_type_val = prop_data.get('type')
-            # 對列表類型，使用 .get(key, []) 確保即使鍵不存在也返回空列表，避免 json.dumps 出錯
-            wp_bullet_ids_val = json.dumps(prop_data.get('bullet_ID', []))
-            wp_barrage_ids_val = json.dumps(prop_data.get('barrage_ID', []))
-            wp_range_val = prop_data.get('range')
-            wp_angle_val = prop_data.get('angle')
-            wp_min_range_val = prop_data.get('min_range')
-            wp_auto_aftercast_val = prop_data.get('auto_aftercast')
-            wp_recover_time_val = prop_data.get('recover_time')
-            wp_precast_param_val = json.dumps(prop_data.get('precast_param', []))
-            wp_damage_val = prop_data.get('damage')
-            wp_oxy_type_val = json.dumps(prop_data.get('oxy_type', []))
-            wp_expose_val = prop_data.get('expose')
-            wp_fire_fx_val = prop_data.get('fire_fx')
-            wp_fire_sfx_val = prop_data.get('fire_sfx')
-            wp_fire_fx_loop_type_val = prop_data.get('fire_fx_loop_type')
-
-            # --- 準備完整的 JSON 字串 ---
-            weapon_property_json_str = json.dumps(prop_data)
-
-            # --- 準備更新用的數據元組 (順序必須與 SQL 語句完全對應) ---
-            data_tuple = (
-                wp_id,                   # 1
-                wp_type_val,             # 2
-                wp_bullet_ids_val,       # 3
-                wp_barrage_ids_val,      # 4
-                wp_range_val,            # 5
-                wp_angle_val,            # 6
-                wp_min_range_val,        # 7
-                wp_auto_aftercast_val,   # 8
-                wp_recover_time_val,     # 9
-                wp_precast_param_val,    # 10
-                wp_damage_val,           # 11
-                wp_oxy_type_val,         # 12
-                wp_expose_val,           # 13
-                wp_fire_fx_val,          # 14
-                wp_fire_sfx_val,         # 15
-                wp_fire_fx_loop_type_val,# 16
-                weapon_property_json_str,# 17
-                equip_id                 # 18 (用於 WHERE id = ?)
-            )
-
-            # --- 執行更新 ---
-            cursor.execute(sql_update_query, data_tuple)
-            updated_count += 1
-
-            # 進度提示 (可選，避免輸出過多)
-            if updated_count % 500 == 0:
-                 elapsed = time.time() - start_time
-                 print(f"    已更新 {updated_count} / {len(equipment_to_update)} 筆記錄... ({elapsed:.2f} 秒)")
+def update_equipment_with_weapon_properties(cursor):
+    """
+    以一條集合式 UPDATE 根據 weapon_id 關聯 weapon_property 表，更新 equipment 表的 wp_* 欄位。
 
+    Args:
+        cursor: SQLite 資料庫游標。
+    Returns:
+        int: 成功更新的裝備行數。
+    """
+    cursor.execute("SELECT count(*) FROM equipment WHERE weapon_id IS NOT NULL")
+    linked_count = cursor.fetchone()[0]
+    logger.info("  -> 開始更新 %s 筆有關聯 weapon_id 的裝備資料的武器屬性...", linked_count)
+    start_time = time.time()
 
-        except Exception as e:
-            print(f"  錯誤: 更新裝備 ID {equip_id} (weapon_id={weapon_id_str}) 時發生錯誤: {e}", file=sys.stderr)
-            # 決定是否要因為單筆錯誤而中止，或者繼續處理下一筆
-            # continue # 選擇繼續處理下一筆
+    if sqlite3.sqlite_version_info >= (3, 33, 0):
+        cursor.execute(SQL_ENRICH_EQUIPMENT)
+    else:
+        cursor.execute(SQL_ENRICH_EQUIPMENT_LEGACY)
+    updated_count = cursor.rowcount
+    skipped_count = linked_count - updated_count # weapon_id 在 weapon_property.json 中不存在
 
-    end_time = time.time()
-    total_time = end_time - start_time
-    print(f"  -> 完成武器屬性更新。成功更新 {updated_count} 筆，跳過 {skipped_count} 筆。耗時: {total_time:.2f} 秒。")
+    total_time = time.time() - start_time
+    logger.info("  -> 完成武器屬性更新。成功更新 %s 筆，跳過 %s 筆。耗時: %.2f 秒。", updated_count, skipped_count, total_time)
+    return updated_count
 
 
-# --- 主執行入口 ---
+def fill_junction_tables(cursor):
+    """重建 equipment_bullet 與 equipment_barrage 關聯表。"""
+    start_time = time.time()
+    cursor.execute("DELETE FROM equipment_bullet")
+    cursor.execute(SQL_FILL_EQUIPMENT_BULLET)
+    bullet_count = cursor.rowcount
+    cursor.execute("DELETE FROM equipment_barrage")
+    cursor.execute(SQL_FILL_EQUIPMENT_BARRAGE)
+    barrage_count = cursor.rowcount
+    logger.info("  -> 關聯表已重建: equipment_bullet %s 行，equipment_barrage %s 行。耗時: %.2f 秒。",
+                bullet_count, barrage_count, time.time() - start_time)
+
+
+# --- 流水線入口 ---
+def run(ctx):
+    """
+    由唯一的寫入者執行：串流載入 weapon_property 表，再根據 weapon_id 關聯更新 equipment 表。
+    文件不存在時 (例如 sharecfgdata 中沒有武器屬性數據) 記錄警告並返回，不做任何修改，
+    下游步驟 (process_equip_templates 等) 照常運行。
+    """
+    if not ctx.json_cache.exists(TARGET_JSON_FILENAME):
+        logger.warning("  警告: 找不到 %s，跳過武器屬性處理 (weapon_property 表與 equipment.wp_* 欄位保持不變)。",
+                       TARGET_JSON_FILENAME)
+        return
+    cursor = ctx.cursor()
+    load_weapon_property_table(cursor, iter_weapon_property_rows(ctx.json_cache.iter_records(TARGET_JSON_FILENAME)))
+
+    cursor.execute("SELECT 1 FROM equipment WHERE weapon_id IS NOT NULL LIMIT 1")
+    if cursor.fetchone() is None:
+        logger.info("  沒有找到需要更新武器屬性的裝備記錄 (可能是 process_equip_stats 未執行或未填充 weapon_id)。")
+    else:
+        update_equipment_with_weapon_properties(cursor)
+    fill_junction_tables(cursor)
+
+
+# --- 主執行入口 (單獨調試此步驟時使用) ---
 if __name__ == '__main__':
-    print(f"\n--- [子腳本執行開始]: {Path(__file__).name} ---")
-
-    # 1. 檢查並獲取命令行參數
-    if len(sys.argv) != 3:
-        print("錯誤: 此腳本需要兩個命令行參數：JSON數據目錄路徑 和 數據庫文件路徑。", file=sys.stderr)
-        print(f"用法: python {sys.argv[0]} <json_data_dir> <db_file_path>", file=sys.stderr)
-        sys.exit(1)
-
-    json_data_dir = Path(sys.argv[1]).resolve()
-    db_file = Path(sys.argv[2]).resolve()
-
-    print(f"  接收到 JSON 目錄: {json_data_dir}")
-    print(f"  接收到 DB 文件: {db_file}")
-
-    # 2. 構建 weapon_property.json 的完整路徑
-    target_json_file = json_data_dir / TARGET_JSON_FILENAME
-    print(f"  目標處理文件: {target_json_file}")
-
-    # 3. 載入 weapon_property.json
-    weapon_properties_data = {}
-    if not target_json_file.is_file():
-        print(f"錯誤: 目標 JSON 文件 '{TARGET_JSON_FILENAME}' 在指定目錄中未找到: {target_json_file}", file=sys.stderr)
-        sys.exit(1)
-    try:
-        print(f"  正在載入 {target_json_file.name}...")
-        with open(target_json_file, 'r', encoding='utf-8') as f:
-            weapon_properties_data = json.load(f)
-        print(f"  成功載入 {len(weapon_properties_data)} 筆武器屬性資料。")
-    except json.JSONDecodeError as e:
-        print(f"錯誤: 解析 JSON 文件 {target_json_file} 失敗: {e}", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"載入 {target_json_file.name} 時發生意外錯誤: {e}", file=sys.stderr)
-        sys.exit(1)
-
-    # 4. 連接數據庫並執行處理邏輯
-    conn = None
-    try:
-        print(f"  連接到數據庫: {db_file} ...")
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-        print("  數據庫連接成功。")
-
-        # 查詢需要更新的裝備 ID 和 weapon_id
-        print("  正在從 equipment 表查詢需要更新的記錄...")
-        cursor.execute("SELECT id, weapon_id FROM equipment WHERE weapon_id IS NOT NULL")
-        equipment_to_update = cursor.fetchall()
-        print(f"  查詢到 {len(equipment_to_update)} 筆裝備記錄有關聯的 weapon_id。")
-
-        if not equipment_to_update:
-            print("  沒有找到需要更新武器屬性的裝備記錄 (可能是 process_equip_stats.py 未執行或未填充 weapon_id)。")
-        else:
-            # 調用核心更新函數
-            update_equipment_with_weapon_properties(cursor, weapon_properties_data, equipment_to_update)
-
-        # 提交事務
-        print("  提交資料庫更改...")
-        conn.commit()
-        print("  資料庫更改已提交。")
-
-    except sqlite3.Error as e:
-        print(f"!!! 數據庫操作過程中發生錯誤: {e} !!!", file=sys.stderr)
-        if conn:
-            conn.rollback()
-        sys.exit(1)
-    except Exception as e:
-        print(f"!!! 處理過程中發生意外錯誤: {e} !!!", file=sys.stderr)
-        if conn:
-            conn.rollback()
-        sys.exit(1)
-    finally:
-        if conn:
-            conn.close()
-            print("  數據庫連接已關閉。")
-
-    print(f"--- [子腳本執行結束]: {Path(__file__).name} ---")
\ No newline at end of file
+    from azurlane_analyzer.preprocessing.pipeline import run_standalone
+    sys.exit(run_standalone(Path(__file__).stem))
@@ -0,0 +1,325 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/query.py
+#
+# 預處理結果 (DataOutput/azur_lane_data.db) 的查詢接口。
+# 取代原 steps/query_db.py (它在腳本旁邊尋找數據庫，且每次調用都新開連接):
+#   - ReadOnlyConnectionPool: 每個線程持有一個只讀 (mode=ro + query_only) 連接並重複使用，
+#     sqlite3 的語句快取讓相同 SQL 文本的查詢只準備一次；
+#   - EquipmentQuery: 按類型、稀有度、陣營、weapon_id、屬性範圍，以及 (經關聯表反查的) 子彈、彈幕、
+#     可裝備艦種篩選裝備的參數化查詢構建器。
+#     條件以固定的子句模板拼接，值一律走參數，因此同一種篩選組合總是生成相同的 SQL；
+#   - QUERY_INDEXES / ensure_query_indexes: 上述訪問路徑使用的覆蓋索引，在構建數據庫時創建。
+#
+# 用法:
+#     pool = ReadOnlyConnectionPool()
+#     rows = EquipmentQuery().where_type(3).where_faction(1).fetch(pool)
+
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing.log import get_logger
+
+logger = get_logger(__name__)
+
+# --- 路徑 ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DB_FILE = PROJECT_ROOT / 'DataOutput' / 'azur_lane_data.db'
+
+# 每個連接的預編譯語句快取大小 (sqlite3 默認 128)
+STATEMENT_CACHE_SIZE = 256
+
+# 列表查詢默認返回的摘要欄位 (均包含在下方的覆蓋索引中，篩選時無需回表)
+SUMMARY_COLUMNS = ('id', 'name', 'equipment_type', 'rarity', 'faction')
+# 在表中以 TEXT 存儲、對外以整數返回的分類欄位 (見 equipment_record)
+CATEGORY_COLUMNS = ('equipment_type', 'rarity', 'faction')
+
+# 允許作為範圍條件的屬性欄位 (白名單，欄位名不能來自調用方的任意字符串)
+STAT_COLUMNS = (
+    'stat_hp', 'stat_firepower', 'stat_torpedo', 'stat_aviation', 'stat_reload',
+    'stat_antiair', 'stat_hit', 'stat_evasion', 'stat_speed', 'stat_luck',
+    'stat_antisub', 'stat_oxy_max', 'stat_raid_distance',
+    'base_damage_initial', 'base_damage_max',
+)
+
+# --- 索引 ---
+# 名稱 -> 建立語句。類型/陣營/稀有度索引附帶 name，使摘要列表查詢完全由索引覆蓋
+# (id 是 INTEGER PRIMARY KEY，即 rowid，本身就包含在每個索引中)。
+QUERY_INDEXES = {
+    'idx_equipment_type_faction':
+        "CREATE INDEX IF NOT EXISTS idx_equipment_type_faction "
+        "ON equipment (equipment_type, faction, rarity, name)",
+    'idx_equipment_faction_type':
+        "CREATE INDEX IF NOT EXISTS idx_equipment_faction_type "
+        "ON equipment (faction, equipment_type, rarity, name)",
+    'idx_equipment_rarity':
+        "CREATE INDEX IF NOT EXISTS idx_equipment_rarity "
+        "ON equipment (rarity, equipment_type, faction, name)",
+    # weapon_id 的索引 idx_equipment_weapon_id 由 create_all_tables 創建 (預處理關聯 weapon_property 時也要用)
+}
+QUERY_INDEXES.update({
+    f'idx_equipment_{column}':
+        f"CREATE INDEX IF NOT EXISTS idx_equipment_{column} ON equipment ({column}) WHERE {column} IS NOT NULL"
+    for column in STAT_COLUMNS
+})
+
+
+def ensure_query_indexes(conn):
+    """
+    創建查詢接口使用的索引並更新查詢規劃器的統計信息。
+    Args:
+        conn (sqlite3.Connection): 可寫的數據庫連接 (構建數據庫時調用)。
+    """
+    cursor = conn.cursor()
+    for sql in QUERY_INDEXES.values():
+        cursor.execute(sql)
+    cursor.execute("ANALYZE")
+    conn.commit()
+    logger.info("  查詢索引檢查/創建完成 (%d 個)。", len(QUERY_INDEXES))
+
+
+# --- 只讀連接池 ---
+class ReadOnlyConnectionPool:
+    """
+    每個線程一個只讀連接，首次使用時打開，之後重複使用。
+    連接以 URI mode=ro 打開並設置 PRAGMA query_only，任何寫入都會失敗。
+    """
+
+    def __init__(self, db_file=DEFAULT_DB_FILE):
+        self.db_file = Path(db_file)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _open(self):
+        if not self.db_file.is_file():
+            raise FileNotFoundError(f"數據庫文件未找到: {self.db_file}")
+        # check_same_thread=False 只是為了讓 close_all() 能在其他線程關閉連接；
+        # 每個連接仍然只由打開它的線程使用。
+        conn = sqlite3.connect(f"{self.db_file.resolve().as_uri()}?mode=ro", uri=True,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self):
+        """返回當前線程的只讀連接。"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def execute(self, sql, params=()):
+        """在當前線程的連接上執行查詢並返回所有結果行 (sqlite3.Row)。"""
+        return self.connection().execute(sql, params).fetchall()
+
+    def close_all(self):
+        """關閉所有線程打開的連接 (程序結束或數據庫被替換時調用)。"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close_all()
+        return False
+
+
+# --- 查詢構建器 ---
+class EquipmentQuery:
+    """
+    equipment 表的參數化查詢構建器。每個 where_* 方法追加一個固定模板的條件並返回自身，
+    build() 返回 (sql, params)。
+    類型、稀有度、陣營在表中以 TEXT 存儲，傳入整數時會轉為字符串以便命中索引。
+    """
+
+    def __init__(self, columns=SUMMARY_COLUMNS):
+        self._columns = tuple(columns)
+        self._conditions = []
+        self._params = []
+        self._order_by = None  # 默認不排序: 結果按所用索引的順序返回，避免為 ORDER BY id 放棄覆蓋索引
+        self._limit = None
+
+    # --- 條件 ---
+    def _where_in(self, column, values):
+        if isinstance(values, (list, tuple, set, frozenset)):
+            values = [str(v) for v in values]
+            if not values:
+                self._conditions.append("0")  # 空列表: 不匹配任何行
+            elif len(values) == 1:
+                self._conditions.append(f"{column} = ?")
+            else:
+                self._conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            self._params.extend(values)
+        else:
+            self._conditions.append(f"{column} = ?")
+            self._params.append(str(values))
+        return self
+
+    def where_type(self, equipment_type):
+        """按裝備類型篩選 (單個值或值列表)。"""
+        return self._where_in('equipment_type', equipment_type)
+
+    def where_rarity(self, rarity):
+        """按稀有度篩選 (單個值或值列表)。"""
+        return self._where_in('rarity', rarity)
+
+    def where_faction(self, faction):
+        """按陣營篩選 (單個值或值列表)。"""
+        return self._where_in('faction', faction)
+
+    def where_ids(self, equip_ids):
+        """限定裝備 ID (例如全文檢索返回的 ID)。"""
+        equip_ids = [int(equip_id) for equip_id in equip_ids]
+        if not equip_ids:
+            self._conditions.append("0")
+        else:
+            self._conditions.append(f"id IN ({', '.join('?' * len(equip_ids))})")
+            self._params.extend(equip_ids)
+        return self
+
+    def where_weapon_id(self, weapon_id):
+        """按關聯的 weapon_id 篩選。"""
+        self._conditions.append("weapon_id = ?")
+        self._params.append(int(weapon_id))
+        return self
+
+    def where_bullet(self, bullet_id):
+        """使用指定子彈的裝備 (經 equipment_bullet 關聯表反查)。"""
+        self._conditions.append("id IN (SELECT equip_id FROM equipment_bullet WHERE bullet_id = ?)")
+        self._params.append(int(bullet_id))
+        return self
+
+    def where_barrage(self, barrage_id):
+        """使用指定彈幕的裝備 (經 equipment_barrage 關聯表反查)。"""
+        self._conditions.append("id IN (SELECT equip_id FROM equipment_barrage WHERE barrage_id = ?)")
+        self._params.append(int(barrage_id))
+        return self
+
+    def where_usable_by(self, ship_type):
+        """指定艦種可以裝備的裝備 (排除 equipment_forbidden_ship_type 中禁用該艦種的裝備)。"""
+        self._conditions.append(
+            "id NOT IN (SELECT equip_id FROM equipment_forbidden_ship_type WHERE ship_type = ?)")
+        self._params.append(int(ship_type))
+        return self
+
+    def where_stat_range(self, stat, minimum=None, maximum=None):
+        """
+        按屬性範圍篩選 (閉區間；minimum/maximum 可只給一個)。
+        Args:
+            stat (str): STAT_COLUMNS 中的欄位名，可省略 'stat_' 前綴 (例如 'firepower')。
+        """
+        column = stat if stat in STAT_COLUMNS else f'stat_{stat}'
+        if column not in STAT_COLUMNS:
+            raise ValueError(f"不支持按 '{stat}' 篩選範圍，可用欄位: {', '.join(STAT_COLUMNS)}")
+        if minimum is not None:
+            self._conditions.append(f"{column} >= ?")
+            self._params.append(minimum)
+        if maximum is not None:
+            self._conditions.append(f"{column} <= ?")
+            self._params.append(maximum)
+        if minimum is None and maximum is None:
+            self._conditions.append(f"{column} IS NOT NULL")
+        if column not in self._columns:
+            self._columns += (column,)
+        return self
+
+    def order_by(self, column, descending=False):
+        if column not in SUMMARY_COLUMNS and column not in STAT_COLUMNS:
+            raise ValueError(f"不支持按 '{column}' 排序")
+        self._order_by = f"{column} DESC" if descending else column
+        return self
+
+    def limit(self, count):
+        self._limit = int(count)
+        return self
+
+    # --- 生成與執行 ---
+    def build(self):
+        """Returns: tuple (sql, params)。"""
+        sql = f"SELECT {', '.join(self._columns)} FROM equipment"
+        if self._conditions:
+            sql += " WHERE " + " AND ".join(self._conditions)
+        if self._order_by is not None:
+            sql += f" ORDER BY {self._order_by}"
+        params = list(self._params)
+        if self._limit is not None:
+            sql += " LIMIT ?"
+            params.append(self._limit)
+        return sql, tuple(params)
+
+    def fetch(self, pool):
+        """在連接池的當前線程連接上執行查詢。Returns: list[sqlite3.Row]。"""
+        sql, params = self.build()
+        return pool.execute(sql, params)
+
+
+# --- 結果轉換 ---
+def _category_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def equipment_record(row):
+    """
+    equipment 表的一行 -> 字典，CATEGORY_COLUMNS 轉為整數 (缺失或無法轉換時為 None)，
+    與 compare.rank 的結果使用相同的類型。
+    """
+    record = dict(row)
+    for column in CATEGORY_COLUMNS:
+        if column in record:
+            record[column] = _category_int(record[column])
+    return record
+
+
+# --- 常用查詢 ---
+def get_equipment(pool, equip_id):
+    """按 ID 返回一件裝備的完整記錄 (sqlite3.Row)；不存在時返回 None。"""
+    rows = pool.execute("SELECT * FROM equipment WHERE id = ?", (int(equip_id),))
+    return rows[0] if rows else None
+
+
+def get_weapon(pool, weapon_id):
+    """按 ID 返回一個武器 (weapon 表: id, name, base_id)；不存在時返回 None。"""
+    rows = pool.execute("SELECT * FROM weapon WHERE id = ?", (int(weapon_id),))
+    return rows[0] if rows else None
+
+
+def get_max_level(pool, equip_id):
+    """返回裝備所在強化鏈的最高等級記錄 (equipment_level)；不在任何鏈上時返回 None。"""
+    rows = pool.execute(
+        "SELECT top.* FROM equipment_level AS lvl "
+        "JOIN equipment_level AS top ON top.chain_id = lvl.chain_id AND top.is_max = 1 "
+        "WHERE lvl.equip_id = ?",
+        (int(equip_id),),
+    )
+    return rows[0] if rows else None
+
+
+# --- 主執行入口 (快速檢查數據庫內容) ---
+if __name__ == '__main__':
+    db_file = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DB_FILE
+    print(f"數據庫文件: {db_file}")
+    try:
+        with ReadOnlyConnectionPool(db_file) as pool:
+            total_rows = pool.execute("SELECT count(*) FROM equipment")[0][0]
+            named_rows = pool.execute("SELECT count(*) FROM equipment WHERE name IS NOT NULL")[0][0]
+            print(f"equipment 表總行數: {total_rows}，有名稱的行數: {named_rows}")
+
+            row = get_weapon(pool, 50000)
+            print(f"武器 ID 50000: {row['name'] if row else '未找到'}")
+
+            print("\n炮擊 >= 40 的前 5 件裝備:")
+            for r in EquipmentQuery().where_stat_range('firepower', 40).order_by('stat_firepower', True).limit(5).fetch(pool):
+                print(f"  ID: {r['id']}, Name: {r['name']}, 炮擊: {r['stat_firepower']}")
+    except (FileNotFoundError, sqlite3.Error) as e:
+        print(f"查詢數據庫時出錯: {e}", file=sys.stderr)
+        sys.exit(1)
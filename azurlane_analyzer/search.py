@@ -0,0 +1,278 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/search.py
+#
+# 裝備、武器、技能名稱與描述的全文檢索 (search_text / search_index，見 preprocessing/steps/process_search_index.py)。
+# 查詢文本與索引文本使用相同的規範化 (NFKC、合併空白)，再按以下順序排名 (排序在 SQL 中完成):
+#   1. 名稱完全相同；2. 名稱以查詢開頭 (前綴)；3. 名稱包含查詢；4. 只有描述包含查詢；
+#   5. 模糊匹配 (前四檔不足 limit 條時補充): 候選為與查詢共有 trigram 的名稱 (FTS5 OR 查詢)；
+#      允許的錯字足以破壞查詢的全部 trigram 時 (3-8 字的查詢允許一處，即 3-5 字的短查詢)，
+#      再以 bigram 掃描 search_text 補充候選 (掃描約需數毫秒，因此只在此時進行)。
+#      候選須滿足以下之一: 與查詢共有的 trigram 比例不低於 FUZZY_MIN_SIMILARITY，
+#      或查詢與名稱中某個子串的編輯距離不超過按查詢長度縮放的上限 (每 FUZZY_CHARS_PER_EDIT 字允許一處)，
+#      因此可容忍錯字、漏字或多字 (例如 '九三式純養魚雷' 可找到 '九三式純氧魚雷')。
+# 同一檔內按 bm25 (名稱欄權重高於描述) 與名稱長度排序。
+# 同一對象的各強化等級 (以及同名的武器) 名稱相同，按 (kind, 名稱) 合併為一條結果:
+# SearchHit.item_id 為其中最小的 ID (通常是 +0)，item_ids 為全部 ID。
+# 3 字以上的查詢走 trigram 索引；1-2 字的查詢 trigram 無法索引，改為掃描 search_text
+# (普通表，全部對象約一萬多行，仍在毫秒級)。
+#
+# 用法:
+#     with ReadOnlyConnectionPool() as pool:
+#         hits = search(pool, '九一式', kinds=('equipment',), limit=10)
+
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing.log import get_logger
+from azurlane_analyzer.preprocessing.steps.process_search_index import (
+    KIND_EQUIPMENT, KIND_SKILL, KIND_WEAPON, normalize_text,
+)
+from azurlane_analyzer.query import DEFAULT_DB_FILE, ReadOnlyConnectionPool
+
+logger = get_logger(__name__)
+
+ALL_KINDS = (KIND_EQUIPMENT, KIND_WEAPON, KIND_SKILL)
+DEFAULT_LIMIT = 20
+
+# 匹配檔位 (SearchHit.match)，下標即排序檔位
+MATCH_EXACT = 'exact'
+MATCH_PREFIX = 'prefix'
+MATCH_NAME = 'name'
+MATCH_DESCRIPTION = 'description'
+MATCH_FUZZY = 'fuzzy'
+MATCH_TIERS = (MATCH_EXACT, MATCH_PREFIX, MATCH_NAME, MATCH_DESCRIPTION)
+
+# trigram 分詞的最短可索引長度
+TRIGRAM = 3
+# bm25 的欄位權重 (順序與 search_index 的欄位一致: name, description)
+BM25_WEIGHTS = (10.0, 1.0)
+# 模糊匹配: 查詢 trigram 的最低命中比例，以及按 bm25 取的候選名稱數量上限
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_CANDIDATES = 200
+# 模糊匹配: 每多少字允許一處編輯 (替換、插入或刪除；不足一份的部分也算一處)
+FUZZY_CHARS_PER_EDIT = 8
+BIGRAM = 2
+
+# 一條檢索結果 (同名的多個對象合併為一條，見 item_ids)
+SearchHit = namedtuple('SearchHit', 'kind item_id name match score item_ids')
+
+# 名稱與查詢的關係 -> MATCH_TIERS 的下標 (LIKE 與 NOCASE 只對 ASCII 大小寫不敏感)
+_TIER_SQL = (
+    "CASE WHEN t.name = :query COLLATE NOCASE THEN 0 "
+    "WHEN t.name LIKE :prefix ESCAPE '\\' THEN 1 "
+    "WHEN t.name LIKE :contains ESCAPE '\\' THEN 2 ELSE 3 END"
+)
+_BM25_SQL = f"bm25(search_index, {', '.join(map(str, BM25_WEIGHTS))})"
+
+
+def trigrams(text):
+    """文本 (已規範化) 的 trigram 集合 (大小寫不敏感，與 FTS5 trigram 分詞一致)。"""
+    text = text.casefold()
+    return {text[i:i + TRIGRAM] for i in range(len(text) - TRIGRAM + 1)}
+
+
+def bigrams(text):
+    """文本 (已規範化) 的 bigram 集合 (大小寫不敏感)。"""
+    text = text.casefold()
+    return {text[i:i + BIGRAM] for i in range(len(text) - BIGRAM + 1)}
+
+
+def substring_edit_distance(query, text):
+    """
+    查詢與 text 中最接近的子串之間的編輯距離 (Sellers 算法，子串可從任意位置開始與結束)。
+    兩者應已規範化；比較大小寫不敏感。
+    """
+    query, text = query.casefold(), text.casefold()
+    previous = [0] * (len(text) + 1)
+    for i, char in enumerate(query, 1):
+        current = [i]
+        for j, other in enumerate(text, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        previous = current
+    return min(previous)
+
+
+def max_edits(query):
+    """模糊匹配允許的編輯次數 (每 FUZZY_CHARS_PER_EDIT 字一處，至少一處)。"""
+    return -(-len(query) // FUZZY_CHARS_PER_EDIT)
+
+
+def _item_ids(concatenated):
+    """group_concat(item_id) 的結果 -> 排好序的 ID 元組。"""
+    return tuple(sorted(int(item_id) for item_id in str(concatenated).split(',')))
+
+
+def _phrase(text):
+    """FTS5 查詢中的一個短語 (雙引號轉義)。"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _kind_clause(kinds, params):
+    """kind 篩選子句 (命名參數 :kind0, :kind1 … 加入 params)。"""
+    if not kinds:
+        return ''
+    names = []
+    for index, kind in enumerate(kinds):
+        params[f'kind{index}'] = kind
+        names.append(f':kind{index}')
+    return f" AND t.kind IN ({', '.join(names)})"
+
+
+def has_search_index(pool):
+    """數據庫中是否有 FTS5 索引 search_index (沒有時檢索退化為掃描 search_text)。"""
+    return bool(pool.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"))
+
+
+def search(pool, text, kinds=None, limit=DEFAULT_LIMIT, fuzzy=True):
+    """
+    在名稱與描述中檢索。
+    Args:
+        pool (ReadOnlyConnectionPool): 只讀連接池。
+        text (str): 查詢文本。
+        kinds (tuple): 可選，限定對象類型 (ALL_KINDS 的子集)。
+        limit (int): 最多返回的結果數。
+        fuzzy (bool): 直接匹配不足 limit 條時是否補充模糊匹配的結果。
+    Returns:
+        list[SearchHit]: 按匹配檔位、相關度排序；同一檔內 score 越小越相關。
+    """
+    query = normalize_text(text)
+    if not query or limit <= 0:
+        return []
+    kinds = tuple(kinds) if kinds else ()
+    unknown = [kind for kind in kinds if kind not in ALL_KINDS]
+    if unknown:
+        raise ValueError(f"未知的檢索對象類型: {', '.join(map(str, unknown))}")
+
+    escaped = _escape_like(query)
+    params = {'query': query, 'prefix': escaped + '%', 'contains': '%' + escaped + '%', 'limit': int(limit)}
+    kind_sql = _kind_clause(kinds, params)
+    indexed = len(query) >= TRIGRAM and has_search_index(pool)
+    if indexed:
+        params['match'] = _phrase(query)
+        matches = (
+            f"SELECT t.kind, t.item_id, t.name, t.display_name, {_TIER_SQL} AS tier, {_BM25_SQL} AS score "
+            f"FROM search_index JOIN search_text AS t ON t.id = search_index.rowid "
+            f"WHERE search_index MATCH :match{kind_sql}"
+        )
+    else:
+        # 1-2 字 (trigram 無法索引) 或沒有 FTS5: 掃描 search_text
+        matches = (
+            f"SELECT t.kind, t.item_id, t.name, t.display_name, {_TIER_SQL} AS tier, length(t.name) AS score "
+            f"FROM search_text AS t "
+            f"WHERE (t.name LIKE :contains ESCAPE '\\' OR t.description LIKE :contains ESCAPE '\\'){kind_sql}"
+        )
+    # 同名 (各強化等級) 的對象合併為一條，按其中最相關的一行排序
+    # (MATERIALIZED 阻止子查詢被展平，bm25() 不能直接出現在聚合查詢中)
+    rows = pool.execute(
+        f"WITH matches AS MATERIALIZED ({matches}) "
+        f"SELECT kind, MIN(display_name), MIN(tier) AS best_tier, MIN(score) AS best_score, group_concat(item_id) "
+        f"FROM matches GROUP BY kind, name "
+        f"ORDER BY best_tier, best_score, length(name), MIN(item_id) LIMIT :limit",
+        params,
+    )
+    hits = []
+    for kind, name, tier, score, item_ids in rows:
+        item_ids = _item_ids(item_ids)
+        hits.append(SearchHit(kind, item_ids[0], name, MATCH_TIERS[tier], float(score), item_ids))
+
+    if fuzzy and len(query) >= TRIGRAM and len(hits) < limit:
+        seen = {(hit.kind, item_id) for hit in hits for item_id in hit.item_ids}
+        hits.extend(fuzzy_search(pool, query, kinds, limit - len(hits), exclude=seen))
+    return hits
+
+
+def _fuzzy_candidates(pool, sql, params):
+    """執行候選查詢，返回 {(kind, 名稱): (顯示名稱, item_ids)}。"""
+    return {(kind, name): (display_name, _item_ids(item_ids))
+            for kind, name, display_name, item_ids in pool.execute(sql, params)}
+
+
+def fuzzy_search(pool, text, kinds=None, limit=DEFAULT_LIMIT, exclude=()):
+    """
+    模糊匹配 (見模組說明): 與查詢共有的 trigram 比例不低於 FUZZY_MIN_SIMILARITY，
+    或與名稱中某個子串的編輯距離不超過 max_edits(查詢) 的對象。同名對象合併為一條。
+    Args:
+        exclude: 已有的結果 {(kind, item_id)}；包含其中任一 ID 的同名組不再返回。
+    Returns:
+        list[SearchHit]: match 為 MATCH_FUZZY，score = -相似度 (越小越相關)。
+            相似度取 trigram 比例與 1 - 編輯距離 / 查詢長度 中的較大者。
+    """
+    query = normalize_text(text)
+    if not query or len(query) < TRIGRAM or limit <= 0:
+        return []
+    grams = trigrams(query)
+    query_bigrams = bigrams(query)
+    allowed_edits = max_edits(query)
+    # q-gram 引理: 每處編輯最多破壞兩個 bigram，共有的 bigram 不足此數時編輯距離必然超過上限
+    min_shared_bigrams = len(query_bigrams) - BIGRAM * allowed_edits
+    params = {'limit': FUZZY_CANDIDATES}
+    kind_sql = _kind_clause(kinds, params)
+    group_sql = "GROUP BY t.kind, t.name"
+    columns = "t.kind, t.name, MIN(t.display_name), group_concat(t.item_id)"
+
+    def accept(candidates):
+        hits = []
+        for (kind, name), (display_name, item_ids) in candidates.items():
+            if any((kind, item_id) in exclude for item_id in item_ids):
+                continue
+            name = name or ''
+            share = len(grams & trigrams(name)) / len(grams)
+            if share < FUZZY_MIN_SIMILARITY and len(query_bigrams & bigrams(name)) < min_shared_bigrams:
+                continue
+            edits = substring_edit_distance(query, name)
+            if share >= FUZZY_MIN_SIMILARITY or edits <= allowed_edits:
+                similarity = max(share, 1 - edits / len(query))
+                hits.append(SearchHit(kind, item_ids[0], display_name, MATCH_FUZZY, -similarity, item_ids))
+        return hits
+
+    candidates = {}
+    if has_search_index(pool):
+        params['match'] = 'name : (' + ' OR '.join(_phrase(gram) for gram in sorted(grams)) + ')'
+        candidates = _fuzzy_candidates(pool, (
+            f"WITH m AS MATERIALIZED (SELECT rowid, {_BM25_SQL} AS score FROM search_index "
+            f"WHERE search_index MATCH :match) "
+            f"SELECT {columns} FROM m JOIN search_text AS t ON t.id = m.rowid "
+            f"WHERE 1{kind_sql} {group_sql} ORDER BY MIN(m.score) LIMIT :limit"
+        ), params)
+    hits = accept(candidates)
+    # 每處編輯最多破壞三個 trigram: 允許的編輯足以破壞全部 trigram 時，trigram 候選可能漏掉目標
+    if len(hits) < limit and (not candidates or len(grams) <= TRIGRAM * allowed_edits):
+        # 以 bigram 掃描 search_text 補充候選 (共有的 bigram 數在 SQL 中按 q-gram 引理預先過濾)
+        patterns = []
+        for index, gram in enumerate(sorted(query_bigrams)):
+            params[f'bigram{index}'] = '%' + _escape_like(gram) + '%'
+            patterns.append(f"(t.name LIKE :bigram{index} ESCAPE '\\')")
+        params['min_shared'] = max(1, min_shared_bigrams)
+        scanned = _fuzzy_candidates(pool, (
+            f"SELECT {columns} FROM search_text AS t "
+            f"WHERE ({' + '.join(patterns)}) >= :min_shared{kind_sql} {group_sql}"
+        ), params)
+        hits.extend(accept({key: value for key, value in scanned.items() if key not in candidates}))
+    hits.sort(key=lambda hit: (hit.score, len(hit.name or ''), hit.item_id))
+    return hits[:limit]
+
+
+# --- 主執行入口 (示例: python -m azurlane_analyzer.search 關鍵詞 [數據庫]) ---
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法: python -m azurlane_analyzer.search <關鍵詞> [數據庫文件]", file=sys.stderr)
+        sys.exit(2)
+    db_file = Path(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_DB_FILE
+    try:
+        with ReadOnlyConnectionPool(db_file) as pool:
+            search(pool, sys.argv[1])  # 預熱連接與語句快取
+            start_time = time.perf_counter()
+            results = search(pool, sys.argv[1])
+            elapsed = (time.perf_counter() - start_time) * 1000
+    except FileNotFoundError as e:
+        print(f"載入數據庫時出錯: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"'{sys.argv[1]}': {len(results)} 條結果，耗時 {elapsed:.2f} 毫秒。")
+    for hit in results:
+        print(f"  [{hit.match}] {hit.kind} {hit.item_id}: {hit.name}")
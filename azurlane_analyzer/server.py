@@ -0,0 +1,695 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/server.py
+#
+# 本地 HTTP/JSON 查詢服務 (asyncio，只用標準庫)。
+# 在 preprocessing/main.py 構建的數據庫上提供裝備查詢、篩選比較與時間軸模擬:
+#   GET  /health                      服務狀態、當前數據代號與統計
+#   GET  /equipment/<id>              一件裝備的完整記錄 (附強化鏈最高級的 ID)
+#   GET  /equipment?type=1,2&rarity=5&faction=1&usable_by=2&name=…&limit=50
+#                                     篩選裝備 (name 走全文檢索，見 search.py)
+#   GET  /compare?type=1,2,3&metric=dps&level=max&top=20&firepower=350&reload=150
+#                                     按艦船屬性計算並排序裝備指標 (compare.rank)
+#   GET  /timeline?equip=1,2&ship_id=…&skills=…&duration=180&firepower=300&reload=150
+#   POST /timeline {"ships": [{"equip": [...], "ship_id": …, "profile": {...}, "skills": [...]}], "duration": 180}
+#                                     時間軸模擬 (timeline.simulate)；events=true 時附帶每次開火
+#
+# 設計:
+#   - 事件循環只做 HTTP 解析與參數校驗；SQLite 查詢、指標計算、模擬與 JSON 編碼都交給有上限的線程池
+#     (每個線程持有自己的只讀連接，見 query.ReadOnlyConnectionPool)。排隊的任務超過 max_pending 時
+#     直接返回 503，不讓延遲無限增長；
+#   - 相同的請求 (同一數據代號、同一端點、規範化後相同的參數) 在執行中時，後到的請求等待同一個結果，
+#     不重複查詢 (bot 與儀表板常在同一時刻發出相同的請求)；
+#   - 熱重載: 後台任務定期 stat 數據庫文件 (及 WAL)，發現變化且穩定一個週期後，在後台線程載入新的
+#     DataGeneration (新連接池 + 裝備比較快照)，再在事件循環中一次賦值切換。每個請求開始時取得當前代號
+#     並在整個處理期間使用它，因此一個請求不會混用新舊數據；舊代號在最後一個請求結束後關閉。
+#     數據庫旁有二進制快照 (snapshot.py) 但版本落後時，視為構建尚未完成，推遲切換 (最多 RELOAD_MAX_DEFER 秒)。
+#     最穩妥的部署方式是構建到臨時文件後 os.replace 到目標路徑；
+#   - --result-cache 時比較與時間軸結果經 cache.ResultCache 持久化 (數據庫旁的 .cache.db)，
+#     重複的儀表板請求直接取快取，不再重算。鍵包含請求所屬代號中相關表的數據版本號，
+#     因此預處理重寫這些表後舊結果不會再命中 (也不會把舊代號算出的結果交給新代號)。
+#
+# 用法:
+#     python -m azurlane_analyzer.server --port 8765 --workers 4 --result-cache
+#     python -m azurlane_analyzer.loadtest --url http://127.0.0.1:8765   (負載測試)
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import signal
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+from azurlane_analyzer.cache import ResultCache
+from azurlane_analyzer.compare import LEVELS, METRICS, PROFILE_KEYS, EquipmentSnapshot, rank
+from azurlane_analyzer.preprocessing.log import configure_logging, get_logger
+from azurlane_analyzer.preprocessing.manifest import read_data_versions
+from azurlane_analyzer.query import (
+    DEFAULT_DB_FILE,
+    EquipmentQuery,
+    ReadOnlyConnectionPool,
+    equipment_record,
+    get_equipment,
+    get_max_level,
+)
+from azurlane_analyzer.search import search
+from azurlane_analyzer.snapshot import Snapshot, default_snapshot_file
+from azurlane_analyzer.timeline import DEFAULT_DURATION, ShipLoadout, simulate
+
+logger = get_logger(__name__)
+
+# --- 配置 ---
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+DEFAULT_MAX_PENDING = 256          # 線程池中排隊 + 執行中的任務上限 (超過時返回 503)
+DEFAULT_RELOAD_INTERVAL = 2.0      # 秒；檢查數據庫文件是否變化的間隔
+RELOAD_MAX_DEFER = 120.0           # 秒；快照落後於數據庫時最多推遲切換的時間
+KEEPALIVE_TIMEOUT = 30.0           # 秒；空閒的 keep-alive 連接保留時間
+MAX_BODY_BYTES = 1 << 20
+MAX_HEADER_COUNT = 100
+
+# 請求參數的上限 (保護服務不被單個請求佔滿)
+DEFAULT_LIST_LIMIT = 50
+MAX_LIST_LIMIT = 1000
+DEFAULT_TOP = 20
+MAX_TOP = 1000
+MAX_FLEET_SIZE = 6
+MAX_SHIP_EQUIPMENT = 10
+MAX_TIMELINE_DURATION = 600.0
+SQLITE_INT_MIN = -(1 << 63)        # ID 參數會作為 SQLite INTEGER 綁定，超出範圍的值直接拒絕
+SQLITE_INT_MAX = (1 << 63) - 1
+
+# 結果快取的命名空間與結果所依賴的表 (決定哪些表被重寫後快取失效)
+COMPARE_CACHE = ('compare.rank', ('equipment',))
+TIMELINE_CACHE = ('timeline.simulate', ('equipment', 'ships', 'ship_stat_level', 'skill_trigger', 'skill_effect'))
+
+_EQUIPMENT_PATH = re.compile(r'^/equipment/(-?\d+)$')
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+    """以指定狀態碼返回給客戶端的錯誤 (消息放在 JSON 的 'error' 中)。"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --- 數據代號 ---
+def db_signature(db_file):
+    """數據庫文件與 WAL 文件的 (inode, mtime, 大小)；用於判斷是否有新的構建。"""
+    db_file = Path(db_file)
+    signature = []
+    for path in (db_file, db_file.with_name(db_file.name + '-wal')):
+        try:
+            st = path.stat()
+            signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class DataGeneration:
+    """
+    一次載入的數據: 只讀連接池與裝備比較快照。載入後不再改變，可被多個線程同時使用。
+    Attributes:
+        number (int): 代號 (每次重載遞增)。
+        data_versions (dict): 載入時各表的數據版本號。
+        source (str): 裝備比較快照的來源 ('snapshot' 或 'database')。
+    """
+
+    def __init__(self, number, db_file, signature):
+        self.number = number
+        self.db_file = Path(db_file)
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.active = 0          # 正在使用此代號的請求數 (只在事件循環中修改)
+        self.retired = False
+        self.binary = None
+        self.pool = ReadOnlyConnectionPool(self.db_file)
+        try:
+            self.data_versions = read_data_versions(self.pool.connection())
+            self.equipment = self._load_equipment()
+        except Exception:
+            self.close()
+            raise
+
+    def _load_equipment(self):
+        snapshot_file = default_snapshot_file(self.db_file)
+        if snapshot_file.is_file():
+            try:
+                binary = Snapshot.open(snapshot_file)
+            except (OSError, ValueError) as e:
+                logger.warning("  無法讀取二進制快照 %s (%s)，改為從數據庫載入。", snapshot_file, e)
+            else:
+                if binary.data_versions == self.data_versions:
+                    self.binary = binary
+                    self.source = 'snapshot'
+                    return EquipmentSnapshot.from_binary(binary)
+                binary.close()
+        self.source = 'database'
+        return EquipmentSnapshot.load(pool=self.pool)
+
+    def close(self):
+        self.pool.close_all()
+        if self.binary is not None:
+            self.binary.close()
+            self.binary = None
+
+
+def snapshot_pending(db_file):
+    """數據庫旁的二進制快照存在但版本落後時返回 True (新構建的最後一步尚未完成)。"""
+    snapshot_file = default_snapshot_file(db_file)
+    if not snapshot_file.is_file():
+        return False
+    try:
+        with Snapshot.open(snapshot_file) as binary:
+            return not binary.is_current(db_file)
+    except (OSError, ValueError, sqlite3.Error):
+        return False
+
+
+# --- 參數解析 ---
+def _sqlite_int(value):
+    """
+    將請求中的 ID 轉換為 SQLite INTEGER 範圍內的整數。
+
+    Raises:
+        TypeError / ValueError / OverflowError: 無法轉換 (例如 1e400 這樣的無窮大浮點數) 或超出範圍。
+    """
+    number = int(value)
+    if not SQLITE_INT_MIN <= number <= SQLITE_INT_MAX:
+        raise OverflowError(f"{number} 超出 SQLite INTEGER 範圍")
+    return number
+
+
+def _int_list(value, name):
+    try:
+        return sorted({_sqlite_int(item) for item in str(value).split(',') if item.strip()})
+    except (ValueError, OverflowError):
+        raise HTTPError(400, f"參數 {name} 必須是以逗號分隔的整數") from None
+
+
+def _int_value(value, name, default=None, minimum=None, maximum=None):
+    if value is None or value == '':
+        return default
+    try:
+        # 有上限的參數 (limit / top) 超出時截斷，其餘參數 (ID) 必須落在 SQLite INTEGER 範圍內
+        number = int(value) if maximum is not None else _sqlite_int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPError(400, f"參數 {name} 必須是整數 (範圍 {SQLITE_INT_MIN} 到 {SQLITE_INT_MAX})") from None
+    if minimum is not None and number < minimum:
+        raise HTTPError(400, f"參數 {name} 不能小於 {minimum}")
+    return min(number, maximum) if maximum is not None else number
+
+
+def _float_value(value, name, default=None):
+    if value is None or value == '':
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPError(400, f"參數 {name} 必須是數字") from None
+    if not math.isfinite(number):
+        raise HTTPError(400, f"參數 {name} 必須是有限的數字")
+    return number
+
+
+def _bool_value(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _profile(params):
+    return {key: _float_value(params[key], key) for key in PROFILE_KEYS if params.get(key) not in (None, '')}
+
+
+def _choice(value, choices, name, default):
+    value = value or default
+    if value not in choices:
+        raise HTTPError(400, f"參數 {name} 必須是 {' / '.join(choices)} 之一")
+    return value
+
+
+def parse_list_request(params):
+    return {
+        'type': _int_list(params['type'], 'type') if 'type' in params else None,
+        'rarity': _int_list(params['rarity'], 'rarity') if 'rarity' in params else None,
+        'faction': _int_list(params['faction'], 'faction') if 'faction' in params else None,
+        'usable_by': _int_value(params.get('usable_by'), 'usable_by'),
+        'name': (params.get('name') or '').strip() or None,
+        'limit': _int_value(params.get('limit'), 'limit', DEFAULT_LIST_LIMIT, 1, MAX_LIST_LIMIT),
+    }
+
+
+def parse_compare_request(params):
+    return {
+        'type': _int_list(params['type'], 'type') if 'type' in params else None,
+        'rarity': _int_list(params['rarity'], 'rarity') if 'rarity' in params else None,
+        'faction': _int_list(params['faction'], 'faction') if 'faction' in params else None,
+        'metric': _choice(params.get('metric'), METRICS, 'metric', 'dps'),
+        'level': _choice(params.get('level'), LEVELS, 'level', 'max'),
+        'top': _int_value(params.get('top'), 'top', DEFAULT_TOP, 1, MAX_TOP),
+        'profile': _profile(params),
+    }
+
+
+def _ship_spec(ship, index):
+    if not isinstance(ship, dict):
+        raise HTTPError(400, f"ships[{index}] 必須是 JSON 對象")
+    equip = ship.get('equip', [])
+    if isinstance(equip, str):
+        equip = equip.split(',')
+    if not isinstance(equip, list) or len(equip) > MAX_SHIP_EQUIPMENT:
+        raise HTTPError(400, f"ships[{index}].equip 必須是至多 {MAX_SHIP_EQUIPMENT} 個裝備 ID 的列表")
+    skills = ship.get('skills') or []
+    if isinstance(skills, str):
+        skills = skills.split(',')
+    profile = ship.get('profile') or {}
+    if not isinstance(profile, dict) or not isinstance(skills, list):
+        raise HTTPError(400, f"ships[{index}] 的 profile 必須是對象，skills 必須是列表")
+    try:
+        return {
+            'equip': [_sqlite_int(equip_id) for equip_id in equip],  # 保持順序 (與槽位對應)
+            'ship_id': _int_value(ship.get('ship_id'), f'ships[{index}].ship_id'),
+            'profile': {key: _float_value(value, f'ships[{index}].profile.{key}')
+                        for key, value in sorted(profile.items()) if key in PROFILE_KEYS},
+            'skills': sorted({_sqlite_int(skill_id) for skill_id in skills if str(skill_id).strip()}),
+            'name': str(ship['name']) if ship.get('name') else None,
+        }
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPError(400, f"ships[{index}] 中的 ID 必須是 SQLite INTEGER 範圍內的整數") from None
+
+
+def parse_timeline_request(params, body=None):
+    """GET 的查詢參數描述一艘艦船；POST 的 JSON 請求體可描述整支艦隊。"""
+    if body is not None:
+        if not isinstance(body, dict) or not isinstance(body.get('ships'), list):
+            raise HTTPError(400, "請求體必須是包含 'ships' 列表的 JSON 對象")
+        ships, options = body['ships'], body
+    else:
+        ships = [{'equip': params.get('equip', ''), 'ship_id': params.get('ship_id'),
+                  'profile': _profile(params), 'skills': params.get('skills'), 'name': params.get('name')}]
+        options = params
+    if not 1 <= len(ships) <= MAX_FLEET_SIZE:
+        raise HTTPError(400, f"艦隊必須包含 1 到 {MAX_FLEET_SIZE} 艘艦船")
+    duration = _float_value(options.get('duration'), 'duration', DEFAULT_DURATION)
+    if not 0 < duration <= MAX_TIMELINE_DURATION:
+        raise HTTPError(400, f"duration 必須在 0 到 {MAX_TIMELINE_DURATION:.0f} 秒之間")
+    return {
+        'ships': [_ship_spec(ship, index) for index, ship in enumerate(ships)],
+        'duration': duration,
+        'level': _choice(options.get('level'), LEVELS, 'level', 'max'),
+        'events': _bool_value(options.get('events', False)),
+    }
+
+
+# --- 處理函數 (在線程池中執行，只使用傳入的 DataGeneration) ---
+def lookup_equipment(generation, equip_id):
+    row = get_equipment(generation.pool, equip_id)
+    if row is None:
+        raise HTTPError(404, f"找不到裝備 {equip_id}")
+    record = equipment_record(row)
+    top = get_max_level(generation.pool, equip_id)
+    record['max_level_id'] = top['equip_id'] if top is not None else None
+    return record
+
+
+def list_equipment(generation, spec):
+    query = EquipmentQuery()
+    if spec['name']:
+        hits = search(generation.pool, spec['name'], kinds=('equipment',), limit=spec['limit'])
+        ids = [item_id for hit in hits for item_id in hit.item_ids]  # 每條結果包含同名的各強化等級
+        if not ids:
+            return {'count': 0, 'results': []}
+        query.where_ids(ids)
+    for column, method in (('type', query.where_type), ('rarity', query.where_rarity), ('faction', query.where_faction)):
+        if spec[column] is not None:
+            method(spec[column])
+    if spec['usable_by'] is not None:
+        query.where_usable_by(spec['usable_by'])
+    rows = [equipment_record(row) for row in query.limit(spec['limit']).fetch(generation.pool)]
+    if spec['name']:  # 保持檢索的相關度順序
+        order = {item_id: position for position, item_id in enumerate(ids)}
+        rows.sort(key=lambda row: order[row['id']])
+    return {'count': len(rows), 'results': rows}
+
+
+def compare_equipment(generation, spec):
+    results = rank(generation.equipment, spec['profile'], equipment_type=spec['type'], metric=spec['metric'],
+                   level=spec['level'], top=spec['top'], rarity=spec['rarity'], faction=spec['faction'])
+    return {'metric': spec['metric'], 'level': spec['level'], 'profile': spec['profile'],
+            'count': len(results), 'results': results}
+
+
+def run_timeline(generation, spec):
+    try:
+        fleet = [ShipLoadout.from_db(generation.pool, ship['equip'], ship_id=ship['ship_id'], profile=ship['profile'],
+                                     name=ship['name'] or (None if ship['ship_id'] else f'ship{index + 1}'),
+                                     level=spec['level'],
+                                     skill_ids=ship['skills'])
+                 for index, ship in enumerate(spec['ships'])]
+    except LookupError as e:
+        raise HTTPError(404, str(e)) from None
+    timeline = simulate(fleet, spec['duration'])
+    by_weapon = timeline.damage_by_weapon()
+    activations = timeline.activation_counts()
+    result = {
+        'duration': timeline.duration,
+        'total_damage': timeline.total_damage(),
+        'dps': timeline.dps(),
+        'ships': [{
+            'name': ship.name,
+            'total_damage': timeline.total_damage(index),
+            'dps': timeline.dps(index),
+            'weapons': [{'equip_id': equip_id, 'damage': damage}
+                        for (ship_index, equip_id), damage in by_weapon.items() if ship_index == index],
+            'skill_activations': {str(skill_id): count
+                                  for (ship_index, skill_id), count in activations.items() if ship_index == index},
+        } for index, ship in enumerate(fleet)],
+    }
+    if spec['events']:
+        result['events'] = [[round(e.time, 4), e.ship, e.equip_id, e.barrel, e.damage] for e in timeline.events]
+    return result
+
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# --- 服務 ---
+class QueryService:
+    """
+    HTTP 查詢服務。
+    Attributes:
+        generation (DataGeneration): 當前的數據代號 (熱重載時整體替換)。
+        stats (dict): 請求、合併、拒絕、重載次數等統計。
+    """
+
+    def __init__(self, db_file=DEFAULT_DB_FILE, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 reload_interval=DEFAULT_RELOAD_INTERVAL, result_cache=False):
+        self.db_file = Path(db_file)
+        # result_cache: True 時比較與時間軸結果經 ResultCache 持久化 (也可直接傳入 ResultCache 實例)
+        if result_cache is True:
+            result_cache = ResultCache(self.db_file)
+        self.cache = result_cache or None
+        self.workers = int(workers)
+        self.max_pending = int(max_pending)
+        self.reload_interval = reload_interval
+        self.generation = None
+        self.stats = {'requests': 0, 'coalesced': 0, 'rejected': 0, 'errors': 0, 'reloads': 0, 'reload_failures': 0}
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='query')
+        self._inflight = {}
+        self._pending = 0
+        self._server = None
+        self._watcher = None
+
+    # --- 生命週期 ---
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        loop = asyncio.get_running_loop()
+        signature = db_signature(self.db_file)
+        self.generation = await loop.run_in_executor(None, DataGeneration, 1, self.db_file, signature)
+        logger.info("已載入數據 (代號 1，裝備比較快照來自 %s，%d 件裝備)。",
+                    self.generation.source, len(self.generation.equipment))
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        if self.reload_interval:
+            self._watcher = asyncio.create_task(self._watch())
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+        if self.generation is not None:
+            self.generation.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    # --- 熱重載 ---
+    async def _watch(self):
+        """定期檢查數據庫文件；變化後穩定一個週期 (並且快照已跟上) 才載入新代號。"""
+        observed = self.generation.signature
+        changed_at = None
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            signature = db_signature(self.db_file)
+            if signature == self.generation.signature or signature[0] is None:
+                observed, changed_at = signature, None
+                continue
+            if signature != observed:  # 仍在寫入: 等待下一個週期
+                observed, changed_at = signature, changed_at or time.monotonic()
+                continue
+            loop = asyncio.get_running_loop()
+            deferred = time.monotonic() - changed_at if changed_at else 0.0
+            if deferred < RELOAD_MAX_DEFER and await loop.run_in_executor(None, snapshot_pending, self.db_file):
+                continue
+            await self.reload(signature)
+            changed_at = None
+
+    async def reload(self, signature=None):
+        """
+        載入新的數據代號並原子切換 (載入在後台線程執行，切換只是一次賦值)。
+        載入失敗時保留當前代號，直到數據庫再次變化。
+        Returns:
+            bool: 是否已切換。
+        """
+        loop = asyncio.get_running_loop()
+        signature = signature or db_signature(self.db_file)
+        old = self.generation
+        try:
+            new = await loop.run_in_executor(None, DataGeneration, old.number + 1, self.db_file, signature)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.stats['reload_failures'] += 1
+            old.signature = signature  # 同一狀態不再重試
+            logger.error("載入新的數據庫失敗，繼續使用代號 %d: %s", old.number, e)
+            return False
+        self.generation = new
+        self.stats['reloads'] += 1
+        old.retired = True
+        if old.active == 0:
+            loop.run_in_executor(None, old.close)
+        logger.info("數據庫已重新載入 (代號 %d，裝備比較快照來自 %s，%d 件裝備)。",
+                    new.number, new.source, len(new.equipment))
+        return True
+
+    # --- 請求執行 ---
+    async def _run(self, generation, endpoint, spec, handler, *args):
+        """
+        在線程池中執行 handler(generation, *args) 並編碼為 JSON。
+        相同 (代號, 端點, 參數) 的請求正在執行時，等待同一個結果而不重複執行。
+        """
+        key = (generation.number, endpoint, json.dumps(spec, sort_keys=True, separators=(',', ':')))
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+        if self._pending >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise HTTPError(503, "服務繁忙，請稍後重試")
+
+        def job():
+            try:
+                return 200, _encode(handler(generation, *args))
+            except HTTPError as e:
+                return e.status, _encode({'error': e.message})
+
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        future = loop.run_in_executor(self._executor, job)
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._pending -= 1
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _cached(self, cache_spec, handler):
+        """
+        啟用結果快取時，把 handler(generation, spec) 包裝為先查 ResultCache 的版本。
+        鍵的輸入包含 generation 中相關表的數據版本號: 結果總是與算出它的數據代號對應。
+        """
+        if self.cache is None:
+            return handler
+        namespace, tables = cache_spec
+        cache = self.cache
+
+        def cached_handler(generation, spec):
+            versions = {table: generation.data_versions.get(table) for table in tables}
+            return cache.get_or_compute(namespace, {'spec': spec, 'versions': versions},
+                                        lambda: handler(generation, spec), tables=tables)
+        return cached_handler
+
+    async def dispatch(self, method, target, body):
+        """路由一個請求。Returns: tuple (狀態碼, JSON 字節)。"""
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        params = dict(parse_qsl(url.query))
+        if path == '/health':
+            return 200, _encode(self.health())
+
+        generation = self.generation
+        generation.active += 1
+        try:
+            match = _EQUIPMENT_PATH.match(path)
+            if match and method == 'GET':
+                try:
+                    equip_id = _sqlite_int(match.group(1))
+                except (ValueError, OverflowError):
+                    raise HTTPError(400, "裝備 ID 超出 SQLite INTEGER 範圍") from None
+                return await self._run(generation, 'equipment', equip_id, lookup_equipment, equip_id)
+            if path == '/equipment' and method == 'GET':
+                spec = parse_list_request(params)
+                return await self._run(generation, 'equipment.list', spec, list_equipment, spec)
+            if path == '/compare' and method == 'GET':
+                spec = parse_compare_request(params)
+                return await self._run(generation, 'compare', spec,
+                                       self._cached(COMPARE_CACHE, compare_equipment), spec)
+            if path == '/timeline' and method in ('GET', 'POST'):
+                if method == 'POST':
+                    try:
+                        payload = json.loads(body or b'null')
+                    except ValueError:
+                        raise HTTPError(400, "請求體不是有效的 JSON") from None
+                    spec = parse_timeline_request(params, payload)
+                else:
+                    spec = parse_timeline_request(params)
+                return await self._run(generation, 'timeline', spec,
+                                       self._cached(TIMELINE_CACHE, run_timeline), spec)
+            if match or path in ('/equipment', '/compare', '/timeline'):
+                raise HTTPError(405, f"{path} 不支持 {method}")
+            raise HTTPError(404, f"未知的路徑: {path}")
+        finally:
+            generation.active -= 1
+            if generation.retired and generation.active == 0:
+                asyncio.get_running_loop().run_in_executor(None, generation.close)
+
+    def health(self):
+        generation = self.generation
+        return {
+            'status': 'ok',
+            'generation': generation.number,
+            'loaded_at': generation.loaded_at,
+            'equipment_source': generation.source,
+            'equipment_count': len(generation.equipment),
+            'data_versions': generation.data_versions,
+            'workers': self.workers,
+            'pending': self._pending,
+            **self.stats,
+            'result_cache': self.cache.stats() if self.cache is not None else None,
+        }
+
+    # --- HTTP/1.1 ---
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._send(writer, 400, _encode({'error': "無效的請求行"}), False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    if len(headers) >= MAX_HEADER_COUNT:
+                        await self._send(writer, 400, _encode({'error': "請求頭過多"}), False)
+                        return
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+
+                length = headers.get('content-length', '0')
+                if not length.isdigit() or int(length) > MAX_BODY_BYTES:
+                    await self._send(writer, 413, _encode({'error': "請求體過大或長度無效"}), False)
+                    break
+                body = await reader.readexactly(int(length)) if int(length) else None
+
+                self.stats['requests'] += 1
+                try:
+                    status, payload = await self.dispatch(method.upper(), target, body)
+                except HTTPError as e:
+                    status, payload = e.status, _encode({'error': e.message})
+                except Exception as e:  # 處理函數的意外錯誤: 返回 500，連接繼續可用
+                    logger.exception("處理請求 %s %s 時出錯: %s", method, target, e)
+                    status, payload = 500, _encode({'error': "服務內部錯誤"})
+                if status >= 500:
+                    self.stats['errors'] += 1
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, status, payload, keep_alive):
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+
+async def serve(db_file=DEFAULT_DB_FILE, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS,
+                max_pending=DEFAULT_MAX_PENDING, reload_interval=DEFAULT_RELOAD_INTERVAL, result_cache=False):
+    """運行服務直到收到 SIGINT / SIGTERM。"""
+    service = QueryService(db_file, workers, max_pending, reload_interval, result_cache)
+    address = await service.start(host, port)
+    print(f"查詢服務已啟動: http://{address[0]}:{address[1]} (數據庫 {db_file}，{service.workers} 個查詢線程)")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await service.close()
+        print("查詢服務已停止。")
+
+
+# --- 主執行入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="碧藍航線數據查詢服務 (HTTP/JSON)")
+    parser.add_argument('--db', type=Path, default=DEFAULT_DB_FILE, help=f"數據庫文件 (默認 {DEFAULT_DB_FILE})")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"監聽地址 (默認 {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"監聽端口 (默認 {DEFAULT_PORT}；0 為隨機端口)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"查詢線程數 (默認 {DEFAULT_WORKERS})")
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help=f"排隊任務上限，超過時返回 503 (默認 {DEFAULT_MAX_PENDING})")
+    parser.add_argument('--reload-interval', type=float, default=DEFAULT_RELOAD_INTERVAL,
+                        help=f"檢查數據庫變化的間隔秒數，0 為不熱重載 (默認 {DEFAULT_RELOAD_INTERVAL})")
+    parser.add_argument('--result-cache', action='store_true',
+                        help="把比較與時間軸結果持久化到數據庫旁的 .cache.db，重複請求直接取快取")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    args = parser.parse_args()
+    if not args.db.is_file():
+        print(f"數據庫文件未找到: {args.db}", file=sys.stderr)
+        sys.exit(1)
+    configure_logging(args.log_level)
+    asyncio.run(serve(args.db, args.host, args.port, args.workers, args.max_pending, args.reload_interval,
+                      args.result_cache))
@@ -0,0 +1,131 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/skills.py
+#
+# 技能觸發索引。
+# 預處理把 buff 配置展開為 skill_trigger / skill_effect 兩張表 (見 preprocessing/steps/process_skills.py)。
+# SkillTriggerIndex 為一組技能一次性載入「觸發類型 -> 觸發效果」的字典，
+# 時間軸在每個模擬事件上只做一次字典查找就得到要觸發的技能，不再解碼 JSON 或掃描技能列表。
+#
+# 用法:
+#     with ReadOnlyConnectionPool() as pool:
+#         triggers = SkillTriggerIndex.load(pool, [10100, 10110])
+#     for effect in triggers.on(TRIGGER_ON_FIRE):
+#         ...
+
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing.log import get_logger
+from azurlane_analyzer.preprocessing.steps.process_skills import (  # noqa: F401 (供時間軸使用)
+    TRIGGER_BATTLE_START, TRIGGER_INTERVAL, TRIGGER_ON_FIRE,
+)
+from azurlane_analyzer.query import DEFAULT_DB_FILE, ReadOnlyConnectionPool
+
+logger = get_logger(__name__)
+
+# 一個觸發事件及其效果 (skill_trigger 與 skill_effect 的一行連接結果)
+SkillTrigger = namedtuple(
+    'SkillTrigger',
+    'skill_id effect_index trigger_type interval probability quota '
+    'effect_type target attr number cast_skill_id buff_id',
+)
+
+_TRIGGER_SELECT = (
+    "SELECT t.skill_id, t.effect_index, t.trigger_type, t.interval, t.probability, t.quota, "
+    "e.effect_type, e.target, e.attr, e.number, e.cast_skill_id, e.buff_id "
+    "FROM skill_trigger AS t "
+    "LEFT JOIN skill_effect AS e ON e.skill_id = t.skill_id AND e.effect_index = t.effect_index"
+)
+
+# SQLite 單條語句的參數上限以內的分批大小
+_ID_BATCH = 500
+
+
+class SkillTriggerIndex:
+    """
+    一組技能按觸發類型分組的觸發效果。
+    Attributes:
+        skill_ids (tuple): 載入的技能 ID。
+    """
+
+    __slots__ = ('skill_ids', '_by_type')
+
+    _EMPTY = ()
+
+    def __init__(self, triggers, skill_ids=()):
+        self.skill_ids = tuple(skill_ids)
+        by_type = {}
+        for trigger in triggers:
+            by_type.setdefault(trigger.trigger_type, []).append(trigger)
+        self._by_type = {key: tuple(value) for key, value in by_type.items()}
+
+    @classmethod
+    def load(cls, pool, skill_ids):
+        """
+        從數據庫載入一組技能的全部觸發 (經 idx_skill_trigger_skill 索引)。
+        Args:
+            pool (ReadOnlyConnectionPool): 只讀連接池。
+            skill_ids (list[int]): 技能 ID；數據庫中沒有觸發記錄的技能會被忽略 (記錄到 debug 日誌)。
+        Returns:
+            SkillTriggerIndex
+        """
+        skill_ids = list(dict.fromkeys(int(skill_id) for skill_id in skill_ids))
+        triggers = []
+        for start in range(0, len(skill_ids), _ID_BATCH):
+            batch = skill_ids[start:start + _ID_BATCH]
+            triggers.extend(SkillTrigger(*row) for row in pool.execute(
+                f"{_TRIGGER_SELECT} WHERE t.skill_id IN ({', '.join('?' * len(batch))}) "
+                "ORDER BY t.skill_id, t.effect_index, t.trigger_type", batch))
+        found = {trigger.skill_id for trigger in triggers}
+        missing = [skill_id for skill_id in skill_ids if skill_id not in found]
+        if missing:
+            logger.debug("skill_trigger 中沒有這些技能的觸發記錄: %s", missing)
+        return cls(triggers, skill_ids)
+
+    def on(self, trigger_type):
+        """Returns: tuple[SkillTrigger] (某類事件觸發的全部效果；沒有時為空元組)。"""
+        return self._by_type.get(trigger_type, self._EMPTY)
+
+    def trigger_types(self):
+        return tuple(self._by_type)
+
+    def __bool__(self):
+        return bool(self._by_type)
+
+    def __len__(self):
+        return sum(len(value) for value in self._by_type.values())
+
+    def __repr__(self):
+        counts = ', '.join(f'{key}={len(value)}' for key, value in sorted(self._by_type.items()))
+        return f"SkillTriggerIndex({len(self.skill_ids)} 個技能: {counts})"
+
+
+def skills_for_trigger(pool, trigger_type, limit=None):
+    """
+    某類觸發事件涉及的全部技能 ID (skill_trigger 主鍵上的範圍查詢)。
+    Returns:
+        list[int]
+    """
+    sql = "SELECT DISTINCT skill_id FROM skill_trigger WHERE trigger_type = ? ORDER BY skill_id"
+    params = [trigger_type]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return [row[0] for row in pool.execute(sql, params)]
+
+
+# --- 主執行入口 (示例: 列出開火時觸發的技能) ---
+if __name__ == '__main__':
+    db_file = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DB_FILE
+    trigger_type = sys.argv[2] if len(sys.argv) > 2 else TRIGGER_ON_FIRE
+    try:
+        with ReadOnlyConnectionPool(db_file) as pool:
+            skill_ids = skills_for_trigger(pool, trigger_type, limit=20)
+            index = SkillTriggerIndex.load(pool, skill_ids)
+    except FileNotFoundError as e:
+        print(f"載入數據庫時出錯: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(index)
+    for trigger in index.on(trigger_type):
+        print(f"  技能 {trigger.skill_id} 效果 {trigger.effect_index}: {trigger.effect_type} "
+              f"(機率 {trigger.probability:.0%}{'' if trigger.quota is None else f'，最多 {trigger.quota} 次'})")
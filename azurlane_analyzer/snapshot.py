@@ -0,0 +1,432 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/snapshot.py
+#
+# 只讀二進制快照 (azur_lane_data.snapshot)。
+# 查詢進程每次請求都從 SQLite 讀行並解碼為 Python 對象；快照把裝備、艦船、武器的數值欄位導出為
+# 固定寬度的欄位數組，載入時只 mmap 文件並解析一小段元數據，欄位直接是指向映射頁面的 memoryview
+# (或 NumPy 的 frombuffer 視圖)，不複製數據。多個工作進程映射同一文件時共用操作系統的頁面快取，
+# 啟動成本接近零，數據集也不會在每個進程中各存一份。
+#
+# 文件格式 (小端序，FORMAT_VERSION = 1):
+#   [0, 64)   文件頭: magic 'ALSNAP01'、格式版本 (u32)、保留 (u32)、元數據偏移 (u64)、元數據長度 (u64)
+#   [64, …)   欄位數組，每個都按 8 字節對齊:
+#               'd' float64 (NULL = NaN)；'q' int64 (NULL = INT_NULL)；
+#               's' u32 字符串引用 (NULL = STRING_NULL)，指向字符串表
+#             字符串表: u32 偏移數組 (n + 1 項) + UTF-8 數據 (相同的字符串只存一份)
+#   [元數據]  JSON: 每個表的行數、主鍵欄位、每個欄位的類型與偏移、字符串表位置、
+#             構建時各表的數據版本號 (見 preprocessing/manifest.py 的 data_version 表)
+# 每個表的行按主鍵升序排列，主鍵欄位本身就是 ID -> 行號的索引 (二分查找)。
+#
+# 用法:
+#     export_snapshot(db_file)                  # 預處理結束時由 main.py 調用
+#     with Snapshot.open(snapshot_file) as snap:
+#         equipment = snap.table('equipment')
+#         row = equipment.get(14360)            # {欄位: 值}
+#         fp = equipment.column('stat_firepower')  # memoryview('d')，與 equipment.ids 按位置對齊
+
+import bisect
+import json
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+
+from azurlane_analyzer.preprocessing.log import get_logger
+from azurlane_analyzer.preprocessing.manifest import ANY_TABLE, read_data_versions
+from azurlane_analyzer.query import DEFAULT_DB_FILE
+
+try:
+    import numpy as np
+except ImportError:  # 可選依賴 (只有 SnapshotTable.array 需要)
+    np = None
+
+logger = get_logger(__name__)
+
+SNAPSHOT_FILE_SUFFIX = '.snapshot'
+MAGIC = b'ALSNAP01'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+HEADER_SIZE = 64
+ALIGNMENT = 8
+
+# 欄位類型 (array / memoryview 的格式碼)
+DTYPE_FLOAT = 'd'
+DTYPE_INT = 'q'
+DTYPE_STRING = 's'
+_STORAGE_FORMAT = {DTYPE_FLOAT: 'd', DTYPE_INT: 'q', DTYPE_STRING: 'I'}
+_NUMPY_DTYPE = {DTYPE_FLOAT: '<f8', DTYPE_INT: '<i8', DTYPE_STRING: '<u4'}
+
+INT_NULL = -2 ** 63
+STRING_NULL = 0xFFFFFFFF
+
+# 導出的表: 表名 -> (主鍵, 以整數存儲的 TEXT 代碼欄位, 保留為字符串的 TEXT 欄位)。
+# 聲明為 INTEGER / REAL 的欄位自動導出；其餘 TEXT 欄位 (JSON 列表等) 不導出。
+SNAPSHOT_TABLES = {
+    'equipment': ('id', ('equipment_type', 'rarity', 'faction'),
+                  ('name', 'tier', 'weapon_type', 'sub_type', 'damage_stat_type')),
+    'ships': ('id', ('ship_type', 'rarity', 'faction'), ('name',)),
+    'weapon_property': ('id', (), ()),
+    'weapon': ('id', (), ('name',)),
+}
+
+
+def default_snapshot_file(db_file):
+    """主數據庫旁的快照文件路徑 (azur_lane_data.db -> azur_lane_data.snapshot)。"""
+    db_file = Path(db_file)
+    return db_file.with_name(db_file.stem + SNAPSHOT_FILE_SUFFIX)
+
+
+def _check_byte_order():
+    # memoryview.cast 使用本機字節序，文件固定為小端序
+    if sys.byteorder != 'little':
+        raise RuntimeError("二進制快照只支持小端序平台")
+
+
+# --- 導出 ---
+def _column_plan(conn, table, int_text, strings):
+    """Returns: [(欄位名, 類型)]；表不存在時返回 None。"""
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not info:
+        return None
+    plan = []
+    for _, name, declared, *_ in info:
+        declared = (declared or '').upper()
+        if name in strings:
+            plan.append((name, DTYPE_STRING))
+        elif name in int_text or 'INT' in declared:
+            plan.append((name, DTYPE_INT))
+        elif 'REAL' in declared or 'FLOA' in declared or 'DOUB' in declared:
+            plan.append((name, DTYPE_FLOAT))
+    return plan
+
+
+def _as_int(value):
+    if value is None:
+        return INT_NULL
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return INT_NULL
+        return int(number) if number.is_integer() else INT_NULL
+
+
+def _as_float(value):
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class _StringTable:
+    """導出時的字符串表 (相同字符串只保存一份)。"""
+
+    def __init__(self):
+        self.index = {}
+        self.data = bytearray()
+        self.offsets = array('I', [0])
+
+    def ref(self, value):
+        if value is None:
+            return STRING_NULL
+        value = str(value)
+        ref = self.index.get(value)
+        if ref is None:
+            ref = self.index[value] = len(self.offsets) - 1
+            self.data += value.encode('utf-8')
+            self.offsets.append(len(self.data))
+        return ref
+
+
+def _write_aligned(handle, data):
+    """寫入 data (bytes / array) 並補齊到 ALIGNMENT；返回寫入的起始偏移。"""
+    offset = handle.tell()
+    handle.write(data)
+    padding = -handle.tell() % ALIGNMENT
+    if padding:
+        handle.write(b'\0' * padding)
+    return offset
+
+
+def export_snapshot(db_file=DEFAULT_DB_FILE, snapshot_file=None, force=False):
+    """
+    從數據庫導出二進制快照 (寫入臨時文件後原子替換，正在映射舊快照的進程不受影響)。
+    快照中記錄的數據版本與數據庫一致時跳過導出。
+    Args:
+        db_file (Path): 數據庫文件。
+        snapshot_file (Path): 輸出文件 (默認 default_snapshot_file(db_file))。
+        force (bool): 數據版本未變化時也重新導出。
+    Returns:
+        bool: 是否寫出了新的快照。
+    """
+    _check_byte_order()
+    db_file = Path(db_file)
+    snapshot_file = Path(snapshot_file) if snapshot_file is not None else default_snapshot_file(db_file)
+    start_time = time.time()
+    conn = sqlite3.connect(f"{db_file.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        versions = read_data_versions(conn)
+        if not force and snapshot_file.is_file():
+            try:
+                with Snapshot.open(snapshot_file) as existing:
+                    current = existing.data_versions == versions
+            except (OSError, ValueError) as e:
+                logger.info("  現有快照無法讀取 (%s)，重新導出。", e)
+                current = False
+            if current:
+                logger.info("  二進制快照與數據庫的數據版本一致，跳過導出: %s", snapshot_file)
+                return False
+
+        strings = _StringTable()
+        tables = {}
+        snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = snapshot_file.with_name(f"{snapshot_file.name}.tmp{os.getpid()}")
+        with open(temp_file, 'wb') as handle:
+            handle.write(b'\0' * HEADER_SIZE)
+            for table, (key, int_text, string_columns) in SNAPSHOT_TABLES.items():
+                plan = _column_plan(conn, table, int_text, string_columns)
+                if plan is None:
+                    logger.warning("  警告: 數據庫中沒有表 '%s'，快照中不包含此表。", table)
+                    continue
+                names = [name for name, _ in plan]
+                rows = conn.execute(
+                    f"SELECT {', '.join(names)} FROM {table} WHERE {key} IS NOT NULL ORDER BY {key}").fetchall()
+                columns = {}
+                for position, (name, dtype) in enumerate(plan):
+                    if dtype == DTYPE_STRING:
+                        values = array('I', (strings.ref(row[position]) for row in rows))
+                    elif dtype == DTYPE_INT:
+                        values = array('q', (_as_int(row[position]) for row in rows))
+                    else:
+                        values = array('d', (_as_float(row[position]) for row in rows))
+                    columns[name] = [dtype, _write_aligned(handle, values)]
+                tables[table] = {'rows': len(rows), 'key': key, 'columns': columns}
+
+            string_meta = {
+                'count': len(strings.offsets) - 1,
+                'offsets': _write_aligned(handle, strings.offsets),
+                'data': _write_aligned(handle, bytes(strings.data)),
+                'length': len(strings.data),
+            }
+            meta = json.dumps({
+                'format': FORMAT_VERSION,
+                'created_at': time.time(),
+                'source': db_file.name,
+                'data_versions': versions,
+                'tables': tables,
+                'strings': string_meta,
+            }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            meta_offset = _write_aligned(handle, meta)
+            handle.seek(0)
+            handle.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, meta_offset, len(meta)))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_file, snapshot_file)
+    finally:
+        conn.close()
+    logger.info("  已導出二進制快照 %s (%s)，%.1f KB，耗時: %.2f 秒。", snapshot_file,
+                ', '.join(f"{name} {meta['rows']} 行" for name, meta in tables.items()),
+                snapshot_file.stat().st_size / 1024, time.time() - start_time)
+    return True
+
+
+# --- 載入 ---
+class SnapshotTable:
+    """
+    快照中的一個表。欄位在首次訪問時創建 memoryview (指向映射頁面，不複製)。
+    Attributes:
+        name (str): 表名。
+        key (str): 主鍵欄位名。
+        rows (int): 行數。
+        ids: 主鍵欄位 (升序的 memoryview('q'))。
+    """
+
+    def __init__(self, snapshot, name, meta):
+        self._snapshot = snapshot
+        self.name = name
+        self.key = meta['key']
+        self.rows = meta['rows']
+        self._meta = meta['columns']
+        self._views = {}
+        self.ids = self.column(self.key)
+
+    @property
+    def column_names(self):
+        return tuple(self._meta)
+
+    def dtype(self, name):
+        return self._meta[name][0]
+
+    def column(self, name):
+        """欄位的 memoryview ('d' / 'q'；字符串欄位為 'I' 引用，用 Snapshot.string 解碼)。"""
+        view = self._views.get(name)
+        if view is None:
+            try:
+                dtype, offset = self._meta[name]
+            except KeyError:
+                raise KeyError(f"快照表 {self.name} 中沒有欄位 '{name}'") from None
+            storage = _STORAGE_FORMAT[dtype]
+            size = struct.calcsize(storage)
+            view = self._views[name] = self._snapshot._view[offset:offset + self.rows * size].cast(storage)
+        return view
+
+    def array(self, name):
+        """欄位的 NumPy 只讀數組 (frombuffer，不複製)；需要 NumPy。"""
+        if np is None:
+            raise RuntimeError("SnapshotTable.array 需要 NumPy；可改用 column() 返回的 memoryview")
+        dtype, offset = self._meta[name]
+        return np.frombuffer(self._snapshot._mmap, dtype=_NUMPY_DTYPE[dtype], count=self.rows, offset=offset)
+
+    def row_of(self, item_id):
+        """ID -> 行號 (二分查找主鍵欄位)；不存在時返回 None。"""
+        ids = self.ids
+        index = bisect.bisect_left(ids, item_id)
+        return index if index < self.rows and ids[index] == item_id else None
+
+    def value(self, row, name):
+        """第 row 行某欄位的值 (NULL 還原為 None，字符串已解碼)。"""
+        raw = self.column(name)[row]
+        dtype = self._meta[name][0]
+        if dtype == DTYPE_STRING:
+            return self._snapshot.string(raw)
+        if dtype == DTYPE_INT:
+            return None if raw == INT_NULL else raw
+        return None if raw != raw else raw  # NaN
+
+    def get(self, item_id, columns=None):
+        """按 ID 返回 {欄位: 值}；不存在時返回 None。"""
+        row = self.row_of(int(item_id))
+        if row is None:
+            return None
+        return {name: self.value(row, name) for name in (columns or self._meta)}
+
+    def __len__(self):
+        return self.rows
+
+    def _release(self):
+        for view in self._views.values():
+            view.release()
+        self._views.clear()
+
+
+class Snapshot:
+    """
+    以 mmap 映射的只讀快照。
+    Attributes:
+        path (Path): 快照文件。
+        data_versions (dict): 導出時各表的數據版本號。
+        created_at (float): 導出時間 (Unix 時間戳)。
+    """
+
+    def __init__(self, path, mapping):
+        self.path = Path(path)
+        self._mmap = mapping
+        self._view = memoryview(mapping)
+        magic, version, _, meta_offset, meta_length = HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} 不是二進制快照文件")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.path} 的格式版本 {version} 不受支持 (當前為 {FORMAT_VERSION})")
+        meta = json.loads(bytes(self._view[meta_offset:meta_offset + meta_length]))
+        self.data_versions = meta['data_versions']
+        self.created_at = meta['created_at']
+        self.source = meta.get('source')
+        strings = meta['strings']
+        self._string_offsets = self._view[strings['offsets']:strings['offsets'] + (strings['count'] + 1) * 4].cast('I')
+        self._string_data = self._view[strings['data']:strings['data'] + strings['length']]
+        self._string_cache = {}
+        self._tables = {name: SnapshotTable(self, name, table) for name, table in meta['tables'].items()}
+
+    @classmethod
+    def open(cls, path):
+        """映射快照文件 (只讀)。"""
+        _check_byte_order()
+        with open(path, 'rb') as handle:
+            mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(path, mapping)
+        except Exception:
+            mapping.close()
+            raise
+
+    def table(self, name):
+        try:
+            return self._tables[name]
+        except KeyError:
+            raise KeyError(f"快照中沒有表 '{name}'") from None
+
+    @property
+    def table_names(self):
+        return tuple(self._tables)
+
+    def string(self, ref):
+        """字符串引用 -> str (STRING_NULL 為 None；解碼結果按引用快取)。"""
+        if ref == STRING_NULL:
+            return None
+        value = self._string_cache.get(ref)
+        if value is None:
+            offsets = self._string_offsets
+            value = self._string_cache[ref] = str(self._string_data[offsets[ref]:offsets[ref + 1]], 'utf-8')
+        return value
+
+    def is_current(self, db_file):
+        """快照是否與數據庫當前的數據版本一致 (數據庫被重建後返回 False)。"""
+        conn = sqlite3.connect(f"{Path(db_file).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            versions = read_data_versions(conn)
+        finally:
+            conn.close()
+        tables = set(self._tables) | {ANY_TABLE}
+        return all(versions.get(table) == self.data_versions.get(table) for table in tables)
+
+    def close(self):
+        """
+        釋放映射。仍有外部引用的 NumPy 數組 (array()) 時映射無法立即關閉，
+        會在這些數組被回收後由垃圾回收關閉。
+        """
+        for table in self._tables.values():
+            table._release()
+        self._string_offsets.release()
+        self._string_data.release()
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            logger.debug("快照 %s 仍有外部數組引用，映射將在其回收後關閉。", self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# --- 主執行入口 (導出並檢查快照: python -m azurlane_analyzer.snapshot [數據庫]) ---
+if __name__ == '__main__':
+    db_file = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DB_FILE
+    if not db_file.is_file():
+        print(f"數據庫文件未找到: {db_file}", file=sys.stderr)
+        sys.exit(1)
+    export_snapshot(db_file, force='--force' in sys.argv)
+    snapshot_file = default_snapshot_file(db_file)
+
+    start_time = time.perf_counter()
+    with Snapshot.open(snapshot_file) as snap:
+        elapsed = (time.perf_counter() - start_time) * 1000
+        print(f"快照 {snapshot_file} ({snapshot_file.stat().st_size / 1024:.1f} KB)，載入耗時 {elapsed:.3f} 毫秒。")
+        for name in snap.table_names:
+            table = snap.table(name)
+            print(f"  {name}: {len(table)} 行，{len(table.column_names)} 個欄位")
+        equipment = snap.table('equipment')
+        if len(equipment):
+            first_id = equipment.ids[0]
+            print(f"  equipment {first_id}: {equipment.get(first_id, ('name', 'equipment_type', 'stat_firepower'))}")
@@ -0,0 +1,287 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/sweep.py
+#
+# 批量裝備搭配掃描。
+# 對一艘艦船的每個槽位 (例如 主炮 / 魚雷 / 設備) 從 equipment 表取出候選裝備，
+# 以時間軸模擬 (timeline.simulate) 計算每種搭配的總傷害，返回排名前 K 的搭配。
+# 直接做笛卡兒積太慢，因此在模擬前先縮小候選集:
+#   1. 只取強化鏈的最高級 (level='max') 或第一級 (level='initial')，並按 forbidden_ship_types 排除禁用裝備；
+#   2. 對模擬有影響的數值完全相同的裝備只保留一件 (例如多個同數值的活動版本)；
+#   3. 去掉被支配的裝備: 同槽位中另一件裝備在每一個與傷害有關的數值上都不差 (傷害、齊射數、CD、前後搖、
+#      炮擊/雷擊/航空/防空/裝填加成……) 時，它不可能讓搭配更好；
+#   4. 使用同一組類型的多個槽位 (例如兩個設備欄) 只枚舉組合，不枚舉排列。
+# 剩餘搭配按固定大小切塊，分發到進程池模擬；每個工作進程只返回本塊的前 K 名，由主進程合併。
+#
+# 用法:
+#     with ReadOnlyConnectionPool() as pool:
+#         best = sweep(pool, slots=DEFAULT_SLOTS, profile={'firepower': 300, 'torpedo': 250, 'reload': 150},
+#                      ship_type=2, top_k=10)
+
+import heapq
+import itertools
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from azurlane_analyzer.compare import PROFILE_KEYS, TYPE_SCALING_STAT
+from azurlane_analyzer.preprocessing.log import get_logger
+from azurlane_analyzer.query import DEFAULT_DB_FILE, ReadOnlyConnectionPool
+from azurlane_analyzer.timeline import DEFAULT_DURATION, WEAPON_COLUMNS, ShipLoadout, simulate
+
+logger = get_logger(__name__)
+
+# 默認槽位: 主炮 / 魚雷 / 設備 (每個槽位是允許的 equipment_type 集合)
+DEFAULT_SLOTS = (
+    (1, 2, 3, 4, 11),
+    (5, 13),
+    (10,),
+)
+
+DEFAULT_CHUNK_SIZE = 500       # 每個工作單元包含的搭配數
+DEFAULT_TOP_K = 10
+
+
+# --- 候選裝備 ---
+def _number(row, column, default=0.0):
+    value = row.get(column)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _leveled(row, name, level, default=0.0):
+    value = _number(row, f'{name}_{level}', None)
+    if value is None and level != 'initial':
+        value = _number(row, f'{name}_initial', None)
+    return default if value is None else value
+
+
+def _scaling_stat(row):
+    stat = row.get('damage_stat_type')
+    if stat in PROFILE_KEYS:
+        return stat
+    try:
+        return TYPE_SCALING_STAT.get(int(row.get('equipment_type')))
+    except (TypeError, ValueError):
+        return None
+
+
+def dominance_key(row, level='max'):
+    """
+    返回 (分組鍵, 數值向量)。只有同一分組 (同為武器/非武器且依賴同一屬性) 的裝備才互相比較；
+    向量的每一維都是「越大越好」(CD、前後搖等取負值)。
+    """
+    damage = _leveled(row, 'base_damage', level)
+    cooldown = _leveled(row, 'storehouse_cd', level)
+    is_weapon = bool(damage and cooldown)
+    group = (is_weapon, _scaling_stat(row) if is_weapon else None)
+    vector = tuple(_number(row, f'stat_{key}') for key in PROFILE_KEYS)
+    if is_weapon:
+        vector += (
+            damage,
+            _number(row, 'volley_count', 1.0),
+            _leveled(row, 'damage_coefficient', level, 1.0),
+            _number(row, 'stat_efficiency', 1.0),
+            -cooldown,
+            -_number(row, 'attack_foreswing'),
+            -(_number(row, 'attack_backswing', None) or _number(row, 'wp_recover_time')),
+            -_number(row, 'volley_barrel_delay'),
+            _number(row, 'has_preload'),
+            -_number(row, 'triggers_global_cooldown'),
+        )
+    return group, vector
+
+
+def prune_dominated(rows, level='max'):
+    """
+    去掉數值重複與被支配的候選裝備。
+    Args:
+        rows (list[dict]): 候選裝備行 (同一槽位)。
+    Returns:
+        list[dict]: 保留的裝備 (按向量總和降序)。
+    """
+    keyed = []
+    for row in rows:
+        group, vector = dominance_key(row, level)
+        keyed.append((group, vector, row))
+    # 支配者的向量總和一定不小於被支配者，按總和降序處理時只需與已保留的比較；
+    # 向量完全相同時保留 ID 最小的一件。
+    keyed.sort(key=lambda item: (str(item[0]), -math.fsum(item[1]), item[2]['id']))
+    kept = []
+    frontier = {}
+    for group, vector, row in keyed:
+        front = frontier.setdefault(group, [])
+        if any(all(a >= b for a, b in zip(other, vector)) for other in front):
+            continue
+        front.append(vector)
+        kept.append(row)
+    return kept
+
+
+def load_candidates(pool, equipment_types, ship_type=None, level='max'):
+    """
+    取出某個槽位的候選裝備 (dict 列表，可傳給工作進程)。
+    level='max' 時只取強化鏈的最高級，'initial' 時只取第一級；不在任何強化鏈上的裝備總是保留。
+    """
+    types = [str(t) for t in equipment_types]
+    level_condition = "lvl.is_max = 1" if level == 'max' else "lvl.level = 1"
+    sql = (
+        f"SELECT {', '.join(f'e.{column}' for column in WEAPON_COLUMNS)} "
+        f"FROM equipment AS e "
+        f"WHERE e.name IS NOT NULL AND e.equipment_type IN ({', '.join('?' * len(types))}) "
+        f"AND (NOT EXISTS (SELECT 1 FROM equipment_level AS lvl WHERE lvl.equip_id = e.id) "
+        f"     OR EXISTS (SELECT 1 FROM equipment_level AS lvl WHERE lvl.equip_id = e.id AND {level_condition}))"
+    )
+    params = list(types)
+    if ship_type is not None:
+        sql += (" AND e.id NOT IN (SELECT equip_id FROM equipment_forbidden_ship_type AS f "
+                "WHERE f.ship_type = ?)")
+        params.append(int(ship_type))
+    return [{column: row[column] for column in WEAPON_COLUMNS} for row in pool.execute(sql, params)]
+
+
+# --- 工作進程 ---
+# 候選表在進程池初始化時傳給每個工作進程一次，之後的工作單元只包含下標
+_WORKER_STATE = {}
+
+
+def _init_worker(groups, profile, duration, level, top_k):
+    _WORKER_STATE.update(groups=groups, profile=profile, duration=duration, level=level, top_k=top_k)
+
+
+def _simulate_chunk(chunk):
+    """
+    模擬一塊搭配。
+    Args:
+        chunk (list): 每個元素是各槽位組的候選下標元組的元組。
+    Returns:
+        list: 本塊前 K 名的 (總傷害, 裝備 ID 元組)。
+    """
+    state = _WORKER_STATE
+    groups, profile, duration, level = state['groups'], state['profile'], state['duration'], state['level']
+    results = []
+    for combination in chunk:
+        rows = [groups[group][index] for group, indices in enumerate(combination) for index in indices]
+        ship = ShipLoadout.from_rows(rows, profile, level=level)
+        total = simulate([ship], duration).total_damage()
+        results.append((total, tuple(row['id'] for row in rows)))
+    return heapq.nlargest(state['top_k'], results)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# --- 掃描 ---
+def sweep(pool, slots=DEFAULT_SLOTS, profile=None, ship_id=None, ship_type=None, level='max',
+          duration=DEFAULT_DURATION, top_k=DEFAULT_TOP_K, per_slot_limit=None,
+          processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    枚舉一艘艦船的裝備搭配並返回總傷害最高的前 top_k 種。
+    Args:
+        pool (ReadOnlyConnectionPool): 只讀連接池。
+        slots: 每個槽位允許的 equipment_type 集合的列表。
+        profile (dict): 艦船基礎屬性；給出 ship_id 時從 ships 表讀取，profile 中的鍵覆蓋之。
+        ship_id (int): 可選，ships 表中的艦船 ID (同時提供 ship_type)。
+        ship_type (int): 艦種，用於按 forbidden_ship_types 排除裝備。
+        level (str): 'initial' 或 'max'。
+        duration (float): 每次模擬的時長 (秒)。
+        top_k (int): 返回的搭配數。
+        per_slot_limit (int): 可選，剪枝後每個槽位最多保留的件數 (按單件模擬的傷害取前 N)，用於進一步限制規模。
+        processes (int): 進程數；None 取 CPU 數，0 或 1 在當前進程內執行。
+        chunk_size (int): 每個工作單元的搭配數。
+    Returns:
+        list[dict]: 按總傷害降序的 {'equip_ids', 'total_damage', 'dps'}。
+    """
+    start_time = time.perf_counter()
+    base = {}
+    if ship_id is not None:
+        found = ShipLoadout.ship_profile(pool, ship_id)
+        if found is None:
+            raise LookupError(f"ships 表中找不到艦船 {ship_id}")
+        base.update(found[1])
+        if ship_type is None:
+            rows = pool.execute("SELECT ship_type FROM ships WHERE id = ?", (int(ship_id),))
+            ship_type = rows[0]['ship_type'] if rows else None
+    base.update(profile or {})
+
+    # 1. 相同類型集合的槽位合併為一組 (組內只枚舉組合)
+    slot_groups = {}
+    for slot in slots:
+        key = tuple(sorted(int(t) for t in slot))
+        slot_groups[key] = slot_groups.get(key, 0) + 1
+
+    # 2. 每組的候選裝備: 排除禁用 -> 去重與去掉被支配者 -> 可選的數量上限
+    groups = []
+    for types in slot_groups:
+        loaded = load_candidates(pool, types, ship_type, level)
+        kept = prune_dominated(loaded, level)
+        if per_slot_limit is not None and len(kept) > per_slot_limit:
+            kept.sort(key=lambda row: -simulate([ShipLoadout.from_rows([row], base, level=level)], duration).total_damage())
+            kept = kept[:per_slot_limit]
+        logger.info("  槽位類型 %s: 候選 %d 件，剪枝後 %d 件。", list(types), len(loaded), len(kept))
+        groups.append(kept)
+
+    per_group = [
+        itertools.combinations_with_replacement(range(len(candidates)), count)
+        for candidates, count in zip(groups, slot_groups.values())
+    ]
+    total = 1
+    for candidates, count in zip(groups, slot_groups.values()):
+        total *= math.comb(len(candidates) + count - 1, count)
+    logger.info("  共 %d 種搭配待模擬。", total)
+    combinations = itertools.product(*per_group)
+
+    # 3. 切塊模擬，只保留前 K 名
+    best = []
+    initargs = (groups, base, float(duration), level, top_k)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or total <= chunk_size:
+        _init_worker(*initargs)
+        for chunk in _chunks(combinations, chunk_size):
+            best = heapq.nlargest(top_k, best + _simulate_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=initargs) as executor:
+            pending = set()
+            chunks = _chunks(combinations, chunk_size)
+            # 最多同時提交 processes * 2 個工作單元，避免一次性展開所有搭配
+            for chunk in itertools.islice(chunks, processes * 2):
+                pending.add(executor.submit(_simulate_chunk, chunk))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    best = heapq.nlargest(top_k, best + future.result())
+                for chunk in itertools.islice(chunks, len(done)):
+                    pending.add(executor.submit(_simulate_chunk, chunk))
+
+    logger.info("  掃描完成，耗時 %.2f 秒。", time.perf_counter() - start_time)
+    return [
+        {'equip_ids': list(equip_ids), 'total_damage': damage, 'dps': damage / duration if duration else 0.0}
+        for damage, equip_ids in best
+    ]
+
+
+# --- 主執行入口 (示例: 驅逐艦 主炮 / 魚雷 / 設備 ×2) ---
+if __name__ == '__main__':
+    from azurlane_analyzer.preprocessing.log import ensure_logging
+    ensure_logging()
+    db_file = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DB_FILE
+    with ReadOnlyConnectionPool(db_file) as pool:
+        results = sweep(pool, slots=((1,), (5,), (10,), (10,)),
+                        profile={'firepower': 150, 'torpedo': 400, 'reload': 200}, ship_type=1, top_k=5)
+        for rank_index, result in enumerate(results, 1):
+            names = {row['id']: row['name'] for row in pool.execute(
+                f"SELECT id, name FROM equipment WHERE id IN ({', '.join('?' * len(result['equip_ids']))})",
+                result['equip_ids'])}
+            print(f"  {rank_index}. DPS {result['dps']:.1f}: {' / '.join(names[equip_id] for equip_id in result['equip_ids'])}")
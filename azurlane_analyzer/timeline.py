@@ -0,0 +1,390 @@
+# 位於: AzurLane-Analyzer/azurlane_analyzer/timeline.py
+#
+# 戰鬥時間軸模擬 (離散事件)。
+# 每件武器的狀態只在少數時刻改變 (裝填完成、前搖結束開火、每一聯炮管出膛)，
+# 因此用一個按時間排序的堆 (heapq) 保存下一個事件，直接跳到下一個事件的時刻處理，
+# 不以固定步長逐幀推進。一支 6 艦艦隊的 3 分鐘戰鬥只有數千個事件，模擬耗時在毫秒級，
+# 可以大量掃描不同的裝備搭配。
+#
+# 武器週期:
+#   裝填完成 -> (等待同艦的全局冷卻) -> 前搖 attack_foreswing -> 開火，每一聯間隔 volley_barrel_delay
+#   -> 最後一聯出膛後開始下一輪裝填 (冷卻由倉庫 CD 與艦船裝填換算，見 compare.weapon_cooldown)。
+#   has_preload 的武器開場即已裝填完成；triggers_global_cooldown 的武器在攻擊期間 (前搖到後搖結束)
+#   佔用本艦的全局冷卻，同艦其他此類武器須等待。後搖 attack_backswing 缺失時使用 wp_recover_time。
+#
+# 技能觸發:
+#   艦船可帶一個 SkillTriggerIndex (見 skills.py)。開場處理 battle_start 觸發，每次開火 (第一聯出膛)
+#   處理 on_fire 觸發，interval 觸發作為獨立事件每 interval 秒進堆一次；每個事件只查一次按觸發類型
+#   預先分組的元組。觸發記錄為 SkillActivation (含觸發機率，不擲骰)；quota 用完的效果不再觸發。
+#   技能效果本身 (屬性加成、額外彈幕) 不改變武器傷害。
+#
+# 用法:
+#     with ReadOnlyConnectionPool() as pool:
+#         ship = ShipLoadout.from_db(pool, [14360, 19120], profile={'firepower': 350, 'reload': 150})
+#     timeline = simulate([ship], duration=180)
+
+import heapq
+import math
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from azurlane_analyzer.compare import PROFILE_KEYS, TYPE_SCALING_STAT, scaled_damage, weapon_cooldown
+from azurlane_analyzer.preprocessing.log import get_logger
+from azurlane_analyzer.query import DEFAULT_DB_FILE, ReadOnlyConnectionPool
+from azurlane_analyzer.skills import TRIGGER_BATTLE_START, TRIGGER_INTERVAL, TRIGGER_ON_FIRE, SkillTriggerIndex
+
+logger = get_logger(__name__)
+
+DEFAULT_DURATION = 180.0  # 秒
+
+# 艦船屬性組合的鍵 -> (ship_stat_level 中預先計算的最終屬性, 沒有等級數據時後備的 ships 基礎屬性)
+SHIP_STAT_COLUMNS = {
+    'firepower': ('stat_firepower', 'base_fp'), 'torpedo': ('stat_torpedo', 'base_trp'),
+    'aviation': ('stat_aviation', 'base_avi'), 'antiair': ('stat_antiair', 'base_aa'),
+    'reload': ('stat_reload', 'base_reload_stat'),
+}
+# 讀取艦船屬性的默認條件: 120 級、好感度「愛」(+6%)；突破默認取該艦船的最高檔位
+DEFAULT_SHIP_LEVEL = 120
+DEFAULT_SHIP_AFFECTION = 6
+
+# 時間軸需要的裝備欄位
+WEAPON_COLUMNS = (
+    'id', 'name', 'equipment_type', 'damage_stat_type',
+    'base_damage_initial', 'base_damage_max', 'damage_coefficient_initial', 'damage_coefficient_max',
+    'stat_efficiency', 'volley_count', 'storehouse_cd_initial', 'storehouse_cd_max',
+    'attack_foreswing', 'attack_backswing', 'has_preload', 'triggers_global_cooldown',
+    'volley_barrel_delay', 'wp_recover_time',
+    'stat_firepower', 'stat_torpedo', 'stat_aviation', 'stat_antiair', 'stat_reload',
+)
+
+# 一次開火中的一聯 (炮管/魚雷管) 出膛
+FiringEvent = namedtuple('FiringEvent', 'time ship ship_name equip_id weapon_name barrel damage')
+# 一次技能觸發 (trigger 為 skills.SkillTrigger)
+SkillActivation = namedtuple('SkillActivation', 'time ship ship_name trigger')
+
+# 堆中事件的類型
+_READY = 0   # 裝填完成，嘗試開始攻擊
+_FIRE = 1    # 前搖結束，第 barrel 聯出膛
+_SKILL = 2   # interval 技能觸發 (事件中的武器下標位置保存艦船下標，barrel 位置保存觸發的下標)
+
+
+class WeaponSpec:
+    """
+    時間軸使用的一件武器 (已按艦船屬性換算好冷卻與單發傷害)。
+    Attributes:
+        cooldown (float): 裝填秒數。
+        damage (float): 每一聯的傷害。
+        barrels (int): 每次開火的聯數 (volley_count)。
+    """
+
+    __slots__ = ('equip_id', 'name', 'cooldown', 'damage', 'barrels', 'barrel_delay',
+                 'foreswing', 'backswing', 'preload', 'global_cooldown')
+
+    def __init__(self, equip_id, name, cooldown, damage, barrels=1, barrel_delay=0.0,
+                 foreswing=0.0, backswing=0.0, preload=False, global_cooldown=False):
+        if not cooldown or cooldown <= 0:
+            raise ValueError(f"武器 {equip_id} 的冷卻必須為正數")
+        self.equip_id = equip_id
+        self.name = name
+        self.cooldown = float(cooldown)
+        self.damage = float(damage)
+        self.barrels = max(int(barrels), 1)
+        self.barrel_delay = float(barrel_delay)
+        self.foreswing = float(foreswing)
+        self.backswing = float(backswing)
+        self.preload = bool(preload)
+        self.global_cooldown = bool(global_cooldown)
+
+    def __repr__(self):
+        return f"WeaponSpec({self.equip_id}, {self.name!r}, cd={self.cooldown:.2f}s, dmg={self.damage:.1f}x{self.barrels})"
+
+
+def _value(row, column, default=0.0):
+    value = row[column]
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class ShipLoadout:
+    """一艘艦船及其已換算的武器列表，以及可選的技能觸發索引 (SkillTriggerIndex)。"""
+
+    def __init__(self, name, weapons, triggers=None):
+        self.name = name
+        self.weapons = list(weapons)
+        self.triggers = triggers
+
+    @staticmethod
+    def ship_profile(pool, ship_id, level=DEFAULT_SHIP_LEVEL, affection=DEFAULT_SHIP_AFFECTION, limit_break=None):
+        """
+        讀取艦船在指定等級、好感度與突破下的屬性組合 (ship_stat_level 中預先計算的值)；
+        沒有對應的等級數據時退回 ships 表的 1 級基礎屬性。
+        Args:
+            level (int): 等級 (預先計算的等級見 process_ships.STAT_LEVELS)。
+            affection (int): 好感度屬性加成百分比 (0/1/3/6/9/12)。
+            limit_break (int): 突破檔位 0..3；None 取該艦船的最高檔位。
+        Returns:
+            tuple: (名稱, 屬性組合 dict)；艦船不存在時返回 None。
+        """
+        columns = ', '.join(f"COALESCE(l.{stat}, s.{base}) AS {key}"
+                            for key, (stat, base) in SHIP_STAT_COLUMNS.items())
+        rows = pool.execute(
+            f"""
+            SELECT s.name, {columns}
+            FROM ships AS s
+            LEFT JOIN ship_stat_level AS l
+                ON l.ship_id = s.id AND l.level = ? AND l.affection = ?
+                AND l.limit_break = COALESCE(?, (SELECT max(limit_break) FROM ship_stat_level WHERE ship_id = s.id))
+            WHERE s.id = ?
+            """,
+            (int(level), int(affection), limit_break, int(ship_id)),
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        return row['name'], {key: _value(row, key) for key in SHIP_STAT_COLUMNS}
+
+    @classmethod
+    def from_db(cls, pool, equip_ids, ship_id=None, profile=None, name=None, level='max', skill_ids=None):
+        """
+        從數據庫載入一艘艦船的裝備並換算為武器。
+        艦船屬性 = 基礎屬性 (ships 表，或直接傳入的 profile) + 所有裝備的屬性加成。
+        沒有基礎傷害或倉庫 CD 的裝備 (設備、艦載機等) 不產生開火事件。
+        Args:
+            pool (ReadOnlyConnectionPool): 只讀連接池。
+            equip_ids (list[int]): 裝備 ID。
+            ship_id (int): 可選，ships 表中的艦船 ID。
+            profile (dict): 可選，艦船基礎屬性 (PROFILE_KEYS 的子集)；與 ship_id 同時給出時覆蓋對應的鍵。
+            name (str): 顯示名稱。
+            level (str): 'initial' 或 'max' (使用初始或滿強數值)。
+            skill_ids (list[int]): 可選，艦船技能 ID (從 skill_trigger 表載入觸發索引)。
+        Returns:
+            ShipLoadout
+        """
+        base = {key: 0.0 for key in PROFILE_KEYS}
+        if ship_id is not None:
+            found = cls.ship_profile(pool, ship_id)
+            if found is None:
+                raise LookupError(f"ships 表中找不到艦船 {ship_id}")
+            name = name or found[0]
+            base.update(found[1])
+        base.update({key: float(value) for key, value in (profile or {}).items() if key in base})
+
+        equip_ids = [int(equip_id) for equip_id in equip_ids]
+        rows = pool.execute(
+            f"SELECT {', '.join(WEAPON_COLUMNS)} FROM equipment WHERE id IN ({', '.join('?' * len(equip_ids))})",
+            equip_ids,
+        ) if equip_ids else []
+        by_id = {row['id']: row for row in rows}
+        missing = [equip_id for equip_id in equip_ids if equip_id not in by_id]
+        if missing:
+            raise LookupError(f"equipment 表中找不到裝備: {', '.join(map(str, missing))}")
+        loadout = cls.from_rows([by_id[equip_id] for equip_id in equip_ids], base, name, level)
+        if skill_ids:
+            loadout.triggers = SkillTriggerIndex.load(pool, skill_ids)
+        return loadout
+
+    @classmethod
+    def from_rows(cls, equipped, profile=None, name=None, level='max'):
+        """
+        由已取出的裝備行 (sqlite3.Row 或含 WEAPON_COLUMNS 鍵的字典) 換算武器，不訪問數據庫
+        (批量搭配掃描在進程池中使用)。參數含義同 from_db。
+        """
+        base = {key: 0.0 for key in PROFILE_KEYS}
+        base.update({key: float(value) for key, value in (profile or {}).items() if key in base})
+
+        # 艦船屬性加上全部裝備的加成
+        stats = dict(base)
+        for row in equipped:
+            for key in PROFILE_KEYS:
+                stats[key] += _value(row, f'stat_{key}')
+
+        suffix = '_max' if level == 'max' else '_initial'
+        weapons = []
+        for row in equipped:
+            base_damage = _value(row, 'base_damage' + suffix, None) or _value(row, 'base_damage_initial', None)
+            storehouse_cd = _value(row, 'storehouse_cd' + suffix, None) or _value(row, 'storehouse_cd_initial', None)
+            if not base_damage or not storehouse_cd:
+                continue
+            scaling = row['damage_stat_type']
+            if scaling not in PROFILE_KEYS:
+                try:
+                    scaling = TYPE_SCALING_STAT.get(int(row['equipment_type']))
+                except (TypeError, ValueError):
+                    scaling = None
+            coefficient = _value(row, 'damage_coefficient' + suffix, None) or _value(row, 'damage_coefficient_initial', 1.0)
+            weapons.append(WeaponSpec(
+                row['id'], row['name'],
+                cooldown=weapon_cooldown(storehouse_cd, stats['reload']),
+                damage=scaled_damage(base_damage, stats[scaling] if scaling else 0.0,
+                                     _value(row, 'stat_efficiency', 1.0), coefficient),
+                barrels=_value(row, 'volley_count', 1),
+                barrel_delay=_value(row, 'volley_barrel_delay'),
+                foreswing=_value(row, 'attack_foreswing'),
+                backswing=_value(row, 'attack_backswing', None) or _value(row, 'wp_recover_time'),
+                preload=_value(row, 'has_preload'),
+                global_cooldown=_value(row, 'triggers_global_cooldown'),
+            ))
+        return cls(name or 'ship', weapons)
+
+
+class Timeline:
+    """
+    模擬結果。
+    Attributes:
+        duration (float): 模擬時長 (秒)。
+        events (list[FiringEvent]): 按時間排序的開火事件。
+        activations (list[SkillActivation]): 按時間排序的技能觸發。
+    """
+
+    def __init__(self, duration, ships, events, activations=()):
+        self.duration = duration
+        self.ships = ships
+        self.events = events
+        self.activations = list(activations)
+
+    def activation_counts(self, ship=None):
+        """Returns: dict {(艦船下標, skill_id): 觸發次數}。"""
+        counts = {}
+        for a in self.activations:
+            if ship is None or a.ship == ship:
+                key = (a.ship, a.trigger.skill_id)
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def total_damage(self, ship=None):
+        """全艦隊 (或第 ship 艘艦船) 的總傷害。"""
+        return math.fsum(e.damage for e in self.events if ship is None or e.ship == ship)
+
+    def damage_by_weapon(self):
+        """Returns: dict {(艦船下標, equip_id): 總傷害}。"""
+        totals = {}
+        for e in self.events:
+            key = (e.ship, e.equip_id)
+            totals[key] = totals.get(key, 0.0) + e.damage
+        return totals
+
+    def dps(self, ship=None):
+        return self.total_damage(ship) / self.duration if self.duration else 0.0
+
+
+# --- 模擬 ---
+def simulate(ships, duration=DEFAULT_DURATION):
+    """
+    模擬一支艦隊在 duration 秒內的所有開火事件與技能觸發。
+    Args:
+        ships (list[ShipLoadout]): 艦隊 (通常至多 6 艘)。
+        duration (float): 模擬時長 (秒)；時刻晚於 duration 的事件不再處理。
+    Returns:
+        Timeline
+    """
+    duration = float(duration)
+    queue = []
+    sequence = 0  # 同一時刻的事件按加入順序處理，保證結果確定
+    gcd_until = [0.0] * len(ships)  # 每艘艦船的全局冷卻結束時刻
+    weapons = []
+    for ship_index, ship in enumerate(ships):
+        for weapon in ship.weapons:
+            weapon_index = len(weapons)
+            weapons.append((ship_index, weapon))
+            ready = 0.0 if weapon.preload else weapon.cooldown
+            queue.append((ready, sequence, _READY, weapon_index, 0))
+            sequence += 1
+
+    # 技能: 每艘艦船的 on_fire 觸發預先取出；interval 觸發各自進堆
+    activations = []
+    quota_left = {}  # (艦船下標, skill_id, effect_index) -> 剩餘觸發次數
+    on_fire = [()] * len(ships)
+    intervals = [()] * len(ships)
+
+    def activate(now, ship_index, triggers):
+        for trigger in triggers:
+            if trigger.quota is not None:
+                key = (ship_index, trigger.skill_id, trigger.effect_index)
+                left = quota_left.get(key, trigger.quota)
+                if left <= 0:
+                    continue
+                quota_left[key] = left - 1
+            activations.append(SkillActivation(now, ship_index, ships[ship_index].name, trigger))
+
+    for ship_index, ship in enumerate(ships):
+        if not ship.triggers:
+            continue
+        on_fire[ship_index] = ship.triggers.on(TRIGGER_ON_FIRE)
+        intervals[ship_index] = ship.triggers.on(TRIGGER_INTERVAL)
+        activate(0.0, ship_index, ship.triggers.on(TRIGGER_BATTLE_START))
+        for trigger_index, trigger in enumerate(intervals[ship_index]):
+            if trigger.interval and trigger.interval > 0:
+                queue.append((trigger.interval, sequence, _SKILL, ship_index, trigger_index))
+                sequence += 1
+    heapq.heapify(queue)
+
+    events = []
+    heappush, heappop = heapq.heappush, heapq.heappop
+    while queue:
+        now, _, kind, weapon_index, barrel = heappop(queue)
+        if now > duration:
+            break
+        if kind == _SKILL:
+            trigger = intervals[weapon_index][barrel]
+            activate(now, weapon_index, (trigger,))
+            if quota_left.get((weapon_index, trigger.skill_id, trigger.effect_index)) != 0:
+                heappush(queue, (now + trigger.interval, sequence, _SKILL, weapon_index, barrel))
+                sequence += 1
+            continue
+        ship_index, weapon = weapons[weapon_index]
+
+        if kind == _READY:
+            if weapon.global_cooldown:
+                if gcd_until[ship_index] > now:
+                    heappush(queue, (gcd_until[ship_index], sequence, _READY, weapon_index, 0))
+                    sequence += 1
+                    continue
+                gcd_until[ship_index] = (now + weapon.foreswing
+                                         + (weapon.barrels - 1) * weapon.barrel_delay + weapon.backswing)
+            heappush(queue, (now + weapon.foreswing, sequence, _FIRE, weapon_index, 0))
+            sequence += 1
+            continue
+
+        # _FIRE: 第 barrel 聯出膛
+        events.append(FiringEvent(now, ship_index, ships[ship_index].name,
+                                  weapon.equip_id, weapon.name, barrel, weapon.damage))
+        if barrel == 0 and on_fire[ship_index]:
+            activate(now, ship_index, on_fire[ship_index])
+        if barrel + 1 < weapon.barrels:
+            heappush(queue, (now + weapon.barrel_delay, sequence, _FIRE, weapon_index, barrel + 1))
+        else:
+            heappush(queue, (now + weapon.cooldown, sequence, _READY, weapon_index, 0))
+        sequence += 1
+
+    return Timeline(duration, ships, events, activations)
+
+
+# --- 主執行入口 (示例: 6 艘艦船各帶兩件主炮) ---
+if __name__ == '__main__':
+    db_file = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DB_FILE
+    try:
+        with ReadOnlyConnectionPool(db_file) as pool:
+            gun_ids = [row['id'] for row in pool.execute(
+                "SELECT id FROM equipment WHERE equipment_type IN ('1', '2', '3', '4') "
+                "AND base_damage_initial IS NOT NULL AND storehouse_cd_initial IS NOT NULL LIMIT 12")]
+            fleet = [
+                ShipLoadout.from_db(pool, gun_ids[i:i + 2], profile={'firepower': 300, 'reload': 150},
+                                    name=f'ship{i // 2 + 1}')
+                for i in range(0, len(gun_ids), 2)
+            ]
+    except (FileNotFoundError, LookupError) as e:
+        print(f"載入數據庫時出錯: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    start_time = time.perf_counter()
+    timeline = simulate(fleet, DEFAULT_DURATION)
+    elapsed = (time.perf_counter() - start_time) * 1000
+    print(f"{len(fleet)} 艘艦船，{DEFAULT_DURATION:.0f} 秒，{len(timeline.events)} 個開火事件，模擬耗時 {elapsed:.2f} 毫秒。")
+    for index, ship in enumerate(fleet):
+        print(f"  {ship.name}: 總傷害 {timeline.total_damage(index):.0f}，DPS {timeline.dps(index):.1f}")